@@ -0,0 +1,272 @@
+from sqlalchemy.engine import Engine
+from pydantic import BaseModel
+from app.core.eventos import difusor
+from app.db.session import mapa_bibliotecas
+from dotenv import load_dotenv
+from threading import Lock, local
+from typing import Any, Callable, Optional, Protocol, TypeVar
+import json
+import os
+import sqlite3
+import sys
+import time
+import zlib
+
+# Carrega variáveis de ambiente do arquivo .env
+load_dotenv()
+
+# Backend do cache de leitura das entidades (livro, autor, gênero e usuário por ID):
+#   "memoria": LRU com TTL no processo; os outros workers são invalidados pelos eventos de escrita
+#   "sqlite": arquivo compartilhado pelos workers da mesma máquina (substituto local de um cache de rede)
+#   "desligado": toda leitura vai ao banco
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memoria")
+CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH", "cache_entidades.sqlite3")
+# Validade de cada entrada: rede de segurança para escritas feitas fora da aplicação
+CACHE_TTL_SEGUNDOS = float(os.getenv("CACHE_TTL_SEGUNDOS", "300"))
+# Quantidade máxima de entradas; as usadas há mais tempo saem primeiro
+CACHE_MAX_ITENS = int(os.getenv("CACHE_MAX_ITENS", "50000"))
+
+# Interface dos backends de armazenamento; os valores são dicts já no formato de resposta (JSON)
+# Cada chave tem uma versão, incrementada por `remover`: `gravar` só grava se a versão ainda for a lida antes da
+# consulta ao banco, então uma leitura que cruzou com uma escrita (em qualquer worker) não devolve o valor antigo ao cache
+class BackendCache(Protocol):
+    # Indica se as entradas são vistas por todos os workers (invalidação não depende dos eventos)
+    compartilhado: bool
+    def obter(self, chave: str) -> Optional[dict]: ...
+    def versao(self, chave: str) -> int: ...
+    def gravar(self, chave: str, valor: dict, ttl: float, versao: int) -> None: ...
+    def remover(self, chaves: list[str]) -> None: ...
+    # Quantidade de entradas e memória aproximada em bytes
+    def ocupacao(self) -> tuple[int, int]: ...
+
+# Tamanho aproximado de uma entrada em memória: o dict, as chaves e os valores (todos escalares)
+def _tamanho_entrada(chave: str, valor: dict) -> int:
+    return sys.getsizeof(chave) + sys.getsizeof(valor) + sum(sys.getsizeof(campo) + sys.getsizeof(dado) for campo, dado in valor.items())
+
+# Backend em memória do processo: dict em ordem de uso (LRU) com expiração, protegido por lock
+# A versão é uma só para todas as chaves: basta dentro do processo e não cresce com as chaves invalidadas
+class BackendMemoria:
+    compartilhado = False
+
+    def __init__(self, max_itens: int = CACHE_MAX_ITENS):
+        self.max_itens = max_itens
+        self.entradas: dict[str, tuple[dict, float, int]] = {}
+        self.bytes = 0
+        self.geracao = 0
+        self.lock = Lock()
+
+    def obter(self, chave: str) -> Optional[dict]:
+        with self.lock:
+            entrada = self.entradas.pop(chave, None)
+            if entrada is None:
+                return None
+            if entrada[1] < time.monotonic():
+                self.bytes -= entrada[2]
+                return None
+            # Reinsere no fim do dict: a ordem de inserção passa a ser a ordem de uso
+            self.entradas[chave] = entrada
+            return entrada[0]
+
+    def versao(self, chave: str) -> int:
+        return self.geracao
+
+    def gravar(self, chave: str, valor: dict, ttl: float, versao: int) -> None:
+        tamanho = _tamanho_entrada(chave, valor)
+        with self.lock:
+            if versao != self.geracao:
+                return
+            anterior = self.entradas.pop(chave, None)
+            if anterior is not None:
+                self.bytes -= anterior[2]
+            self.entradas[chave] = (valor, time.monotonic() + ttl, tamanho)
+            self.bytes += tamanho
+            while len(self.entradas) > self.max_itens:
+                self.bytes -= self.entradas.pop(next(iter(self.entradas)))[2]
+
+    def remover(self, chaves: list[str]) -> None:
+        with self.lock:
+            self.geracao += 1
+            for chave in chaves:
+                entrada = self.entradas.pop(chave, None)
+                if entrada is not None:
+                    self.bytes -= entrada[2]
+
+    def ocupacao(self) -> tuple[int, int]:
+        return len(self.entradas), self.bytes
+
+# Backend em arquivo SQLite local, compartilhado entre os workers da mesma máquina
+# Cada thread mantém a sua conexão: abrir uma por leitura custaria mais que a própria consulta
+class BackendSQLite:
+    compartilhado = True
+    # Gravações entre duas limpezas das entradas vencidas e do excesso
+    INTERVALO_LIMPEZA = 256
+    # Tempo que a versão de uma chave invalidada é mantida: bem acima da duração de qualquer consulta ao banco,
+    # porque uma versão apagada volta a 0 e uma leitura iniciada antes dela poderia gravar
+    RETENCAO_VERSOES_SEGUNDOS = 3600
+
+    def __init__(self, caminho: str = CACHE_SQLITE_PATH, max_itens: int = CACHE_MAX_ITENS):
+        self.caminho = caminho
+        self.max_itens = max_itens
+        self.conexoes = local()
+        self.gravacoes = 0
+        conexao = self._conexao()
+        conexao.execute("PRAGMA journal_mode=WAL")
+        conexao.execute("CREATE TABLE IF NOT EXISTS entradas (chave TEXT PRIMARY KEY, valor TEXT NOT NULL, expira REAL NOT NULL)")
+        conexao.execute("CREATE INDEX IF NOT EXISTS ix_entradas_expira ON entradas (expira)")
+        conexao.execute("CREATE TABLE IF NOT EXISTS versoes (chave TEXT PRIMARY KEY, versao INTEGER NOT NULL, atualizada REAL NOT NULL)")
+
+    def _conexao(self) -> sqlite3.Connection:
+        conexao = getattr(self.conexoes, "conexao", None)
+        if conexao is None:
+            conexao = self.conexoes.conexao = sqlite3.connect(self.caminho, timeout=5, isolation_level=None)
+            conexao.execute("PRAGMA synchronous=NORMAL")
+        return conexao
+
+    def obter(self, chave: str) -> Optional[dict]:
+        # time.time() porque o relógio precisa ser o mesmo entre processos
+        linha = self._conexao().execute("SELECT valor FROM entradas WHERE chave = ? AND expira > ?", (chave, time.time())).fetchone()
+        return json.loads(linha[0]) if linha else None
+
+    def versao(self, chave: str) -> int:
+        linha = self._conexao().execute("SELECT versao FROM versoes WHERE chave = ?", (chave,)).fetchone()
+        return linha[0] if linha else 0
+
+    def gravar(self, chave: str, valor: dict, ttl: float, versao: int) -> None:
+        conexao = self._conexao()
+        agora = time.time()
+        # Compara e grava em um único comando: se outro worker invalidou a chave depois da leitura da versão, nada é gravado
+        # A expiração também serve de ordem de uso: a entrada gravada há mais tempo é a primeira a sair no excesso
+        conexao.execute(
+            "INSERT OR REPLACE INTO entradas (chave, valor, expira) SELECT ?, ?, ? WHERE coalesce((SELECT versao FROM versoes WHERE chave = ?), 0) = ?",
+            (chave, json.dumps(valor), agora + ttl, chave, versao),
+        )
+        self.gravacoes += 1
+        if self.gravacoes % self.INTERVALO_LIMPEZA == 0:
+            conexao.execute("DELETE FROM entradas WHERE expira <= ?", (agora,))
+            conexao.execute("DELETE FROM versoes WHERE atualizada <= ?", (agora - self.RETENCAO_VERSOES_SEGUNDOS,))
+            conexao.execute(
+                "DELETE FROM entradas WHERE chave IN (SELECT chave FROM entradas ORDER BY expira LIMIT max((SELECT COUNT(*) FROM entradas) - ?, 0))",
+                (self.max_itens,),
+            )
+
+    def remover(self, chaves: list[str]) -> None:
+        if not chaves:
+            return
+        conexao = self._conexao()
+        agora = time.time()
+        with conexao:
+            conexao.execute("BEGIN IMMEDIATE")
+            conexao.executemany(
+                "INSERT INTO versoes (chave, versao, atualizada) VALUES (?, 1, ?) ON CONFLICT (chave) DO UPDATE SET versao = versao + 1, atualizada = excluded.atualizada",
+                [(chave, agora) for chave in chaves],
+            )
+            conexao.execute(f"DELETE FROM entradas WHERE chave IN ({', '.join('?' * len(chaves))})", chaves)
+
+    def ocupacao(self) -> tuple[int, int]:
+        conexao = self._conexao()
+        itens = conexao.execute("SELECT COUNT(*) FROM entradas").fetchone()[0]
+        paginas, tamanho_pagina = conexao.execute("PRAGMA page_count").fetchone()[0], conexao.execute("PRAGMA page_size").fetchone()[0]
+        return itens, paginas * tamanho_pagina
+
+# Cria o backend configurado no .env; None desliga o cache
+def criar_backend(nome: str = CACHE_BACKEND) -> Optional[BackendCache]:
+    if nome == "memoria":
+        return BackendMemoria()
+    if nome == "sqlite":
+        return BackendSQLite()
+    if nome == "desligado":
+        return None
+    raise ValueError(f"CACHE_BACKEND inválido: {nome}")
+
+M = TypeVar("M", bound=BaseModel)
+
+# Cache de leitura (read-through) das consultas por ID, com contadores de acerto por entidade
+class CacheEntidades:
+    def __init__(self, backend: Optional[BackendCache], ttl: float = CACHE_TTL_SEGUNDOS):
+        self.backend = backend
+        self.ttl = ttl
+        self.acertos: dict[str, int] = {}
+        self.faltas: dict[str, int] = {}
+        self.invalidacoes = 0
+        self.lock = Lock()
+
+    def _contar(self, contadores: dict[str, int], entidade: str) -> None:
+        with self.lock:
+            contadores[entidade] = contadores.get(entidade, 0) + 1
+
+    # Devolve a entidade no schema de resposta; na falta, `carregar` consulta o banco e o resultado é guardado
+    # Ausências não são guardadas: um cadastro novo não passa pela invalidação
+    def ler(self, esquema: type[M], entidade: str, escopo: Any, entidade_id: int, carregar: Callable[[], Any]) -> Optional[M]:
+        if self.backend is None:
+            objeto = carregar()
+            return esquema.model_validate(objeto, from_attributes=True) if objeto is not None else None
+        chave = chave_entidade(entidade, escopo, entidade_id)
+        valor = self.backend.obter(chave)
+        if valor is not None:
+            self._contar(self.acertos, entidade)
+            return esquema.model_validate(valor)
+        self._contar(self.faltas, entidade)
+        # Versão lida antes da consulta: se a chave for invalidada no meio, o valor lido não é gravado
+        versao = self.backend.versao(chave)
+        objeto = carregar()
+        if objeto is None:
+            return None
+        resposta = esquema.model_validate(objeto, from_attributes=True)
+        self.backend.gravar(chave, resposta.model_dump(mode="json"), self.ttl, versao)
+        return resposta
+
+    # Remove as entradas das entidades alteradas; chamada depois do commit de quem alterou
+    def invalidar(self, entidade: str, escopo: Any, ids: list[int]) -> None:
+        if self.backend is None or not ids:
+            return
+        with self.lock:
+            self.invalidacoes += len(ids)
+        self.backend.remover([chave_entidade(entidade, escopo, entidade_id) for entidade_id in ids])
+
+    # Taxa de acerto por entidade e ocupação do backend
+    def metricas(self) -> dict:
+        if self.backend is None:
+            return {"backend": "desligado"}
+        itens, memoria = self.backend.ocupacao()
+        entidades = {}
+        with self.lock:
+            for entidade in sorted(self.acertos.keys() | self.faltas.keys()):
+                acertos, faltas = self.acertos.get(entidade, 0), self.faltas.get(entidade, 0)
+                entidades[entidade] = {"acertos": acertos, "faltas": faltas, "taxa_acerto": round(acertos / (acertos + faltas), 4)}
+            invalidacoes = self.invalidacoes
+        return {"backend": CACHE_BACKEND, "itens": itens, "memoria_bytes": memoria, "invalidacoes": invalidacoes, "entidades": entidades}
+
+# Chave de uma entidade: livros e usuários são da filial; autores e gêneros, do nó de banco
+def chave_entidade(entidade: str, escopo: Any, entidade_id: int) -> str:
+    return f"{entidade}:{escopo}:{entidade_id}"
+
+_escopos_nos: dict[Engine, str] = {}
+
+# Identificador estável do nó de banco, igual em todos os workers (hash da URL)
+def escopo_no(engine: Engine) -> str:
+    escopo = _escopos_nos.get(engine)
+    if escopo is None:
+        escopo = _escopos_nos[engine] = format(zlib.crc32(engine.url.render_as_string(hide_password=True).encode()), "08x")
+    return escopo
+
+cache_entidades = CacheEntidades(criar_backend())
+
+# Escritas feitas em outros workers chegam como eventos; só o backend em memória do processo precisa delas
+def _aplicar_evento(evento: dict) -> None:
+    if cache_entidades.backend is None or cache_entidades.backend.compartilhado:
+        return
+    tipo, biblioteca_id = evento["tipo"], evento.get("biblioteca_id")
+    if tipo == "livro_atualizado":
+        cache_entidades.invalidar("livro", biblioteca_id, [evento["livro"]["livro_id"]])
+    elif tipo in ("livro_removido", "estoque_alterado"):
+        cache_entidades.invalidar("livro", biblioteca_id, [evento["livro_id"]])
+    elif tipo == "livros_removidos":
+        cache_entidades.invalidar("livro", biblioteca_id, evento["livros_ids"])
+    elif tipo in ("usuario_atualizado", "usuario_removido"):
+        cache_entidades.invalidar("usuario", biblioteca_id, [evento["usuario_id"]])
+    elif tipo in ("autor_atualizado", "autor_removido", "genero_removido"):
+        engine = mapa_bibliotecas.fabrica(biblioteca_id).kw["bind"]  # type: ignore
+        entidade, chave = ("genero", "genero_id") if tipo == "genero_removido" else ("autor", "autor_id")
+        cache_entidades.invalidar(entidade, escopo_no(engine), [evento[chave]])
+
+difusor.registrar_callback(_aplicar_evento)
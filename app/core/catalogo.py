@@ -0,0 +1,399 @@
+from app.models.livro_models import Livro
+from app.models.autores_models import Autor
+from app.models.generos_models import Genero
+from app.models.livros_generos_models import LivrosGenerosModels
+from app.core.eventos import difusor
+from app.db.bibliotecas import BIBLIOTECA_PADRAO, biblioteca_da_sessao
+from app.db.session import mapa_bibliotecas
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+from itertools import chain
+from threading import Lock
+from typing import Optional
+import numpy as np
+import os
+import re
+
+# Carrega variáveis de ambiente do arquivo .env
+load_dotenv()
+
+# Atende listagem, busca, estoque e livros por gênero a partir do catálogo em memória, sem joins no banco; desligado por padrão
+CATALOGO_EM_MEMORIA = os.getenv("CATALOGO_EM_MEMORIA", "false").lower() == "true"
+# Textos alterados desde a última compactação; acima disso a coluna é remontada em uma string só
+LIMITE_TEXTOS_ALTERADOS = 4096
+# Fração de linhas removidas que dispara a compactação da tabela
+FRACAO_REMOVIDOS = 0.25
+# Separa as linhas na string da coluna e, na coluna de busca dos autores, o nome do sobrenome
+SEPARADOR = "\x00"
+SEPARADOR_CAMPOS = "\x01"
+SEM_ANO = np.iinfo(np.int32).min
+BITS_POR_PALAVRA = 64
+# Linhas avaliadas por vez nas listagens paginadas
+TAMANHO_BLOCO = 65_536
+
+# Coluna de textos compacta: os valores concatenados em uma única string, com o início de cada linha em um array
+# Valores alterados ficam num dicionário à parte até a próxima compactação, para não remontar a string a cada escrita
+class ColunaTexto:
+    def __init__(self, textos: list[str]):
+        self.texto = SEPARADOR.join(textos) + SEPARADOR
+        tamanhos = np.fromiter((len(texto) + 1 for texto in textos), dtype=np.int64, count=len(textos))
+        self.inicios = np.concatenate([np.zeros(1, dtype=np.int64), np.cumsum(tamanhos)])
+        self.alterados: dict[int, str] = {}
+
+    # Define o valor de uma linha existente ou nova
+    def definir(self, posicao: int, texto: str) -> None:
+        self.alterados[posicao] = texto
+
+    # Valores das linhas pedidas, fatiados da string concatenada
+    def valores(self, posicoes: np.ndarray) -> list[str]:
+        base = len(self.inicios) - 1
+        # Linhas além da string concatenada sempre estão entre as alteradas
+        seguras = np.minimum(posicoes, base - 1)
+        inicios, fins = self.inicios[seguras].tolist(), (self.inicios[seguras + 1] - 1).tolist()
+        alterados, texto = self.alterados, self.texto
+        return [alterados[p] if p in alterados else texto[i:f] for p, i, f in zip(posicoes.tolist(), inicios, fins)]
+
+    # Posições (ordenadas, sem repetição) das linhas que contêm o termo; a varredura da string roda em C
+    def buscar(self, termo: str) -> np.ndarray:
+        termo = termo.replace(SEPARADOR, "").replace(SEPARADOR_CAMPOS, "")
+        ocorrencias = np.fromiter((m.start() for m in re.finditer(re.escape(termo), self.texto)), dtype=np.int64)
+        posicoes = np.unique(np.searchsorted(self.inicios, ocorrencias, side="right") - 1)
+        if self.alterados:
+            alteradas = np.fromiter(self.alterados.keys(), dtype=np.int64, count=len(self.alterados))
+            casam = np.fromiter((p for p, texto in self.alterados.items() if termo in texto), dtype=np.int64)
+            posicoes = np.union1d(posicoes[~np.isin(posicoes, alteradas)], casam)
+        return posicoes
+
+# Tabela em colunas com IDs ordenados (busca binária); remoções só desligam a linha até a próxima compactação
+class Tabela:
+    def __init__(self, ids: np.ndarray, numericas: dict[str, np.ndarray], textos: dict[str, list[str]]):
+        ordem = np.argsort(ids, kind="stable")
+        self.ids = ids[ordem]
+        self.numericas = {nome: coluna[ordem] for nome, coluna in numericas.items()}
+        self.textos = {nome: ColunaTexto([valores[i] for i in ordem.tolist()]) for nome, valores in textos.items()}
+        self.ativos = np.ones(len(ids), dtype=bool)
+        self.tamanho = len(ids)
+        self.removidos = 0
+        # Eventos de workers diferentes podem chegar fora da ordem dos IDs; até compactar, a busca passa a ser linear
+        self.ordenado = True
+
+    # Posição da linha com o ID, ativa ou não
+    def _localizar(self, item_id: int) -> Optional[int]:
+        ids = self.ids[:self.tamanho]
+        if self.ordenado:
+            posicao = int(np.searchsorted(ids, item_id))
+            return posicao if posicao < self.tamanho and ids[posicao] == item_id else None
+        encontradas = np.flatnonzero(ids == item_id)
+        return int(encontradas[0]) if len(encontradas) else None
+
+    # Posição da linha ativa com o ID
+    def posicao(self, item_id: int) -> Optional[int]:
+        posicao = self._localizar(item_id)
+        return posicao if posicao is not None and self.ativos[posicao] else None
+
+    # Dobra a capacidade dos arrays para acomodar novas linhas
+    def _crescer(self) -> None:
+        extra = max(len(self.ids), 16)
+        self.ids = np.concatenate([self.ids, np.zeros(extra, dtype=self.ids.dtype)])
+        self.ativos = np.concatenate([self.ativos, np.zeros(extra, dtype=bool)])
+        self.numericas = {
+            nome: np.concatenate([coluna, np.zeros((extra, *coluna.shape[1:]), dtype=coluna.dtype)])
+            for nome, coluna in self.numericas.items()
+        }
+
+    # Insere ou substitui uma linha; numa inserção todas as colunas de texto devem ser informadas
+    def gravar(self, item_id: int, numericas: dict, textos: dict[str, str]) -> int:
+        posicao = self._localizar(item_id)
+        if posicao is None:
+            if self.tamanho == len(self.ids):
+                self._crescer()
+            posicao = self.tamanho
+            if posicao and item_id < self.ids[posicao - 1]:
+                self.ordenado = False
+            self.ids[posicao] = item_id
+            self.tamanho += 1
+        elif not self.ativos[posicao]:
+            self.removidos -= 1
+        self.ativos[posicao] = True
+        for nome, valor in numericas.items():
+            self.numericas[nome][posicao] = valor
+        for nome, texto in textos.items():
+            self.textos[nome].definir(posicao, texto)
+        return posicao
+
+    # Desliga a linha do ID
+    def remover(self, item_id: int) -> None:
+        posicao = self.posicao(item_id)
+        if posicao is not None:
+            self.ativos[posicao] = False
+            self.removidos += 1
+
+    # Remonta a tabela sem as linhas removidas, com os IDs em ordem e as colunas de texto em uma string só
+    def compactar_se_preciso(self) -> None:
+        alterados = max((len(coluna.alterados) for coluna in self.textos.values()), default=0)
+        if self.removidos <= self.tamanho * FRACAO_REMOVIDOS and alterados <= LIMITE_TEXTOS_ALTERADOS:
+            return
+        manter = np.flatnonzero(self.ativos[:self.tamanho])
+        if not self.ordenado:
+            manter = manter[np.argsort(self.ids[manter], kind="stable")]
+        self.textos = {nome: ColunaTexto(coluna.valores(manter)) for nome, coluna in self.textos.items()}
+        self.ids = self.ids[manter]
+        self.numericas = {nome: coluna[manter] for nome, coluna in self.numericas.items()}
+        self.ativos = np.ones(len(manter), dtype=bool)
+        self.tamanho, self.removidos, self.ordenado = len(manter), 0, True
+
+# Texto de busca do autor: nome e sobrenome em minúsculas, separados para que o termo não case atravessando os dois
+def _busca_autor(nome: Optional[str], sobrenome: Optional[str]) -> str:
+    return f"{(nome or '').lower()}{SEPARADOR_CAMPOS}{(sobrenome or '').lower()}"
+
+# Modelo de leitura do catálogo da filial: livros em colunas NumPy, gêneros como bitsets e textos concatenados
+# É carregado uma vez do banco e mantido em dia pelos eventos de escrita de livros, estoque, autores e gêneros
+class CatalogoColunar:
+    def __init__(self):
+        self.livros = self.autores = Tabela(np.empty(0, dtype=np.int64), {}, {})
+        self.bits: dict[int, int] = {}
+        self.bits_livres: list[int] = []
+        self.carregado = False
+        self.carregando = False
+        self.pendentes: list[dict] = []
+        self.lock = Lock()
+
+    # Carrega livros, associações com gêneros e autores com uma consulta por tabela, apenas com as colunas necessárias
+    def carregar(self, db: Session) -> None:
+        with self.lock:
+            if self.carregado or self.carregando:
+                return
+            self.carregando = True
+        try:
+            livros = db.execute(select(Livro.livro_id, Livro.titulo, Livro.isbn, Livro.editora, Livro.ano_publicacao, Livro.numero_copias, Livro.autor_id)).all()
+            # O join com o livro restringe as associações à filial
+            associacoes = np.fromiter(chain.from_iterable(db.execute(
+                select(LivrosGenerosModels.livro_id, LivrosGenerosModels.genero_id).join(Livro, Livro.livro_id == LivrosGenerosModels.livro_id)
+            )), dtype=np.int64).reshape(-1, 2)
+            generos = sorted(db.execute(select(Genero.genero_id)).scalars())
+            autores = db.execute(select(Autor.autor_id, Autor.nome, Autor.sobrenome)).all()
+        except Exception:
+            with self.lock:
+                self.carregando = False
+            raise
+
+        livro_ids, titulos, isbns, editoras, anos, copias, autor_ids = (list(coluna) for coluna in zip(*livros)) if livros else ([] for _ in range(7))
+        palavras = max(1, -(-len(generos) // BITS_POR_PALAVRA))
+        livros_tabela = Tabela(
+            np.array(livro_ids, dtype=np.int64),
+            {
+                "autor_id": np.array(autor_ids, dtype=np.int64),
+                "numero_copias": np.array(copias, dtype=np.int32),
+                "ano_publicacao": np.array([SEM_ANO if ano is None else ano for ano in anos], dtype=np.int32),
+                "sem_editora": np.array([editora is None for editora in editoras], dtype=bool),
+                "generos": np.zeros((len(livro_ids), palavras), dtype=np.uint64),
+            },
+            {"titulo": titulos, "titulo_busca": [titulo.lower() for titulo in titulos], "isbn": isbns, "editora": [editora or "" for editora in editoras]},
+        )
+        # Cada gênero é um bit; o bit é a posição do gênero na lista ordenada de IDs
+        bits = {genero_id: bit for bit, genero_id in enumerate(generos)}
+        if len(associacoes):
+            # Associações gravadas depois da leitura dos livros (livro ainda desconhecido) ficam para os eventos
+            posicoes = np.minimum(np.searchsorted(livros_tabela.ids, associacoes[:, 0]), max(livros_tabela.tamanho - 1, 0))
+            conhecidas = (livros_tabela.ids[posicoes] == associacoes[:, 0]) & np.isin(associacoes[:, 1], generos)
+            posicoes = posicoes[conhecidas]
+            bits_associacoes = np.searchsorted(np.array(generos, dtype=np.int64), associacoes[conhecidas, 1])
+            np.bitwise_or.at(
+                livros_tabela.numericas["generos"],
+                (posicoes, bits_associacoes // BITS_POR_PALAVRA),
+                np.left_shift(np.uint64(1), (bits_associacoes % BITS_POR_PALAVRA).astype(np.uint64)),
+            )
+        autores_tabela = Tabela(
+            np.array([autor_id for autor_id, _, _ in autores], dtype=np.int64),
+            {},
+            {"busca": [_busca_autor(nome, sobrenome) for _, nome, sobrenome in autores]},
+        )
+
+        with self.lock:
+            self.livros, self.autores, self.bits, self.bits_livres = livros_tabela, autores_tabela, bits, []
+            self.carregado, self.carregando = True, False
+            pendentes, self.pendentes = self.pendentes, []
+        # Reaplica os eventos que chegaram durante a carga
+        for evento in pendentes:
+            self.aplicar_evento(evento)
+
+    # Bit do gênero, reservando um novo (e mais uma palavra por linha, se preciso) quando `criar` é verdadeiro
+    def _bit(self, genero_id: int, criar: bool = False) -> Optional[int]:
+        bit = self.bits.get(genero_id)
+        if bit is not None or not criar:
+            return bit
+        bit = self.bits_livres.pop() if self.bits_livres else len(self.bits)
+        colunas = self.livros.numericas["generos"]
+        if bit // BITS_POR_PALAVRA >= colunas.shape[1]:
+            self.livros.numericas["generos"] = np.hstack([colunas, np.zeros((len(colunas), 1), dtype=np.uint64)])
+        self.bits[genero_id] = bit
+        return bit
+
+    # Substitui os gêneros de um livro
+    def _definir_generos(self, posicao: int, generos_ids: list[int]) -> None:
+        # Os bits vêm antes da linha: reservar um bit novo pode trocar o array dos gêneros
+        bits = [self._bit(genero_id, criar=True) for genero_id in generos_ids]
+        linha = self.livros.numericas["generos"][posicao]
+        linha[:] = 0
+        for bit in bits:
+            linha[bit // BITS_POR_PALAVRA] |= np.uint64(1) << np.uint64(bit % BITS_POR_PALAVRA)  # type: ignore
+
+    # Grava o livro do evento (mesmos campos de LivroResponseSchema)
+    def _gravar_livro(self, livro: dict) -> int:
+        editora, ano = livro.get("editora"), livro.get("ano_publicacao")
+        return self.livros.gravar(
+            livro["livro_id"],
+            {"autor_id": livro["autor_id"], "numero_copias": livro["numero_copias"], "ano_publicacao": SEM_ANO if ano is None else ano, "sem_editora": editora is None},
+            {"titulo": livro["titulo"], "titulo_busca": livro["titulo"].lower(), "isbn": livro["isbn"], "editora": editora or ""},
+        )
+
+    # Atualiza o catálogo de forma incremental a partir dos eventos de escrita
+    def aplicar_evento(self, evento: dict) -> None:
+        tipo = evento.get("tipo")
+        with self.lock:
+            if self.carregando:
+                self.pendentes.append(evento)
+                return
+            if not self.carregado:
+                return
+            livros, autores = self.livros, self.autores
+            if tipo in ("livro_criado", "livro_atualizado"):
+                posicao = self._gravar_livro(evento["livro"])
+                if "generos_ids" in evento:
+                    self._definir_generos(posicao, evento["generos_ids"])
+            elif tipo == "livro_removido":
+                livros.remover(evento["livro_id"])
+            elif tipo == "livros_removidos":
+                for livro_id in evento["livros_ids"]:
+                    livros.remover(livro_id)
+            elif tipo == "estoque_alterado":
+                posicao = livros.posicao(evento["livro_id"])
+                if posicao is not None:
+                    livros.numericas["numero_copias"][posicao] = evento["numero_copias"]
+            elif tipo == "generos_livro_alterados":
+                posicao = livros.posicao(evento["livro_id"])
+                if posicao is not None:
+                    self._definir_generos(posicao, evento["generos_ids"])
+            elif tipo in ("autor_criado", "autor_atualizado"):
+                autores.gravar(evento["autor_id"], {}, {"busca": _busca_autor(evento.get("nome"), evento.get("sobrenome"))})
+            elif tipo == "autor_removido":
+                autores.remover(evento["autor_id"])
+            elif tipo == "genero_criado":
+                self._bit(evento["genero_id"], criar=True)
+            elif tipo == "genero_removido":
+                bit = self.bits.pop(evento["genero_id"], None)
+                if bit is not None:
+                    livros.numericas["generos"][:, bit // BITS_POR_PALAVRA] &= ~(np.uint64(1) << np.uint64(bit % BITS_POR_PALAVRA))
+                    self.bits_livres.append(bit)
+            livros.compactar_se_preciso()
+            autores.compactar_se_preciso()
+
+    # Livros cujo título ou autor contém o termo; os autores que casam marcam seus livros por uma tabela indexada pelo ID
+    def _casam_busca(self, search: str) -> np.ndarray:
+        livros, n = self.livros, self.livros.tamanho
+        termo = search.lower()
+        casa = np.zeros(n, dtype=bool)
+        casa[livros.textos["titulo_busca"].buscar(termo)] = True
+        posicoes_autores = self.autores.textos["busca"].buscar(termo)
+        autores_ids = self.autores.ids[posicoes_autores[self.autores.ativos[posicoes_autores]]]
+        if len(autores_ids) and n:
+            autor_dos_livros = livros.numericas["autor_id"][:n]
+            marcados = np.zeros(int(autor_dos_livros.max()) + 1, dtype=bool)
+            marcados[autores_ids[autores_ids < len(marcados)]] = True
+            casa |= marcados[autor_dos_livros]
+        return casa
+
+    # Posições dos livros que passam nos filtros, com máscaras booleanas calculadas por blocos de linhas
+    # Com `limite`, a varredura para no bloco que completa a página, como o LIMIT do banco
+    def _filtrar(self, genero: Optional[int] = None, search: Optional[str] = None, com_estoque: bool = False, limite: Optional[int] = None) -> np.ndarray:
+        livros, n = self.livros, self.livros.tamanho
+        if genero is not None:
+            bit = self.bits.get(genero)
+            if bit is None:
+                return np.empty(0, dtype=np.int64)
+            palavra, mascara_genero = bit // BITS_POR_PALAVRA, np.uint64(1) << np.uint64(bit % BITS_POR_PALAVRA)
+        casa = self._casam_busca(search) if search else None
+        partes, total = [], 0
+        for inicio in range(0, n, TAMANHO_BLOCO):
+            fim = min(inicio + TAMANHO_BLOCO, n)
+            mascara = livros.ativos[inicio:fim].copy()
+            if genero is not None:
+                mascara &= (livros.numericas["generos"][inicio:fim, palavra] & mascara_genero) != 0
+            if com_estoque:
+                mascara &= livros.numericas["numero_copias"][inicio:fim] > 0
+            if casa is not None:
+                mascara &= casa[inicio:fim]
+            partes.append(np.flatnonzero(mascara) + inicio)
+            total += len(partes[-1])
+            if limite is not None and total >= limite:
+                break
+        return np.concatenate(partes) if partes else np.empty(0, dtype=np.int64)
+
+    # Monta as linhas de resposta (campos de LivroResponseSchema) só para as posições pedidas
+    def _linhas(self, posicoes: np.ndarray) -> list[dict]:
+        livros = self.livros
+        colunas = livros.numericas
+        anos = colunas["ano_publicacao"][posicoes].tolist()
+        sem_editora = colunas["sem_editora"][posicoes].tolist()
+        editoras = livros.textos["editora"].valores(posicoes)
+        return [
+            {
+                "livro_id": livro_id, "titulo": titulo, "isbn": isbn, "editora": None if sem_editora[i] else editoras[i],
+                "ano_publicacao": None if anos[i] == SEM_ANO else anos[i], "numero_copias": copias, "autor_id": autor_id,
+            }
+            for i, (livro_id, titulo, isbn, copias, autor_id) in enumerate(zip(
+                livros.ids[posicoes].tolist(),
+                livros.textos["titulo"].valores(posicoes),
+                livros.textos["isbn"].valores(posicoes),
+                colunas["numero_copias"][posicoes].tolist(),
+                colunas["autor_id"][posicoes].tolist(),
+            ))
+        ]
+
+    # Equivalente em memória de listar_livros
+    def listar(self, genero: Optional[int] = None, search: Optional[str] = None, skip: int = 0, limit: int = 50) -> list[dict]:
+        with self.lock:
+            return self._linhas(self._filtrar(genero, search, limite=skip + limit)[skip:skip + limit])
+
+    # Equivalente em memória de listar_livros_com_estoque
+    def listar_com_estoque(self) -> list[dict]:
+        with self.lock:
+            return self._linhas(self._filtrar(com_estoque=True))
+
+    # Livros do gênero; None se o gênero não existe
+    def livros_do_genero(self, genero_id: int) -> Optional[list[dict]]:
+        with self.lock:
+            if genero_id not in self.bits:
+                return None
+            return self._linhas(self._filtrar(genero=genero_id))
+
+# Um catálogo por filial: o acervo e o estoque são da filial; autores e gêneros, do nó que a hospeda
+catalogos: dict[int, CatalogoColunar] = {}
+_lock_catalogos = Lock()
+
+# Retorna o catálogo da filial, criando-o (ainda não carregado) se for o primeiro acesso
+def catalogo_livros(biblioteca_id: int) -> CatalogoColunar:
+    with _lock_catalogos:
+        catalogo = catalogos.get(biblioteca_id)
+        if catalogo is None:
+            catalogo = catalogos[biblioteca_id] = CatalogoColunar()
+        return catalogo
+
+# Catálogo pronto para consulta da filial da sessão; None se desligado ou ainda carregando (a consulta segue pelo banco)
+def catalogo_pronto(db: Session) -> Optional[CatalogoColunar]:
+    if not CATALOGO_EM_MEMORIA:
+        return None
+    catalogo = catalogo_livros(biblioteca_da_sessao(db))
+    catalogo.carregar(db)
+    return catalogo if catalogo.carregado else None
+
+# Eventos de livro e estoque vão para a filial que os publicou; os de autor e gênero, para todas as filiais do mesmo nó
+def _aplicar_evento(evento: dict) -> None:
+    origem = evento.get("biblioteca_id", BIBLIOTECA_PADRAO)
+    do_no = str(evento.get("tipo", "")).startswith(("autor_", "genero_"))
+    for biblioteca_id, catalogo in list(catalogos.items()):
+        if biblioteca_id == origem or (do_no and mapa_bibliotecas.fabrica(biblioteca_id) is mapa_bibliotecas.fabrica(origem)):
+            catalogo.aplicar_evento(evento)
+
+difusor.registrar_callback(_aplicar_evento)
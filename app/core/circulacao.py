@@ -0,0 +1,256 @@
+from sqlalchemy import event, insert, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+from app.models.circulacao_models import EventoCirculacao
+from dotenv import load_dotenv
+from datetime import datetime
+from threading import Event, Lock, Thread
+from typing import Any, Optional
+import logging
+import os
+import queue
+import time
+
+# Carrega variáveis de ambiente do arquivo .env
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Durabilidade do log de circulação:
+#   "fila": o evento entra na fila depois do commit e vai ao banco no próximo lote; uma queda do processo perde a fila
+#   "fila_assincrona": idem, com synchronous_commit=off nos lotes (Postgres): o commit do lote não espera o WAL no disco
+#   "transacional": o evento é gravado na mesma transação da operação; nada se perde, ao custo de um INSERT por requisição
+CIRCULACAO_DURABILIDADE = os.getenv("CIRCULACAO_DURABILIDADE", "fila")
+# Capacidade da fila em memória do escritor de cada nó
+CIRCULACAO_FILA = int(os.getenv("CIRCULACAO_FILA", "10000"))
+# Eventos por INSERT de várias linhas
+CIRCULACAO_LOTE = int(os.getenv("CIRCULACAO_LOTE", "500"))
+# Tempo máximo que o primeiro evento do lote espera pelos demais antes de o lote ser gravado incompleto
+CIRCULACAO_INTERVALO_MS = int(os.getenv("CIRCULACAO_INTERVALO_MS", "200"))
+# Ocupação da fila a partir da qual as requisições gravam o evento na própria transação (contrapressão)
+CIRCULACAO_LIMITE_FILA = float(os.getenv("CIRCULACAO_LIMITE_FILA", "0.9"))
+# Espera máxima por espaço na fila depois do commit, quando ela enche entre a verificação e o commit
+CIRCULACAO_ESPERA_FILA_MS = int(os.getenv("CIRCULACAO_ESPERA_FILA_MS", "1000"))
+# Tempo para o escritor esvaziar a fila no encerramento da aplicação
+CIRCULACAO_ENCERRAMENTO_SEGUNDOS = float(os.getenv("CIRCULACAO_ENCERRAMENTO_SEGUNDOS", "10"))
+
+MODOS_DURABILIDADE = ("fila", "fila_assincrona", "transacional")
+if CIRCULACAO_DURABILIDADE not in MODOS_DURABILIDADE:
+    raise ValueError(f"CIRCULACAO_DURABILIDADE inválida: {CIRCULACAO_DURABILIDADE}")
+
+# Chave em Session.info com os eventos que aguardam o commit para entrar na fila
+CIRCULACAO_PENDENTE = "circulacao_pendente"
+# Espera máxima entre novas tentativas de um lote que falhou
+ESPERA_MAXIMA_SEGUNDOS = 30.0
+
+# Contadores do escritor de um nó; a fila e o atraso mostram a contrapressão antes de ela chegar às requisições
+class MetricasCirculacao:
+    def __init__(self):
+        self.lock = Lock()
+        self.enfileirados = 0
+        self.gravados = 0
+        self.lotes = 0
+        self.gravados_na_transacao = 0
+        self.gravados_fora_da_fila = 0
+        self.descartados = 0
+        self.falhas = 0
+        self.maior_fila = 0
+        self.ultimo_lote_ms = 0.0
+        self.maior_atraso_ms = 0.0
+
+    def incrementar(self, contador: str, quantidade: int = 1) -> None:
+        with self.lock:
+            setattr(self, contador, getattr(self, contador) + quantidade)
+
+    # Evento entrou na fila, que ficou com `tamanho` itens
+    def registrar_enfileirado(self, tamanho: int) -> None:
+        with self.lock:
+            self.enfileirados += 1
+            self.maior_fila = max(self.maior_fila, tamanho)
+
+    # Lote gravado: duração do INSERT e atraso do evento mais antigo (da operação até a gravação)
+    def registrar_lote(self, linhas: list[dict], duracao: float) -> None:
+        atraso = (datetime.now() - min(linha["ocorrido_em"] for linha in linhas)).total_seconds() * 1000
+        with self.lock:
+            self.gravados += len(linhas)
+            self.lotes += 1
+            self.ultimo_lote_ms = duracao * 1000
+            self.maior_atraso_ms = max(self.maior_atraso_ms, atraso)
+
+# Thread que grava os eventos de circulação de um nó em lotes (INSERT de várias linhas)
+class EscritorCirculacao(Thread):
+    def __init__(self, engine: Engine, capacidade: int = CIRCULACAO_FILA, lote: int = CIRCULACAO_LOTE, intervalo_ms: int = CIRCULACAO_INTERVALO_MS):
+        super().__init__(name="escritor-circulacao", daemon=True)
+        self.engine = engine
+        self.fila: queue.Queue = queue.Queue(maxsize=capacidade)
+        self.capacidade = capacidade
+        self.lote = lote
+        self.intervalo = intervalo_ms / 1000
+        self.parar = Event()
+        self.metricas = MetricasCirculacao()
+
+    # Fila perto do limite: o escritor não está dando conta (ou o banco está falhando)
+    def sob_pressao(self) -> bool:
+        return self.fila.qsize() >= self.capacidade * CIRCULACAO_LIMITE_FILA
+
+    # Coloca o evento na fila; se ela continuar cheia após a espera, grava o evento na hora em uma transação curta
+    # (a da operação já foi confirmada). Só se essa gravação também falhar o evento é perdido e contado
+    def enfileirar(self, linha: dict) -> None:
+        try:
+            self.fila.put(linha, timeout=CIRCULACAO_ESPERA_FILA_MS / 1000)
+        except queue.Full:
+            try:
+                with self.engine.begin() as conexao:
+                    conexao.execute(insert(EventoCirculacao), [linha])
+                self.metricas.incrementar("gravados_fora_da_fila")
+            except Exception:
+                self.metricas.incrementar("descartados")
+                logger.exception("Fila de circulação cheia e banco indisponível; evento %s do empréstimo %s perdido", linha["tipo"], linha["emprestimo_id"])
+            return
+        self.metricas.registrar_enfileirado(self.fila.qsize())
+
+    def run(self) -> None:
+        # No encerramento continua até esvaziar a fila
+        while not (self.parar.is_set() and self.fila.empty()):
+            linhas = self._coletar()
+            if linhas:
+                self._gravar(linhas)
+
+    # Espera o primeiro evento e junta os que chegarem em até `intervalo`, no máximo `lote`
+    def _coletar(self) -> list[dict]:
+        try:
+            linhas = [self.fila.get(timeout=0 if self.parar.is_set() else self.intervalo)]
+        except queue.Empty:
+            return []
+        limite = time.monotonic() + (0 if self.parar.is_set() else self.intervalo)
+        while len(linhas) < self.lote:
+            try:
+                linhas.append(self.fila.get(timeout=max(limite - time.monotonic(), 0)))
+            except queue.Empty:
+                break
+        return linhas
+
+    # Grava o lote em uma transação; se o banco falhar, tenta de novo com espera crescente, segurando a fila
+    # (que enche e passa a contrapressão às requisições). No encerramento, um lote que não grava é perdido
+    def _gravar(self, linhas: list[dict]) -> None:
+        espera = 0.5
+        while True:
+            inicio = time.perf_counter()
+            try:
+                with self.engine.begin() as conexao:
+                    if CIRCULACAO_DURABILIDADE == "fila_assincrona" and conexao.dialect.name == "postgresql":
+                        conexao.execute(text("SET LOCAL synchronous_commit = off"))
+                    # No psycopg2 o executemany de INSERT vira INSERT ... VALUES de várias linhas (execute_values)
+                    conexao.execute(insert(EventoCirculacao), linhas)
+                self.metricas.registrar_lote(linhas, time.perf_counter() - inicio)
+                return
+            except Exception:
+                self.metricas.incrementar("falhas")
+                if self.parar.is_set():
+                    self.metricas.incrementar("descartados", len(linhas))
+                    logger.exception("Falha ao gravar %d eventos de circulação no encerramento; eventos perdidos", len(linhas))
+                    return
+                logger.exception("Falha ao gravar %d eventos de circulação; nova tentativa em %.1fs", len(linhas), espera)
+                self.parar.wait(espera)
+                espera = min(espera * 2, ESPERA_MAXIMA_SEGUNDOS)
+
+    # Dados para a rota de métricas
+    def resumo(self) -> dict:
+        metricas = self.metricas
+        with metricas.lock:
+            return {
+                "no": self.engine.url.render_as_string(hide_password=True),
+                "fila": self.fila.qsize(),
+                "capacidade": self.capacidade,
+                "maior_fila": metricas.maior_fila,
+                "enfileirados": metricas.enfileirados,
+                "gravados": metricas.gravados,
+                "lotes": metricas.lotes,
+                "media_por_lote": round(metricas.gravados / metricas.lotes, 1) if metricas.lotes else 0,
+                "ultimo_lote_ms": round(metricas.ultimo_lote_ms, 2),
+                "maior_atraso_ms": round(metricas.maior_atraso_ms, 1),
+                "gravados_na_transacao": metricas.gravados_na_transacao,
+                "gravados_fora_da_fila": metricas.gravados_fora_da_fila,
+                "descartados": metricas.descartados,
+                "falhas": metricas.falhas,
+            }
+
+# Um escritor por engine (nó de banco), iniciado no primeiro evento ou no início da aplicação
+escritores: dict[Engine, EscritorCirculacao] = {}
+_lock_escritores = Lock()
+
+# Retorna o escritor do engine, criando e iniciando a thread no primeiro uso
+def escritor_do_engine(engine: Engine) -> EscritorCirculacao:
+    escritor = escritores.get(engine)
+    if escritor is None:
+        with _lock_escritores:
+            escritor = escritores.get(engine)
+            if escritor is None:
+                escritor = escritores[engine] = EscritorCirculacao(engine)
+                escritor.start()
+    return escritor
+
+# O SQLite em memória tem uma única conexão compartilhada: um escritor com transação própria
+# confirmaria junto a transação aberta de uma requisição, então ali o evento vai na própria transação
+def _grava_na_transacao(engine: Engine) -> bool:
+    return CIRCULACAO_DURABILIDADE == "transacional" or isinstance(engine.pool, StaticPool)
+
+# Registra um evento de circulação do empréstimo feito pelo usuário `ator_id`. Com a fila, ele só entra no log se a
+# transação for confirmada; com a fila acima do limite (ou no modo transacional) é gravado já, dentro da transação da requisição
+def registrar_circulacao(db: Session, tipo: str, emprestimo: Any, dados: Optional[dict] = None, ator_id: Optional[int] = None) -> None:
+    linha = {
+        "tipo": tipo,
+        "biblioteca_id": emprestimo.biblioteca_id,
+        "emprestimo_id": emprestimo.emprestimo_id,
+        "livro_id": emprestimo.livro_id,
+        "leitor_id": emprestimo.leitor_id,
+        "bibliotecario_id": emprestimo.bibliotecario_id,
+        "ator_id": ator_id,
+        "ocorrido_em": datetime.now(),
+        "dados": dados,
+    }
+    engine = db.get_bind()
+    if _grava_na_transacao(engine):  # type: ignore
+        db.execute(insert(EventoCirculacao), [linha])
+        return
+    escritor = escritor_do_engine(engine)  # type: ignore
+    if escritor.sob_pressao():
+        escritor.metricas.incrementar("gravados_na_transacao")
+        db.execute(insert(EventoCirculacao), [linha])
+        return
+    db.info.setdefault(CIRCULACAO_PENDENTE, []).append((escritor, linha))
+
+# Depois do commit os eventos da transação vão para a fila do escritor do nó
+@event.listens_for(Session, "after_commit")
+def _enfileirar_circulacao(db: Session) -> None:
+    for escritor, linha in db.info.pop(CIRCULACAO_PENDENTE, []):
+        escritor.enfileirar(linha)
+
+# Operações desfeitas não entram no log
+@event.listens_for(Session, "after_rollback")
+def _descartar_circulacao(db: Session) -> None:
+    db.info.pop(CIRCULACAO_PENDENTE, None)
+
+# Inicia o escritor do nó junto com a aplicação; nos modos que gravam na transação não há escritor
+def iniciar_escritor_circulacao(engine: Engine) -> Optional[EscritorCirculacao]:
+    if _grava_na_transacao(engine):
+        return None
+    return escritor_do_engine(engine)
+
+# Para os escritores esperando que gravem o que resta na fila
+def encerrar_escritores_circulacao(timeout: float = CIRCULACAO_ENCERRAMENTO_SEGUNDOS) -> None:
+    with _lock_escritores:
+        encerrando = list(escritores.values())
+        escritores.clear()
+    for escritor in encerrando:
+        escritor.parar.set()
+    limite = time.monotonic() + timeout
+    for escritor in encerrando:
+        escritor.join(max(limite - time.monotonic(), 0))
+        if escritor.is_alive():
+            logger.error("Escritor de circulação de %s não esvaziou a fila (%d eventos) no encerramento", escritor.engine.url, escritor.fila.qsize())
+
+# Métricas de todos os escritores do processo
+def metricas_circulacao() -> dict:
+    return {"durabilidade": CIRCULACAO_DURABILIDADE, "escritores": [escritor.resumo() for escritor in list(escritores.values())]}
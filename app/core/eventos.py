@@ -0,0 +1,124 @@
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from app.db.bibliotecas import biblioteca_da_sessao
+from threading import Event, Lock, Thread
+from typing import Any, Callable, Optional
+import asyncio
+import json
+import logging
+import select
+
+logger = logging.getLogger(__name__)
+
+# Canal do Postgres usado para distribuir os eventos entre os workers
+CANAL_EVENTOS = "gestbook_eventos"
+# Quantidade máxima de eventos pendentes por cliente conectado
+TAMANHO_FILA_ASSINANTE = 100
+
+# Difusor em processo: entrega cada evento aos callbacks registrados e às filas dos clientes SSE conectados
+class Difusor:
+    def __init__(self, tamanho_fila: int = TAMANHO_FILA_ASSINANTE):
+        self.tamanho_fila = tamanho_fila
+        self.assinantes: set[tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = set()
+        self.callbacks: list[Callable[[dict], None]] = []
+        self.lock = Lock()
+
+    # Registra uma função chamada a cada evento (ex.: índices em memória mantidos pelo processo)
+    def registrar_callback(self, callback: Callable[[dict], None]) -> None:
+        with self.lock:
+            self.callbacks.append(callback)
+
+    # Registra um novo cliente; deve ser chamado dentro do event loop
+    def assinar(self) -> asyncio.Queue:
+        fila: asyncio.Queue = asyncio.Queue(maxsize=self.tamanho_fila)
+        with self.lock:
+            self.assinantes.add((asyncio.get_running_loop(), fila))
+        return fila
+
+    # Remove um cliente desconectado
+    def cancelar(self, fila: asyncio.Queue) -> None:
+        with self.lock:
+            self.assinantes = {(loop, f) for loop, f in self.assinantes if f is not fila}
+
+    # Entrega o evento a todos os clientes; pode ser chamado de qualquer thread
+    def entregar(self, evento: dict) -> None:
+        with self.lock:
+            assinantes = list(self.assinantes)
+            callbacks = list(self.callbacks)
+        for callback in callbacks:
+            try:
+                callback(evento)
+            except Exception:
+                logger.exception("Falha ao processar evento %s", evento.get("tipo"))
+        for loop, fila in assinantes:
+            loop.call_soon_threadsafe(_colocar_na_fila, fila, evento)
+
+# Coloca o evento na fila descartando o mais antigo se o cliente estiver lento
+def _colocar_na_fila(fila: asyncio.Queue, evento: dict) -> None:
+    if fila.full():
+        fila.get_nowait()
+    fila.put_nowait(evento)
+
+difusor = Difusor()
+
+# Publica um evento de alteração; só é entregue se a transação da sessão for confirmada
+# O evento leva a filial da sessão: clientes SSE e índices em memória só consomem os da própria filial
+def publicar_evento(db: Session, tipo: str, **dados: Any) -> None:
+    evento = {"tipo": tipo, "biblioteca_id": biblioteca_da_sessao(db), **dados}
+    if db.get_bind().dialect.name == "postgresql":
+        # NOTIFY é transacional: o Postgres só entrega após o COMMIT para todos os workers
+        db.execute(text("SELECT pg_notify(:canal, :dados)"), {"canal": CANAL_EVENTOS, "dados": json.dumps(evento, default=str)})
+    else:
+        db.info.setdefault("eventos_pendentes", []).append(evento)
+
+# Entrega localmente os eventos pendentes quando não há Postgres para distribuí-los
+@event.listens_for(Session, "after_commit")
+def _entregar_eventos_pendentes(db: Session) -> None:
+    for evento in db.info.pop("eventos_pendentes", []):
+        difusor.entregar(evento)
+
+# Descarta os eventos de transações desfeitas
+@event.listens_for(Session, "after_rollback")
+def _descartar_eventos_pendentes(db: Session) -> None:
+    db.info.pop("eventos_pendentes", None)
+
+# Thread que escuta o canal do Postgres (LISTEN) e repassa as notificações ao difusor local
+class OuvinteNotificacoes(Thread):
+    def __init__(self, engine: Engine):
+        super().__init__(name="ouvinte-eventos", daemon=True)
+        self.engine = engine
+        self.parar = Event()
+
+    def run(self) -> None:
+        while not self.parar.is_set():
+            try:
+                self._escutar()
+            except Exception:
+                logger.exception("Falha no LISTEN de eventos, reconectando")
+                self.parar.wait(1)
+
+    def _escutar(self) -> None:
+        conexao = self.engine.raw_connection()
+        # Retira a conexão do pool para que o autocommit não vaze para outras sessões
+        conexao.detach()
+        try:
+            driver = conexao.driver_connection
+            driver.autocommit = True  # type: ignore
+            driver.cursor().execute(f"LISTEN {CANAL_EVENTOS}")  # type: ignore
+            while not self.parar.is_set():
+                if select.select([driver], [], [], 1)[0]:
+                    driver.poll()  # type: ignore
+                    while driver.notifies:  # type: ignore
+                        notificacao = driver.notifies.pop(0)  # type: ignore
+                        difusor.entregar(json.loads(notificacao.payload))
+        finally:
+            conexao.close()
+
+# Inicia o ouvinte quando o banco é Postgres; nos demais bancos a entrega é local
+def iniciar_ouvinte(engine: Engine) -> Optional[OuvinteNotificacoes]:
+    if engine.dialect.name != "postgresql":
+        return None
+    ouvinte = OuvinteNotificacoes(engine)
+    ouvinte.start()
+    return ouvinte
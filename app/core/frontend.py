@@ -0,0 +1,129 @@
+from dotenv import load_dotenv
+from threading import Lock
+from typing import Optional
+import gzip
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+
+# Brotli é opcional: sem o pacote, só a variante gzip é gerada
+try:
+    import brotli  # type: ignore
+except ImportError:
+    brotli = None
+
+# Carrega variáveis de ambiente do arquivo .env
+load_dotenv()
+
+# Serve o frontend pela própria API (mesma origem, sem preflight de CORS); desligado por padrão
+SERVIR_FRONTEND = os.getenv("SERVIR_FRONTEND", "false").lower() == "true"
+FRONTEND_DIR = os.getenv("FRONTEND_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "frontend"))
+PREFIXO_FRONTEND = "/frontend"
+PAGINA_INICIAL = "skeleton/index.html"
+
+# Arquivos com hash no nome nunca mudam; as páginas HTML são sempre revalidadas pelo ETag
+CACHE_IMUTAVEL = "public, max-age=31536000, immutable"
+CACHE_REVALIDAR = "no-cache"
+EXTENSOES_COMPRIMIVEIS = {".html", ".css", ".js", ".svg", ".json", ".txt"}
+# Abaixo deste tamanho a compressão não compensa o cabeçalho extra
+TAMANHO_MINIMO_COMPRESSAO = 512
+# Ordem de preferência entre as codificações aceitas pelo navegador
+PREFERENCIA_CODIFICACAO = ("br", "gzip", "identity")
+# Meta lida pelos scripts: conteúdo vazio faz as chamadas irem para a mesma origem
+META_API = '<meta name="gestbook-api" content="">'
+ATRIBUTO_RECURSO = re.compile(r'(\s(?:src|href)=")([^"#?]+)(")')
+
+# Arquivo do frontend com suas variantes pré-comprimidas
+class Recurso:
+    def __init__(self, conteudo: bytes, caminho: str):
+        self.tipo = mimetypes.guess_type(caminho)[0] or "application/octet-stream"
+        self.hash = hashlib.sha256(conteudo).hexdigest()
+        self.variantes = {"identity": conteudo}
+        if os.path.splitext(caminho)[1] in EXTENSOES_COMPRIMIVEIS and len(conteudo) >= TAMANHO_MINIMO_COMPRESSAO:
+            self._adicionar_variante("gzip", gzip.compress(conteudo, compresslevel=9, mtime=0))
+            if brotli is not None:
+                self._adicionar_variante("br", brotli.compress(conteudo, quality=11))
+
+    # Guarda a variante apenas se ela for menor que o original
+    def _adicionar_variante(self, codificacao: str, conteudo: bytes) -> None:
+        if len(conteudo) < len(self.variantes["identity"]):
+            self.variantes[codificacao] = conteudo
+
+    # ETag por variante: a mesma URL entrega bytes diferentes conforme o Accept-Encoding
+    def etag(self, codificacao: str) -> str:
+        sufixo = "" if codificacao == "identity" else f"-{codificacao}"
+        return f'"{self.hash[:16]}{sufixo}"'
+
+# Escolhe a melhor codificação disponível entre as aceitas no cabeçalho Accept-Encoding
+def escolher_codificacao(accept_encoding: Optional[str], disponiveis: dict) -> str:
+    aceitas: dict[str, float] = {}
+    for item in (accept_encoding or "").split(","):
+        partes = [parte.strip() for parte in item.split(";")]
+        if not partes[0]:
+            continue
+        qualidade = 1.0
+        for parametro in partes[1:]:
+            if parametro.startswith("q="):
+                try:
+                    qualidade = float(parametro[2:])
+                except ValueError:
+                    qualidade = 0.0
+        aceitas[partes[0].lower()] = qualidade
+    for codificacao in PREFERENCIA_CODIFICACAO:
+        if codificacao in disponiveis and aceitas.get(codificacao, aceitas.get("*", 0.0)) > 0:
+            return codificacao
+    return "identity"
+
+# Nome com o hash do conteúdo: styles/index.css -> styles/index.3f2a9c1b7d.css
+def nome_com_hash(caminho: str, hash_conteudo: str) -> str:
+    base, extensao = posixpath.splitext(caminho)
+    return f"{base}.{hash_conteudo[:10]}{extensao}"
+
+# Lê o diretório do frontend uma vez e monta o mapa URL -> (recurso, Cache-Control), com o HTML apontando para os nomes com hash
+def construir_frontend(diretorio: str = FRONTEND_DIR, prefixo: str = PREFIXO_FRONTEND) -> dict[str, tuple[Recurso, str]]:
+    arquivos: dict[str, bytes] = {}
+    for raiz, _, nomes in os.walk(diretorio):
+        for nome in nomes:
+            caminho_completo = os.path.join(raiz, nome)
+            with open(caminho_completo, "rb") as arquivo:
+                arquivos[os.path.relpath(caminho_completo, diretorio).replace(os.sep, "/")] = arquivo.read()
+
+    recursos: dict[str, tuple[Recurso, str]] = {}
+    com_hash: dict[str, str] = {}
+    for caminho, conteudo in arquivos.items():
+        if caminho.endswith(".html"):
+            continue
+        recurso = Recurso(conteudo, caminho)
+        # O nome original continua disponível (revalidado) para referências que não passam pelo HTML
+        recursos[caminho] = (recurso, CACHE_REVALIDAR)
+        com_hash[caminho] = nome_com_hash(caminho, recurso.hash)
+        recursos[com_hash[caminho]] = (recurso, CACHE_IMUTAVEL)
+
+    for caminho, conteudo in arquivos.items():
+        if not caminho.endswith(".html"):
+            continue
+        pasta = posixpath.dirname(caminho)
+
+        def reescrever(encontrado: re.Match) -> str:
+            alvo = posixpath.normpath(posixpath.join(pasta, encontrado.group(2)))
+            if alvo not in com_hash:
+                return encontrado.group(0)
+            return f"{encontrado.group(1)}{prefixo}/{com_hash[alvo]}{encontrado.group(3)}"
+
+        html = ATRIBUTO_RECURSO.sub(reescrever, conteudo.decode("utf-8"))
+        html = html.replace("<head>", f"<head>\n    {META_API}", 1)
+        recursos[caminho] = (Recurso(html.encode("utf-8"), caminho), CACHE_REVALIDAR)
+    return recursos
+
+_recursos: Optional[dict[str, tuple[Recurso, str]]] = None
+_lock = Lock()
+
+# Retorna o mapa de recursos, construído no início da aplicação (ou no primeiro uso, fora dela)
+def obter_recursos() -> dict[str, tuple[Recurso, str]]:
+    global _recursos
+    with _lock:
+        if _recursos is None:
+            _recursos = construir_frontend()
+        return _recursos
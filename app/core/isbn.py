@@ -0,0 +1,30 @@
+import re
+
+# Calcula o dígito verificador do ISBN-10 a partir dos 9 primeiros dígitos
+def digito_isbn10(base: str) -> str:
+    resto = sum((10 - posicao) * int(digito) for posicao, digito in enumerate(base)) % 11
+    digito = (11 - resto) % 11
+    return "X" if digito == 10 else str(digito)
+
+# Calcula o dígito verificador do ISBN-13 a partir dos 12 primeiros dígitos
+def digito_isbn13(base: str) -> str:
+    soma = sum(int(digito) * (3 if posicao % 2 else 1) for posicao, digito in enumerate(base))
+    return str((10 - soma % 10) % 10)
+
+# Remove hífens e espaços e valida o dígito verificador do ISBN-10 ou ISBN-13 lido pelo scanner
+def normalizar_isbn(valor: str) -> str:
+    isbn = re.sub(r"[\s-]", "", valor).upper()
+    if re.fullmatch(r"\d{9}[\dX]", isbn) and digito_isbn10(isbn[:9]) == isbn[9]:
+        return isbn
+    if re.fullmatch(r"\d{13}", isbn) and digito_isbn13(isbn[:12]) == isbn[12]:
+        return isbn
+    raise ValueError("ISBN inválido")
+
+# Retorna as formas equivalentes (ISBN-10 e ISBN-13) para buscar o livro independente do formato cadastrado
+def variantes_isbn(isbn: str) -> list[str]:
+    if len(isbn) == 10:
+        base13 = "978" + isbn[:9]
+        return [isbn, base13 + digito_isbn13(base13)]
+    if isbn.startswith("978"):
+        return [isbn, isbn[3:12] + digito_isbn10(isbn[3:12])]
+    return [isbn]
@@ -1,8 +1,9 @@
 from datetime import datetime, timedelta, timezone
 import os
-from jose import jwt
+from jose import JWTError, jwt
 from typing import Optional
 from dotenv import load_dotenv
+from app.db.bibliotecas import BIBLIOTECA_PADRAO
 
 # Carrega variáveis de ambiente do arquivo .env
 load_dotenv()
@@ -24,3 +25,11 @@ def cria_token_acesso(dados: dict, senha_secreta: str = senha_token, tempo_expir
     # Retorna o token JWT gerado
     return token_jwt
 
+# Filial gravada no token; None se o token for inválido (a autenticação da rota é quem recusa)
+# Tokens emitidos antes das filiais não têm a claim e pertencem à filial padrão
+def biblioteca_do_token(token: str, senha_secreta: str = senha_token) -> Optional[int]:
+    try:
+        payload = jwt.decode(token, senha_secreta, algorithms=[algoritmo_token])
+    except JWTError:
+        return None
+    return int(payload.get("biblioteca_id", BIBLIOTECA_PADRAO))
@@ -0,0 +1,268 @@
+from app.db.session import mapa_bibliotecas
+from app.db.bibliotecas import BIBLIOTECA_PADRAO
+from app.core.security import obter_usuario_por_token
+from app.core.jwt import biblioteca_do_token
+from app.models.usuarios_models import roleEnum
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.concurrency import run_in_threadpool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from collections import Counter
+from contextvars import Context, ContextVar
+from dotenv import load_dotenv
+from threading import Event, Lock, Thread, get_ident
+from typing import Optional
+from urllib.parse import parse_qs
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import time
+import uuid
+
+# Carrega variáveis de ambiente do arquivo .env
+load_dotenv()
+
+# Permite perfilar requisições sob demanda (cabeçalho X-Perfilar ou ?perfilar=1, apenas bibliotecário)
+PERFILADOR_HABILITADO = os.getenv("PERFILADOR_HABILITADO", "true").lower() == "true"
+# Intervalo entre amostras das pilhas de execução
+PERFILADOR_INTERVALO_MS = float(os.getenv("PERFILADOR_INTERVALO_MS", "1"))
+# Quantidade de perfis mantidos para download
+PERFIS_MAXIMO = 20
+# Arquivo SQLite onde os perfis ficam guardados: o download pode cair em outro worker da mesma máquina
+PERFIS_SQLITE_PATH = os.getenv("PERFIS_SQLITE_PATH", "perfis.sqlite3")
+# Tamanho máximo do SQL exibido como quadro no flame graph
+TAMANHO_ROTULO_SQL = 80
+
+CABECALHO_PERFILAR = b"x-perfilar"
+PERFIL_ATUAL: ContextVar[Optional["Perfil"]] = ContextVar("perfil_atual", default=None)
+
+# Perfil de uma requisição: contagem de pilhas amostradas e intervalos das consultas SQL
+class Perfil:
+    def __init__(self, rota: str, intervalo_ms: float):
+        self.id = uuid.uuid4().hex[:12]
+        self.rota = rota
+        self.intervalo_ms = intervalo_ms
+        self.inicio = time.perf_counter()
+        self.duracao_ms = 0.0
+        self.amostras: Counter[tuple[str, ...]] = Counter()
+        self.sql_em_andamento: dict[int, tuple[str, float]] = {}
+        self.spans_sql: list[tuple[str, float, float]] = []
+        self.tarefa: Optional[asyncio.Task] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread_loop = get_ident()
+
+    # Tempo relativo ao início do perfil, em milissegundos
+    def agora_ms(self) -> float:
+        return (time.perf_counter() - self.inicio) * 1000
+
+    # Tempo total gasto em SQL
+    def tempo_sql_ms(self) -> float:
+        return sum(fim - inicio for _, inicio, fim in self.spans_sql)
+
+    # Pilhas no formato "collapsed" (uma linha por pilha: quadros separados por ';' e a contagem)
+    def collapsed(self) -> str:
+        return "".join(f"{';'.join(pilha)} {contagem}\n" for pilha, contagem in self.amostras.most_common())
+
+    # Perfil no formato do speedscope: pilhas amostradas e, em separado, a linha do tempo das consultas SQL
+    def speedscope(self) -> dict:
+        quadros: dict[str, int] = {}
+        amostras, pesos = [], []
+        for pilha, contagem in self.amostras.items():
+            amostras.append([quadros.setdefault(quadro, len(quadros)) for quadro in pilha])
+            pesos.append(contagem * self.intervalo_ms)
+        eventos = []
+        for sql, inicio, fim in sorted(self.spans_sql, key=lambda span: span[1]):
+            quadro = quadros.setdefault(sql, len(quadros))
+            eventos += [{"type": "O", "frame": quadro, "at": inicio}, {"type": "C", "frame": quadro, "at": fim}]
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": self.rota,
+            "shared": {"frames": [{"name": nome} for nome in quadros]},
+            "profiles": [
+                {"type": "sampled", "name": f"{self.rota} (amostras)", "unit": "milliseconds", "startValue": 0, "endValue": sum(pesos), "samples": amostras, "weights": pesos},
+                {"type": "evented", "name": f"{self.rota} (SQL)", "unit": "milliseconds", "startValue": 0, "endValue": self.duracao_ms, "events": eventos},
+            ],
+        }
+
+# Perfis recentes, disponíveis em GET /perfis/{id}, em arquivo SQLite compartilhado pelos workers da máquina
+# Cada perfil é gravado já nos dois formatos de download, então o worker que atende não precisa do objeto Perfil
+class ArmazemPerfis:
+    def __init__(self, caminho: str = PERFIS_SQLITE_PATH, maximo: int = PERFIS_MAXIMO):
+        self.caminho = caminho
+        self.maximo = maximo
+        with self._conectar() as conexao:
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.execute("CREATE TABLE IF NOT EXISTS perfis (id TEXT PRIMARY KEY, criado REAL NOT NULL, speedscope TEXT NOT NULL, collapsed TEXT NOT NULL)")
+
+    def _conectar(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.caminho, timeout=5, isolation_level=None)
+
+    # Guarda o perfil descartando os mais antigos além do máximo
+    def guardar(self, perfil: Perfil) -> None:
+        conexao = self._conectar()
+        try:
+            conexao.execute("BEGIN IMMEDIATE")
+            conexao.execute(
+                "INSERT OR REPLACE INTO perfis (id, criado, speedscope, collapsed) VALUES (?, ?, ?, ?)",
+                (perfil.id, time.time(), json.dumps(perfil.speedscope()), perfil.collapsed()),
+            )
+            conexao.execute("DELETE FROM perfis WHERE id NOT IN (SELECT id FROM perfis ORDER BY criado DESC LIMIT ?)", (self.maximo,))
+            conexao.execute("COMMIT")
+        finally:
+            conexao.close()
+
+    # Perfil no formato pedido ("speedscope" em JSON ou "collapsed"); None se não existe ou já foi descartado
+    def obter(self, perfil_id: str, formato: str) -> Optional[str]:
+        coluna = "collapsed" if formato == "collapsed" else "speedscope"
+        conexao = self._conectar()
+        try:
+            linha = conexao.execute(f"SELECT {coluna} FROM perfis WHERE id = ?", (perfil_id,)).fetchone()
+        finally:
+            conexao.close()
+        return linha[0] if linha else None
+
+armazem_perfis = ArmazemPerfis() if PERFILADOR_HABILITADO else None
+
+# Nome do quadro: função, arquivo (últimas duas partes do caminho) e linha da definição
+def _nome_quadro(codigo) -> str:
+    partes = codigo.co_filename.replace("\\", "/").rsplit("/", 2)
+    return f"{codigo.co_name} ({'/'.join(partes[-2:])}:{codigo.co_firstlineno})"
+
+# Verifica se a thread está executando código da requisição perfilada
+def _pertence(perfil: Perfil, thread_id: int, quadro) -> bool:
+    if thread_id == perfil.thread_loop:
+        # No event loop só contam as amostras em que a tarefa da requisição está rodando
+        tarefas_atuais = getattr(asyncio.tasks, "_current_tasks", None)
+        return tarefas_atuais is None or tarefas_atuais.get(perfil.loop) is perfil.tarefa
+    # Nas threads do threadpool, o contexto da requisição é o `context` do laço do worker (context.run)
+    while quadro is not None:
+        if quadro.f_code.co_name == "run" and "context" in quadro.f_code.co_varnames:
+            contexto = quadro.f_locals.get("context")
+            return isinstance(contexto, Context) and contexto.get(PERFIL_ATUAL) is perfil
+        quadro = quadro.f_back
+    return False
+
+# Thread que amostra periodicamente as pilhas das threads que trabalham na requisição
+class Amostrador(Thread):
+    def __init__(self, perfil: Perfil):
+        super().__init__(name="perfilador", daemon=True)
+        self.perfil = perfil
+        self.parar = Event()
+
+    def run(self) -> None:
+        intervalo = self.perfil.intervalo_ms / 1000
+        while not self.parar.wait(intervalo):
+            for thread_id, quadro in sys._current_frames().items():
+                if thread_id == self.ident or not _pertence(self.perfil, thread_id, quadro):
+                    continue
+                pilha = []
+                atual = quadro
+                while atual is not None:
+                    pilha.append(_nome_quadro(atual.f_code))
+                    atual = atual.f_back
+                pilha.reverse()
+                sql = self.perfil.sql_em_andamento.get(thread_id)
+                if sql:
+                    pilha.append(f"SQL: {sql[0]}")
+                self.perfil.amostras[tuple(pilha)] += 1
+
+# Marca o início de uma consulta da requisição perfilada
+def _antes_da_consulta(conexao, cursor, sql, parametros, contexto, executemany) -> None:
+    perfil = PERFIL_ATUAL.get()
+    if perfil is not None:
+        perfil.sql_em_andamento[get_ident()] = (" ".join(sql.split())[:TAMANHO_ROTULO_SQL], perfil.agora_ms())
+
+# Registra o intervalo da consulta concluída
+def _depois_da_consulta(conexao, cursor, sql, parametros, contexto, executemany) -> None:
+    perfil = PERFIL_ATUAL.get()
+    if perfil is not None:
+        em_andamento = perfil.sql_em_andamento.pop(get_ident(), None)
+        if em_andamento:
+            perfil.spans_sql.append((f"SQL: {em_andamento[0]}", em_andamento[1], perfil.agora_ms()))
+
+# Os listeners de SQL só ficam registrados enquanto houver alguma requisição sendo perfilada
+_perfis_ativos = 0
+_lock_listeners = Lock()
+
+def _ativar_listeners() -> None:
+    global _perfis_ativos
+    with _lock_listeners:
+        if _perfis_ativos == 0:
+            event.listen(Engine, "before_cursor_execute", _antes_da_consulta)
+            event.listen(Engine, "after_cursor_execute", _depois_da_consulta)
+        _perfis_ativos += 1
+
+def _desativar_listeners() -> None:
+    global _perfis_ativos
+    with _lock_listeners:
+        _perfis_ativos -= 1
+        if _perfis_ativos == 0:
+            event.remove(Engine, "before_cursor_execute", _antes_da_consulta)
+            event.remove(Engine, "after_cursor_execute", _depois_da_consulta)
+
+# Só bibliotecários podem perfilar; qualquer falha de autenticação apenas desliga o perfil
+def _usuario_pode_perfilar(autorizacao: Optional[str]) -> bool:
+    if not autorizacao or not autorizacao.lower().startswith("bearer "):
+        return False
+    token = autorizacao[7:].strip()
+    try:
+        with mapa_bibliotecas.sessao(biblioteca_do_token(token) or BIBLIOTECA_PADRAO) as db:
+            usuario = obter_usuario_por_token(db, token)
+    except Exception:
+        return False
+    return usuario.role == roleEnum.BIBLIOTECARIO.value
+
+# Middleware ASGI: sem o cabeçalho X-Perfilar ou o parâmetro perfilar, a requisição segue direto para a aplicação
+class MiddlewarePerfilador:
+    def __init__(self, app: ASGIApp, intervalo_ms: float = PERFILADOR_INTERVALO_MS):
+        self.app = app
+        self.intervalo_ms = intervalo_ms
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self._solicitado(scope):
+            await self.app(scope, receive, send)
+            return
+        cabecalhos = {nome: valor for nome, valor in scope["headers"]}
+        autorizacao = cabecalhos.get(b"authorization", b"").decode("latin-1")
+        if not await run_in_threadpool(_usuario_pode_perfilar, autorizacao):
+            await self.app(scope, receive, send)
+            return
+
+        perfil = Perfil(f"{scope['method']} {scope['path']}", self.intervalo_ms)
+        perfil.tarefa, perfil.loop = asyncio.current_task(), asyncio.get_running_loop()
+        amostrador = Amostrador(perfil)
+        token = PERFIL_ATUAL.set(perfil)
+        _ativar_listeners()
+        amostrador.start()
+
+        # O perfil termina quando a resposta começa: o corpo já foi serializado nesse ponto
+        async def enviar(mensagem: Message) -> None:
+            if mensagem["type"] == "http.response.start" and not amostrador.parar.is_set():
+                amostrador.parar.set()
+                perfil.duracao_ms = perfil.agora_ms()
+                # Serializar e gravar no arquivo fica fora do event loop
+                await run_in_threadpool(armazem_perfis.guardar, perfil)  # type: ignore
+                mensagem = {**mensagem, "headers": [
+                    *mensagem.get("headers", []),
+                    (b"x-perfil-id", perfil.id.encode()),
+                    (b"server-timing", f'sql;dur={perfil.tempo_sql_ms():.1f};desc="{len(perfil.spans_sql)} consultas", total;dur={perfil.duracao_ms:.1f}'.encode()),
+                ]}
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            amostrador.parar.set()
+            PERFIL_ATUAL.reset(token)
+            _desativar_listeners()
+
+    # Verificação barata feita em toda requisição: cabeçalho X-Perfilar ou ?perfilar=1
+    @staticmethod
+    def _solicitado(scope: Scope) -> bool:
+        if b"perfilar" in scope.get("query_string", b""):
+            valor = parse_qs(scope["query_string"].decode("latin-1")).get("perfilar", ["0"])[0]
+            if valor not in ("", "0", "false"):
+                return True
+        return any(nome == CABECALHO_PERFILAR for nome, _ in scope["headers"])
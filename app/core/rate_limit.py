@@ -0,0 +1,111 @@
+from fastapi import HTTPException, Request, status
+from dotenv import load_dotenv
+from threading import Lock
+from typing import Optional, Protocol
+import math
+import os
+import sqlite3
+import time
+
+# Carrega variáveis de ambiente do arquivo .env
+load_dotenv()
+
+# Configurações do limitador (token bucket): capacidade do balde e fichas repostas por segundo
+limite_backend = os.getenv("RATE_LIMIT_BACKEND", "memoria")
+limite_sqlite_caminho = os.getenv("RATE_LIMIT_SQLITE_PATH", "rate_limit.sqlite3")
+limite_ip_capacidade = int(os.getenv("RATE_LIMIT_IP_CAPACIDADE", "20"))
+limite_ip_por_segundo = float(os.getenv("RATE_LIMIT_IP_POR_SEGUNDO", "0.5"))
+limite_email_capacidade = int(os.getenv("RATE_LIMIT_EMAIL_CAPACIDADE", "5"))
+limite_email_por_segundo = float(os.getenv("RATE_LIMIT_EMAIL_POR_SEGUNDO", "0.05"))
+limite_max_chaves = int(os.getenv("RATE_LIMIT_MAX_CHAVES", "100000"))
+
+# Interface dos backends de armazenamento dos baldes
+class BackendLimite(Protocol):
+    # Consome uma ficha do balde e retorna 0 se permitido ou os segundos de espera
+    def consumir(self, chave: str, capacidade: int, por_segundo: float) -> float: ...
+
+# Calcula o novo estado do balde e o tempo de espera
+def _calcular_balde(fichas: float, atualizado: float, agora: float, capacidade: int, por_segundo: float) -> tuple[float, float]:
+    fichas = min(float(capacidade), fichas + (agora - atualizado) * por_segundo)
+    if fichas >= 1:
+        return fichas - 1, 0.0
+    return fichas, (1 - fichas) / por_segundo
+
+# Backend em memória do processo, protegido por lock
+class BackendMemoria:
+    def __init__(self, max_chaves: int = limite_max_chaves):
+        self.max_chaves = max_chaves
+        self.baldes: dict[str, tuple[float, float]] = {}
+        self.lock = Lock()
+
+    def consumir(self, chave: str, capacidade: int, por_segundo: float) -> float:
+        agora = time.monotonic()
+        with self.lock:
+            fichas, atualizado = self.baldes.pop(chave, (float(capacidade), agora))
+            fichas, espera = _calcular_balde(fichas, atualizado, agora, capacidade, por_segundo)
+            # Reinsere no fim do dict para manter a ordem de uso e descartar as chaves mais antigas
+            self.baldes[chave] = (fichas, agora)
+            while len(self.baldes) > self.max_chaves:
+                self.baldes.pop(next(iter(self.baldes)))
+        return espera
+
+# Tempo para um balde vazio voltar a ficar cheio no limite mais lento; depois disso apagar o balde não muda nada
+retencao_baldes = max(limite_ip_capacidade / limite_ip_por_segundo, limite_email_capacidade / limite_email_por_segundo)
+
+# Backend em arquivo SQLite local, compartilhado entre os workers da mesma máquina
+class BackendSQLite:
+    # Consumos entre duas limpezas dos baldes parados há mais que a retenção
+    INTERVALO_LIMPEZA = 256
+
+    def __init__(self, caminho: str = limite_sqlite_caminho, retencao: float = retencao_baldes):
+        self.caminho = caminho
+        self.retencao = retencao
+        self.consumos = 0
+        with self._conectar() as conexao:
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.execute("CREATE TABLE IF NOT EXISTS baldes (chave TEXT PRIMARY KEY, fichas REAL NOT NULL, atualizado REAL NOT NULL)")
+            conexao.execute("CREATE INDEX IF NOT EXISTS ix_baldes_atualizado ON baldes (atualizado)")
+
+    def _conectar(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.caminho, timeout=5, isolation_level=None)
+
+    def consumir(self, chave: str, capacidade: int, por_segundo: float) -> float:
+        # time.time() porque o relógio precisa ser o mesmo entre processos
+        agora = time.time()
+        conexao = self._conectar()
+        try:
+            conexao.execute("BEGIN IMMEDIATE")
+            linha = conexao.execute("SELECT fichas, atualizado FROM baldes WHERE chave = ?", (chave,)).fetchone()
+            fichas, atualizado = linha if linha else (float(capacidade), agora)
+            fichas, espera = _calcular_balde(fichas, atualizado, agora, capacidade, por_segundo)
+            conexao.execute("INSERT OR REPLACE INTO baldes (chave, fichas, atualizado) VALUES (?, ?, ?)", (chave, fichas, agora))
+            self.consumos += 1
+            if self.consumos % self.INTERVALO_LIMPEZA == 0:
+                conexao.execute("DELETE FROM baldes WHERE atualizado < ?", (agora - self.retencao,))
+            conexao.execute("COMMIT")
+        finally:
+            conexao.close()
+        return espera
+
+# Cria o backend configurado no .env
+def criar_backend(nome: str = limite_backend) -> BackendLimite:
+    if nome == "sqlite":
+        return BackendSQLite()
+    if nome == "memoria":
+        return BackendMemoria()
+    raise ValueError(f"RATE_LIMIT_BACKEND inválido: {nome}")
+
+backend_limite: BackendLimite = criar_backend()
+
+# Verifica os limites por IP e por e-mail, levantando 429 com Retry-After quando excedidos
+def verifica_limite(request: Request, rota: str, email: Optional[str] = None) -> None:
+    ip = request.client.host if request.client else "desconhecido"
+    espera = backend_limite.consumir(f"{rota}:ip:{ip}", limite_ip_capacidade, limite_ip_por_segundo)
+    if email is not None and espera == 0:
+        espera = backend_limite.consumir(f"{rota}:email:{email.lower()}", limite_email_capacidade, limite_email_por_segundo)
+    if espera > 0:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Muitas tentativas, tente novamente mais tarde",
+            headers={"Retry-After": str(math.ceil(espera))},
+        )
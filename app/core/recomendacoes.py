@@ -0,0 +1,261 @@
+from app.models.emprestimo_models import Emprestimo, EmprestimoArquivado
+from app.core.eventos import difusor
+from app.db.bibliotecas import BIBLIOTECA_PADRAO
+from sqlalchemy import select, union_all, func
+from sqlalchemy.orm import Session
+from scipy import sparse
+from dotenv import load_dotenv
+from threading import Lock
+import numpy as np
+import logging
+import os
+import tempfile
+
+# Carrega variáveis de ambiente do arquivo .env
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Arquivo onde o índice da filial padrão é persistido entre reinícios; as demais filiais ganham um sufixo com o ID
+RECOMENDACOES_ARQUIVO = os.getenv("RECOMENDACOES_ARQUIVO", "recomendacoes.npz")
+# Quantidade de pares pendentes que dispara a consolidação na matriz principal
+LIMITE_PENDENTES = 50_000
+
+# Converte pares (linha, coluna) em uma matriz esparsa binária com os IDs mapeados para posições
+def _matriz_binaria(linhas: np.ndarray, colunas: np.ndarray) -> tuple[sparse.csr_matrix, np.ndarray, np.ndarray]:
+    ids_linhas, pos_linhas = np.unique(linhas, return_inverse=True)
+    ids_colunas, pos_colunas = np.unique(colunas, return_inverse=True)
+    matriz = sparse.csr_matrix(
+        (np.ones(len(pos_linhas), dtype=np.int32), (pos_linhas, pos_colunas)),
+        shape=(len(ids_linhas), len(ids_colunas)),
+    )
+    # Empréstimos repetidos do mesmo livro pelo mesmo leitor contam uma vez
+    matriz.data[:] = 1
+    return matriz, ids_linhas, ids_colunas
+
+# Índice "quem leu também pegou": matriz esparsa livro x livro de coocorrência entre leitores
+class IndiceRecomendacoes:
+    def __init__(self, caminho: str = RECOMENDACOES_ARQUIVO):
+        self.caminho = caminho
+        self.livro_ids = np.empty(0, dtype=np.int64)
+        self.coocorrencia = sparse.csr_matrix((0, 0), dtype=np.int32)
+        self.livros_por_leitor: dict[int, set[int]] = {}
+        self.pendentes: dict[int, dict[int, int]] = {}
+        self.total_pendentes = 0
+        self.ultimo_emprestimo_id = 0
+        # Empréstimos (ativos + arquivados) com ID até ultimo_emprestimo_id que entraram no índice: com o último ID,
+        # é a impressão digital do histórico que o arquivo representa
+        self.total_emprestimos = 0
+        self.top_k: dict[int, tuple[np.ndarray, np.ndarray]] = {}
+        self.carregado = False
+        self.lock = Lock()
+
+    # Constrói a matriz a partir de pares (leitor, livro) com operações vetorizadas: C = Rᵀ·R sem a diagonal
+    def construir(self, leitores: np.ndarray, livros: np.ndarray) -> None:
+        leitura, leitor_ids, livro_ids = _matriz_binaria(leitores, livros)
+        coocorrencia = (leitura.T @ leitura).tocsr()
+        coocorrencia.setdiag(0)
+        coocorrencia.eliminate_zeros()
+        livros_por_leitor = {
+            int(leitor_ids[i]): set(livro_ids[leitura.indices[leitura.indptr[i]:leitura.indptr[i + 1]]].tolist())
+            for i in range(len(leitor_ids))
+        }
+        self.livro_ids, self.coocorrencia, self.livros_por_leitor = livro_ids, coocorrencia.astype(np.int32), livros_por_leitor
+        self.pendentes, self.total_pendentes, self.top_k = {}, 0, {}
+
+    # Carrega do arquivo persistido ou do banco, e aplica os empréstimos posteriores ao arquivo
+    # O arquivo só é usado se o histórico do banco até o último ID dele ainda tem o mesmo maior ID e a mesma quantidade:
+    # um arquivo de outro banco (ou de um banco recriado) ou com empréstimos excluídos depois é reconstruído
+    def carregar(self, db: Session) -> None:
+        with self.lock:
+            if self.carregado:
+                return
+            historico = union_all(
+                select(Emprestimo.emprestimo_id, Emprestimo.leitor_id, Emprestimo.livro_id),
+                select(EmprestimoArquivado.emprestimo_id, EmprestimoArquivado.leitor_id, EmprestimoArquivado.livro_id),
+            ).subquery()
+            lido = self._ler_arquivo()
+            if lido:
+                maior_id, total = db.execute(
+                    select(func.max(historico.c.emprestimo_id), func.count()).where(historico.c.emprestimo_id <= self.ultimo_emprestimo_id)
+                ).one()
+                if (maior_id or 0, total) != (self.ultimo_emprestimo_id, self.total_emprestimos):
+                    logger.warning("Índice de recomendações não corresponde ao histórico do banco, reconstruindo a partir do banco")
+                    lido = False
+            if not lido:
+                linhas = np.array(db.execute(select(historico.c.leitor_id, historico.c.livro_id)).all(), dtype=np.int64).reshape(-1, 2)
+                self.construir(linhas[:, 0], linhas[:, 1])
+                self.ultimo_emprestimo_id = db.execute(select(func.max(historico.c.emprestimo_id))).scalar() or 0
+                self.total_emprestimos = len(linhas)
+            else:
+                novos = db.execute(
+                    select(Emprestimo.emprestimo_id, Emprestimo.leitor_id, Emprestimo.livro_id)
+                    .where(Emprestimo.emprestimo_id > self.ultimo_emprestimo_id)
+                    .order_by(Emprestimo.emprestimo_id)
+                ).all()
+                for emprestimo_id, leitor_id, livro_id in novos:
+                    self._registrar(emprestimo_id, leitor_id, livro_id)
+            self.carregado = True
+
+    # Registra um novo empréstimo incrementando a coocorrência com os livros já lidos pelo leitor
+    def _registrar(self, emprestimo_id: int, leitor_id: int, livro_id: int) -> None:
+        self.ultimo_emprestimo_id = max(self.ultimo_emprestimo_id, emprestimo_id)
+        self.total_emprestimos += 1
+        lidos = self.livros_por_leitor.setdefault(leitor_id, set())
+        if livro_id in lidos:
+            return
+        linha = self.pendentes.setdefault(livro_id, {})
+        for outro in lidos:
+            linha[outro] = linha.get(outro, 0) + 1
+            linha_outro = self.pendentes.setdefault(outro, {})
+            linha_outro[livro_id] = linha_outro.get(livro_id, 0) + 1
+            self.top_k.pop(outro, None)
+        self.total_pendentes += 2 * len(lidos)
+        self.top_k.pop(livro_id, None)
+        lidos.add(livro_id)
+        if self.total_pendentes >= LIMITE_PENDENTES:
+            self._consolidar()
+
+    # Incorpora os incrementos pendentes à matriz principal, ampliando o mapeamento de livros se preciso
+    def _consolidar(self) -> None:
+        base = self.coocorrencia.tocoo()
+        linhas = [self.livro_ids[base.row]]
+        colunas = [self.livro_ids[base.col]]
+        valores = [base.data]
+        for livro_id, vizinhos in self.pendentes.items():
+            linhas.append(np.full(len(vizinhos), livro_id, dtype=np.int64))
+            colunas.append(np.fromiter(vizinhos.keys(), dtype=np.int64, count=len(vizinhos)))
+            valores.append(np.fromiter(vizinhos.values(), dtype=np.int32, count=len(vizinhos)))
+        todas_linhas, todas_colunas = np.concatenate(linhas), np.concatenate(colunas)
+        livro_ids = np.union1d(np.union1d(self.livro_ids, todas_linhas), todas_colunas)
+        self.coocorrencia = sparse.csr_matrix(
+            (np.concatenate(valores), (np.searchsorted(livro_ids, todas_linhas), np.searchsorted(livro_ids, todas_colunas))),
+            shape=(len(livro_ids), len(livro_ids)),
+            dtype=np.int32,
+        )
+        self.livro_ids = livro_ids
+        self.pendentes, self.total_pendentes = {}, 0
+
+    # Calcula os vizinhos de um livro somando a linha da matriz com os incrementos pendentes
+    def _calcular_vizinhos(self, livro_id: int) -> tuple[np.ndarray, np.ndarray]:
+        posicao = np.searchsorted(self.livro_ids, livro_id)
+        if posicao < len(self.livro_ids) and self.livro_ids[posicao] == livro_id:
+            inicio, fim = self.coocorrencia.indptr[posicao], self.coocorrencia.indptr[posicao + 1]
+            ids, pontuacoes = self.livro_ids[self.coocorrencia.indices[inicio:fim]], self.coocorrencia.data[inicio:fim]
+        else:
+            ids, pontuacoes = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32)
+        extras = self.pendentes.get(livro_id)
+        if extras:
+            ids = np.concatenate([ids, np.fromiter(extras.keys(), dtype=np.int64, count=len(extras))])
+            pontuacoes = np.concatenate([pontuacoes, np.fromiter(extras.values(), dtype=np.int32, count=len(extras))])
+            ids, inverso = np.unique(ids, return_inverse=True)
+            pontuacoes = np.bincount(inverso, weights=pontuacoes).astype(np.int32)
+        # Ordena por pontuação decrescente e, no empate, pelo menor ID
+        ordem = np.lexsort((ids, -pontuacoes))
+        return ids[ordem], pontuacoes[ordem]
+
+    # Retorna os K livros mais emprestados pelos mesmos leitores, com cache por livro
+    def recomendar(self, livro_id: int, limite: int = 10) -> list[tuple[int, int]]:
+        with self.lock:
+            vizinhos = self.top_k.get(livro_id)
+            if vizinhos is None:
+                vizinhos = self.top_k[livro_id] = self._calcular_vizinhos(livro_id)
+        ids, pontuacoes = vizinhos
+        return list(zip(ids[:limite].tolist(), pontuacoes[:limite].tolist()))
+
+    # Atualiza o índice a partir dos eventos de empréstimo criados em qualquer worker
+    def aplicar_evento(self, evento: dict) -> None:
+        if evento.get("tipo") != "emprestimo_criado":
+            return
+        emprestimo = evento["emprestimo"]
+        with self.lock:
+            if self.carregado:
+                self._registrar(emprestimo["emprestimo_id"], emprestimo["leitor_id"], emprestimo["livro_id"])
+
+    # Persiste o índice de forma compacta (arrays CSR comprimidos)
+    # Grava em um temporário na mesma pasta e troca com os.replace: vários workers salvando no encerramento (ou uma
+    # queda no meio) nunca deixam um arquivo truncado ou misturado; vale o último arquivo completo
+    def salvar(self) -> None:
+        with self.lock:
+            if not self.carregado:
+                return
+            if self.pendentes:
+                self._consolidar()
+            leitores = np.fromiter(self.livros_por_leitor.keys(), dtype=np.int64, count=len(self.livros_por_leitor))
+            quantidades = np.fromiter((len(lidos) for lidos in self.livros_por_leitor.values()), dtype=np.int64, count=len(leitores))
+            lidos = np.fromiter((livro for lidos in self.livros_por_leitor.values() for livro in lidos), dtype=np.int64, count=int(quantidades.sum()))
+            descritor, temporario = tempfile.mkstemp(prefix=os.path.basename(self.caminho) + ".", suffix=".tmp", dir=os.path.dirname(os.path.abspath(self.caminho)))
+            try:
+                with os.fdopen(descritor, "wb") as arquivo:
+                    np.savez_compressed(
+                        arquivo,
+                        livro_ids=self.livro_ids,
+                        indptr=self.coocorrencia.indptr,
+                        indices=self.coocorrencia.indices,
+                        data=self.coocorrencia.data,
+                        leitores=leitores,
+                        quantidades=quantidades,
+                        lidos=lidos,
+                        ultimo_emprestimo_id=np.array([self.ultimo_emprestimo_id]),
+                        total_emprestimos=np.array([self.total_emprestimos]),
+                    )
+                os.replace(temporario, self.caminho)
+            except BaseException:
+                os.unlink(temporario)
+                raise
+
+    # Lê o índice persistido; retorna False se o arquivo não existe ou está inválido
+    def _ler_arquivo(self) -> bool:
+        if not os.path.exists(self.caminho):
+            return False
+        try:
+            with np.load(self.caminho) as arquivo:
+                livro_ids = arquivo["livro_ids"]
+                self.coocorrencia = sparse.csr_matrix(
+                    (arquivo["data"], arquivo["indices"], arquivo["indptr"]), shape=(len(livro_ids), len(livro_ids))
+                )
+                self.livro_ids = livro_ids
+                limites = np.concatenate([[0], np.cumsum(arquivo["quantidades"])])
+                lidos = arquivo["lidos"]
+                self.livros_por_leitor = {
+                    int(leitor): set(lidos[limites[i]:limites[i + 1]].tolist()) for i, leitor in enumerate(arquivo["leitores"])
+                }
+                self.ultimo_emprestimo_id = int(arquivo["ultimo_emprestimo_id"][0])
+                self.total_emprestimos = int(arquivo["total_emprestimos"][0])
+        except (OSError, KeyError, ValueError):
+            logger.exception("Índice de recomendações inválido, reconstruindo a partir do banco")
+            return False
+        self.pendentes, self.total_pendentes, self.top_k = {}, 0, {}
+        return True
+
+# Um índice por filial, criado no primeiro uso: leitores e acervo de uma filial não se misturam com os de outra
+indices_recomendacoes: dict[int, IndiceRecomendacoes] = {}
+_lock_indices = Lock()
+
+# Arquivo do índice da filial: recomendacoes.npz para a padrão, recomendacoes.7.npz para a filial 7
+def _arquivo_da_biblioteca(biblioteca_id: int) -> str:
+    if biblioteca_id == BIBLIOTECA_PADRAO:
+        return RECOMENDACOES_ARQUIVO
+    base, extensao = os.path.splitext(RECOMENDACOES_ARQUIVO)
+    return f"{base}.{biblioteca_id}{extensao}"
+
+# Retorna o índice da filial, criando-o (ainda não carregado) se for o primeiro acesso
+def indice_recomendacoes(biblioteca_id: int) -> IndiceRecomendacoes:
+    with _lock_indices:
+        indice = indices_recomendacoes.get(biblioteca_id)
+        if indice is None:
+            indice = indices_recomendacoes[biblioteca_id] = IndiceRecomendacoes(_arquivo_da_biblioteca(biblioteca_id))
+        return indice
+
+# Encaminha o evento ao índice da filial que o publicou; filiais sem índice carregado leem o histórico do banco depois
+def _aplicar_evento(evento: dict) -> None:
+    indice = indices_recomendacoes.get(evento.get("biblioteca_id", BIBLIOTECA_PADRAO))
+    if indice is not None:
+        indice.aplicar_evento(evento)
+
+# Persiste os índices de todas as filiais usadas por este processo
+def salvar_indices_recomendacoes() -> None:
+    for indice in list(indices_recomendacoes.values()):
+        indice.salvar()
+
+difusor.registrar_callback(_aplicar_evento)
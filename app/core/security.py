@@ -32,7 +32,10 @@ def verifica_role(roles_permitidas: list[str]):
 
 # Obtém o usuário atual a partir do token JWT
 def obter_usuario_atual(db: Session = Depends(get_db), credentials: HTTPAuthorizationCredentials = Depends(seguranca)) -> Usuario:
-    token = credentials.credentials
+    return obter_usuario_por_token(db, credentials.credentials)
+
+# Valida o token JWT e retorna o usuário correspondente
+def obter_usuario_por_token(db: Session, token: str) -> Usuario:
     try:
         payload = jwt.decode(token, os.getenv("SENHA_TOKEN", "minha_senha_secreta") , algorithms=["HS256"])
         usuario_id = cast(str, payload.get("sub"))
@@ -0,0 +1,178 @@
+from app.models.livro_models import Livro
+from app.models.autores_models import Autor
+from app.core.eventos import difusor
+from app.db.bibliotecas import BIBLIOTECA_PADRAO
+from app.db.session import mapa_bibliotecas
+from sqlalchemy import select, func, or_
+from sqlalchemy.orm import Session
+from bisect import bisect_left, insort
+from threading import Lock
+from typing import Optional
+import unicodedata
+
+TIPO_TITULO = "titulo"
+TIPO_AUTOR = "autor"
+
+# Normaliza o texto para comparação de prefixos: minúsculas e sem acentos
+def normalizar(texto: str) -> str:
+    decomposto = unicodedata.normalize("NFKD", texto.casefold())
+    return "".join(c for c in decomposto if not unicodedata.combining(c)).strip()
+
+# Monta o nome completo do autor exibido nas sugestões
+def nome_autor(nome: Optional[str], sobrenome: Optional[str]) -> str:
+    return f"{nome or ''} {sobrenome or ''}".strip()
+
+# Índice de prefixos em memória: lista ordenada de (chave normalizada, tipo, id) consultada por busca binária
+class IndiceSugestoes:
+    def __init__(self):
+        self.chaves: list[tuple[str, str, int]] = []
+        self.textos: dict[tuple[str, int], str] = {}
+        self.chaves_por_item: dict[tuple[str, int], list[str]] = {}
+        self.carregado = False
+        self.carregando = False
+        self.pendentes: list[dict] = []
+        self.lock = Lock()
+
+    # Carrega o catálogo uma única vez com uma consulta por tabela, apenas com as colunas necessárias
+    def carregar(self, db: Session) -> None:
+        with self.lock:
+            if self.carregado or self.carregando:
+                return
+            self.carregando = True
+        try:
+            livros = db.execute(select(Livro.livro_id, Livro.titulo)).all()
+            autores = db.execute(select(Autor.autor_id, Autor.nome, Autor.sobrenome)).all()
+        except Exception:
+            with self.lock:
+                self.carregando = False
+            raise
+        chaves: list[tuple[str, str, int]] = []
+        textos: dict[tuple[str, int], str] = {}
+        chaves_por_item: dict[tuple[str, int], list[str]] = {}
+        for livro_id, titulo in livros:
+            self._indexar(chaves, textos, chaves_por_item, TIPO_TITULO, livro_id, titulo, [titulo])
+        for autor_id, nome, sobrenome in autores:
+            self._indexar(chaves, textos, chaves_por_item, TIPO_AUTOR, autor_id, nome_autor(nome, sobrenome), [nome_autor(nome, sobrenome), sobrenome or ""])
+        chaves.sort()
+        with self.lock:
+            self.chaves, self.textos, self.chaves_por_item = chaves, textos, chaves_por_item
+            self.carregado, self.carregando = True, False
+            pendentes, self.pendentes = self.pendentes, []
+        # Reaplica os eventos que chegaram durante a carga
+        for evento in pendentes:
+            self.aplicar_evento(evento)
+
+    @staticmethod
+    def _indexar(chaves: list, textos: dict, chaves_por_item: dict, tipo: str, item_id: int, texto: str, variantes: list[str]) -> None:
+        normalizadas = sorted({normalizar(v) for v in variantes if v and normalizar(v)})
+        textos[(tipo, item_id)] = texto
+        chaves_por_item[(tipo, item_id)] = normalizadas
+        chaves.extend((chave, tipo, item_id) for chave in normalizadas)
+
+    # Insere ou substitui um item; chamado com o lock adquirido
+    def _atualizar_item(self, tipo: str, item_id: int, texto: str, variantes: list[str]) -> None:
+        self._remover_item(tipo, item_id)
+        novas: list[tuple[str, str, int]] = []
+        self._indexar(novas, self.textos, self.chaves_por_item, tipo, item_id, texto, variantes)
+        for chave in novas:
+            insort(self.chaves, chave)
+
+    # Remove um item; chamado com o lock adquirido
+    def _remover_item(self, tipo: str, item_id: int) -> None:
+        for chave in self.chaves_por_item.pop((tipo, item_id), []):
+            posicao = bisect_left(self.chaves, (chave, tipo, item_id))
+            if posicao < len(self.chaves) and self.chaves[posicao] == (chave, tipo, item_id):
+                del self.chaves[posicao]
+        self.textos.pop((tipo, item_id), None)
+
+    # Atualiza o índice de forma incremental a partir dos eventos de escrita do catálogo
+    def aplicar_evento(self, evento: dict) -> None:
+        tipo = evento.get("tipo")
+        with self.lock:
+            if self.carregando:
+                self.pendentes.append(evento)
+                return
+            if not self.carregado:
+                return
+            if tipo in ("livro_criado", "livro_atualizado"):
+                livro = evento["livro"]
+                self._atualizar_item(TIPO_TITULO, livro["livro_id"], livro["titulo"], [livro["titulo"]])
+            elif tipo == "livro_removido":
+                self._remover_item(TIPO_TITULO, evento["livro_id"])
+            elif tipo == "livros_removidos":
+                for livro_id in evento["livros_ids"]:
+                    self._remover_item(TIPO_TITULO, livro_id)
+            elif tipo in ("autor_criado", "autor_atualizado"):
+                nome = nome_autor(evento.get("nome"), evento.get("sobrenome"))
+                self._atualizar_item(TIPO_AUTOR, evento["autor_id"], nome, [nome, evento.get("sobrenome") or ""])
+            elif tipo == "autor_removido":
+                self._remover_item(TIPO_AUTOR, evento["autor_id"])
+
+    # Retorna até `limite` sugestões cujo título ou nome de autor começa com o termo
+    def sugerir(self, termo: str, limite: int = 10) -> list[dict]:
+        prefixo = normalizar(termo)
+        if not prefixo:
+            return []
+        sugestoes: list[dict] = []
+        vistos: set[tuple[str, int]] = set()
+        with self.lock:
+            posicao = bisect_left(self.chaves, (prefixo,))
+            while posicao < len(self.chaves) and len(sugestoes) < limite:
+                chave, tipo, item_id = self.chaves[posicao]
+                if not chave.startswith(prefixo):
+                    break
+                if (tipo, item_id) not in vistos:
+                    vistos.add((tipo, item_id))
+                    sugestoes.append({"tipo": tipo, "id": item_id, "texto": self.textos[(tipo, item_id)]})
+                posicao += 1
+        return sugestoes
+
+# Um índice por filial: os títulos vêm do acervo da filial e os autores do nó que a hospeda
+indices_sugestoes: dict[int, IndiceSugestoes] = {}
+_lock_indices = Lock()
+
+# Retorna o índice da filial, criando-o (ainda não carregado) se for o primeiro acesso
+def indice_sugestoes(biblioteca_id: int) -> IndiceSugestoes:
+    with _lock_indices:
+        indice = indices_sugestoes.get(biblioteca_id)
+        if indice is None:
+            indice = indices_sugestoes[biblioteca_id] = IndiceSugestoes()
+        return indice
+
+# Sugestões direto do banco (LIKE de prefixo), usadas enquanto o índice da filial está sendo carregado
+# Sem a normalização de acentos do índice, mas nunca uma lista vazia só porque a carga ainda não terminou
+def sugerir_pelo_banco(db: Session, termo: str, limite: int = 10) -> list[dict]:
+    prefixo = termo.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    if prefixo == "%":
+        return []
+    livros = db.execute(
+        select(Livro.livro_id, Livro.titulo).where(Livro.titulo.ilike(prefixo, escape="\\")).order_by(Livro.titulo).limit(limite)
+    ).all()
+    sugestoes = [{"tipo": TIPO_TITULO, "id": livro_id, "texto": titulo} for livro_id, titulo in livros]
+    if len(sugestoes) < limite:
+        nome_completo = func.coalesce(Autor.nome, "") + " " + func.coalesce(Autor.sobrenome, "")
+        autores = db.execute(
+            select(Autor.autor_id, Autor.nome, Autor.sobrenome)
+            .where(or_(nome_completo.ilike(prefixo, escape="\\"), Autor.sobrenome.ilike(prefixo, escape="\\")))
+            .order_by(Autor.nome, Autor.sobrenome).limit(limite - len(sugestoes))
+        ).all()
+        sugestoes += [{"tipo": TIPO_AUTOR, "id": autor_id, "texto": nome_autor(nome, sobrenome)} for autor_id, nome, sobrenome in autores]
+    return sugestoes
+
+# Sugestões da filial da sessão: do índice em memória ou, enquanto outra requisição o carrega, do banco
+def sugestoes_da_biblioteca(db: Session, biblioteca_id: int, termo: str, limite: int = 10) -> list[dict]:
+    indice = indice_sugestoes(biblioteca_id)
+    indice.carregar(db)
+    if not indice.carregado:
+        return sugerir_pelo_banco(db, termo, limite)
+    return indice.sugerir(termo, limite)
+
+# Eventos de livro vão para a filial que os publicou; os de autor, para todas as filiais do mesmo nó
+def _aplicar_evento(evento: dict) -> None:
+    origem = evento.get("biblioteca_id", BIBLIOTECA_PADRAO)
+    de_autor = str(evento.get("tipo", "")).startswith("autor_")
+    for biblioteca_id, indice in list(indices_sugestoes.items()):
+        if biblioteca_id == origem or (de_autor and mapa_bibliotecas.fabrica(biblioteca_id) is mapa_bibliotecas.fabrica(origem)):
+            indice.aplicar_evento(evento)
+
+difusor.registrar_callback(_aplicar_evento)
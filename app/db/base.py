@@ -1,5 +1,21 @@
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy import Integer
 
 # Create a base class for declarative class definitions.
 Base = declarative_base()
 
+# Ano corrente como expressão SQL portável, usada em CHECK constraints
+class ano_atual(FunctionElement):
+    type = Integer()
+    inherit_cache = True
+
+@compiles(ano_atual)
+def _ano_atual_padrao(elemento, compilador, **kw):
+    return "EXTRACT(YEAR FROM CURRENT_DATE)"
+
+# O SQLite não tem EXTRACT; CURRENT_DATE é aceito em CHECK, ao contrário de strftime('now')
+@compiles(ano_atual, "sqlite")
+def _ano_atual_sqlite(elemento, compilador, **kw):
+    return "CAST(substr(CURRENT_DATE, 1, 4) AS INTEGER)"
@@ -0,0 +1,53 @@
+from sqlalchemy import Column, Integer, event, text
+from sqlalchemy.orm import ORMExecuteState, Session, with_loader_criteria
+from dotenv import load_dotenv
+from functools import lru_cache
+import os
+
+# Carrega variáveis de ambiente do arquivo .env
+load_dotenv()
+
+# Filial usada quando a requisição não informa nenhuma; bancos anteriores às filiais migram com este valor
+BIBLIOTECA_PADRAO = int(os.getenv("BIBLIOTECA_PADRAO", "1"))
+# Opção de execução (ou chave em Session.info) que dispensa o filtro de filial, para consultas da rede inteira
+TODAS_BIBLIOTECAS = "todas_bibliotecas"
+
+# Colunas das tabelas particionadas por filial: acervo (estoque), empréstimos e usuários
+class PertenceBiblioteca:
+    biblioteca_id = Column(Integer, nullable=False, server_default=text(str(BIBLIOTECA_PADRAO)))
+
+# Filial a que a sessão está presa, definida ao abrir a sessão da requisição
+def biblioteca_da_sessao(db: Session) -> int:
+    return db.info.get("biblioteca_id", BIBLIOTECA_PADRAO)
+
+# Restringe toda consulta ORM (SELECT, UPDATE e DELETE, inclusive subconsultas e carregamentos de relacionamentos) à filial da sessão
+@event.listens_for(Session, "do_orm_execute")
+def _restringir_a_biblioteca(estado: ORMExecuteState) -> None:
+    if not (estado.is_select or estado.is_update or estado.is_delete) or estado.is_column_load or estado.is_relationship_load:
+        return
+    if estado.session.info.get(TODAS_BIBLIOTECAS) or estado.execution_options.get(TODAS_BIBLIOTECAS):
+        return
+    estado.statement = estado.statement.options(_criterio_da_biblioteca(biblioteca_da_sessao(estado.session)))
+
+# Opção de filtro montada uma vez por filial: reaproveitá-la evita reanalisar o lambda a cada consulta
+@lru_cache(maxsize=None)
+def _criterio_da_biblioteca(biblioteca_id: int):
+    return with_loader_criteria(PertenceBiblioteca, lambda cls: cls.biblioteca_id == biblioteca_id, include_aliases=True)
+
+# Linhas novas herdam a filial da sessão que as grava
+@event.listens_for(Session, "before_flush")
+def _preencher_biblioteca(db: Session, contexto, instancias) -> None:
+    for objeto in db.new:
+        if isinstance(objeto, PertenceBiblioteca) and objeto.biblioteca_id is None:
+            objeto.biblioteca_id = biblioteca_da_sessao(db)  # type: ignore
+
+# Lê o mapa de filiais por nó: "2-10=postgresql://no-a/gestbook;11=postgresql://no-b/gestbook"
+def ler_mapa_nos(texto: str) -> list[tuple[int, int, str]]:
+    faixas = []
+    for item in filter(None, (parte.strip() for parte in texto.split(";"))):
+        bibliotecas, _, url = item.partition("=")
+        inicio, _, fim = bibliotecas.strip().partition("-")
+        if not url.strip():
+            raise ValueError(f"BIBLIOTECAS_NOS: nó sem URL em '{item}'")
+        faixas.append((int(inicio), int(fim or inicio), url.strip()))
+    return faixas
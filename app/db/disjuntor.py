@@ -0,0 +1,122 @@
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine, ExceptionContext
+from dotenv import load_dotenv
+from threading import Lock
+import logging
+import os
+import sqlite3
+import time
+
+# Carrega variáveis de ambiente do arquivo .env
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Falhas seguidas de banco (timeouts, conexões recusadas ou perdidas) que abrem o disjuntor do nó
+DISJUNTOR_FALHAS = int(os.getenv("DISJUNTOR_FALHAS", "5"))
+# Tempo que o disjuntor fica aberto antes de deixar passar uma requisição de sondagem
+DISJUNTOR_ESPERA_SEGUNDOS = float(os.getenv("DISJUNTOR_ESPERA_SEGUNDOS", "10"))
+
+# SQLSTATEs do Postgres que indicam banco lento ou fora do ar, e não erro da consulta:
+# statement/lock timeout, servidor desligando ou iniciando, conexões esgotadas e falhas de conexão
+CODIGOS_INDISPONIBILIDADE = {"57014", "55P03", "57P01", "57P02", "57P03", "53300", "08000", "08001", "08003", "08006"}
+
+FECHADO = "fechado"
+ABERTO = "aberto"
+MEIO_ABERTO = "meio_aberto"
+
+# Verifica se o erro é de indisponibilidade do banco (conta para o disjuntor e vira 503)
+def erro_de_indisponibilidade(erro: BaseException) -> bool:
+    if isinstance(erro, exc.TimeoutError):
+        return True
+    if not isinstance(erro, exc.DBAPIError):
+        return False
+    if erro.connection_invalidated:
+        return True
+    codigo = getattr(erro.orig, "pgcode", None)
+    if codigo:
+        return codigo in CODIGOS_INDISPONIBILIDADE
+    # Sem SQLSTATE: no SQLite só o banco travado é timeout; no Postgres é falha ao conectar
+    if isinstance(erro.orig, sqlite3.Error):
+        return "database is locked" in str(erro.orig)
+    return isinstance(erro, exc.OperationalError)
+
+# Disjuntor de um nó de banco: depois de N falhas seguidas recusa requisições por um tempo, em vez de deixá-las
+# presas no pool; passado o tempo, libera uma sondagem por vez e volta a fechar na primeira consulta bem-sucedida
+class Disjuntor:
+    def __init__(self, nome: str, limite_falhas: int = DISJUNTOR_FALHAS, espera_segundos: float = DISJUNTOR_ESPERA_SEGUNDOS):
+        self.nome = nome
+        self.limite_falhas = limite_falhas
+        self.espera_segundos = espera_segundos
+        self.estado = FECHADO
+        self.falhas = 0
+        self.reabre_em = 0.0
+        self.sondagem_ate = 0.0
+        self.lock = Lock()
+
+    # Retorna 0 se a requisição pode usar o banco ou os segundos até a próxima tentativa
+    def liberar(self) -> float:
+        if self.estado == FECHADO:
+            return 0.0
+        agora = time.monotonic()
+        with self.lock:
+            if self.estado == FECHADO:
+                return 0.0
+            if self.estado == ABERTO:
+                if agora < self.reabre_em:
+                    return self.reabre_em - agora
+                self.estado = MEIO_ABERTO
+                logger.warning("Disjuntor do banco %s meio-aberto: sondando", self.nome)
+            elif agora < self.sondagem_ate:
+                # Já há uma sondagem em andamento; uma sondagem que não chegou a consultar expira e libera a próxima
+                return self.sondagem_ate - agora
+            self.sondagem_ate = agora + self.espera_segundos
+            return 0.0
+
+    # Segundos até o disjuntor aberto liberar a próxima sondagem (0 se não estiver aberto)
+    def espera(self) -> float:
+        return max(self.reabre_em - time.monotonic(), 0.0) if self.estado == ABERTO else 0.0
+
+    # Consulta concluída: zera as falhas e fecha o disjuntor
+    def registrar_sucesso(self) -> None:
+        if self.estado == FECHADO and not self.falhas:
+            return
+        with self.lock:
+            if self.estado != FECHADO:
+                logger.warning("Disjuntor do banco %s fechado: consultas restabelecidas", self.nome)
+            self.estado, self.falhas = FECHADO, 0
+
+    # Falha de indisponibilidade: abre ao atingir o limite ou se a sondagem falhou
+    def registrar_falha(self) -> None:
+        with self.lock:
+            self.falhas += 1
+            if self.estado == MEIO_ABERTO or (self.estado == FECHADO and self.falhas >= self.limite_falhas):
+                self.estado = ABERTO
+                self.reabre_em = time.monotonic() + self.espera_segundos
+                logger.warning("Disjuntor do banco %s aberto após %d falha(s) seguida(s)", self.nome, self.falhas)
+
+# Um disjuntor por engine (nó de banco)
+disjuntores: dict[Engine, Disjuntor] = {}
+_lock_disjuntores = Lock()
+
+# Retorna o disjuntor do engine, criando-o no primeiro uso
+def disjuntor_do_engine(engine: Engine) -> Disjuntor:
+    disjuntor = disjuntores.get(engine)
+    if disjuntor is None:
+        with _lock_disjuntores:
+            disjuntor = disjuntores.setdefault(engine, Disjuntor(engine.url.render_as_string(hide_password=True)))
+    return disjuntor
+
+# Toda consulta concluída em um nó conta como sucesso do seu disjuntor
+@event.listens_for(Engine, "after_cursor_execute")
+def _consulta_concluida(conexao, cursor, sql, parametros, contexto, executemany) -> None:
+    disjuntor = disjuntores.get(conexao.engine)
+    if disjuntor is not None:
+        disjuntor.registrar_sucesso()
+
+# Erros do driver (timeout de consulta, conexão recusada ou perdida) contam como falha; erros da consulta não
+@event.listens_for(Engine, "handle_error")
+def _consulta_falhou(contexto: ExceptionContext) -> None:
+    disjuntor = disjuntores.get(contexto.engine) if contexto.engine is not None else None
+    if disjuntor is not None and (contexto.is_disconnect or erro_de_indisponibilidade(contexto.sqlalchemy_exception)):
+        disjuntor.registrar_falha()
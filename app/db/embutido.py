@@ -0,0 +1,140 @@
+from app.db.base import Base
+from app.core.isbn import digito_isbn13
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+from datetime import datetime, timedelta
+import os
+import random
+
+# Pragmas do SQLite em arquivo: WAL permite leitores concorrentes com um escritor e NORMAL só sincroniza no checkpoint
+PRAGMAS_ARQUIVO = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "foreign_keys": "ON",
+    "busy_timeout": "5000",
+    "temp_store": "MEMORY",
+    "cache_size": "-64000",
+}
+# Pragmas do SQLite em memória: não há o que sincronizar com o disco
+PRAGMAS_MEMORIA = {
+    "journal_mode": "MEMORY",
+    "synchronous": "OFF",
+    "foreign_keys": "ON",
+    "temp_store": "MEMORY",
+}
+# Senha de todos os usuários semeados
+SENHA_SEMENTE = "senha123"
+
+# Indica se a URL aponta para um banco SQLite somente em memória
+def sqlite_em_memoria(url: str) -> bool:
+    return make_url(url).database in (None, "", ":memory:")
+
+# Liga o modo embutido para testes e benchmarks; precisa ser chamada antes de importar app.db.session
+# Um DATABASE_URL já definido no ambiente continua valendo
+def usar_banco_embutido(url: str = "sqlite://") -> None:
+    os.environ.setdefault("DATABASE_URL", url)
+
+# Cria o engine do SQLite com os pragmas aplicados a cada nova conexão
+def criar_engine_sqlite(url: str) -> Engine:
+    em_memoria = sqlite_em_memoria(url)
+    opcoes: dict = {"connect_args": {"check_same_thread": False}}
+    if em_memoria:
+        # Uma única conexão compartilhada: cada conexão nova em memória seria um banco vazio
+        opcoes["poolclass"] = StaticPool
+    engine = create_engine(url, **opcoes)
+    pragmas = PRAGMAS_MEMORIA if em_memoria else PRAGMAS_ARQUIVO
+
+    @event.listens_for(engine, "connect")
+    def _aplicar_pragmas(conexao, registro):
+        cursor = conexao.cursor()
+        for pragma, valor in pragmas.items():
+            cursor.execute(f"PRAGMA {pragma} = {valor}")
+        cursor.close()
+
+    return engine
+
+# Cria todas as tabelas a partir dos modelos; no Postgres o esquema continua sendo gerenciado fora da aplicação
+def criar_esquema(engine: Engine) -> None:
+    import app.models.usuarios_models, app.models.autores_models, app.models.generos_models  # noqa: F401
+    import app.models.livro_models, app.models.livros_generos_models, app.models.emprestimo_models, app.models.remocoes_models, app.models.circulacao_models  # noqa: F401
+    Base.metadata.create_all(engine)
+
+# ISBN-13 sintético e válido (dígito verificador correto) para o livro de número `numero`: passa pelo balcão por ISBN
+def isbn_semente(numero: int) -> str:
+    base = f"978{numero:09d}"
+    return base + digito_isbn13(base)
+
+# INSERT em lote; uma lista vazia viraria um INSERT de uma linha só com os valores padrão
+def _inserir_lote(db: Session, modelo, linhas: list) -> None:
+    if linhas:
+        db.execute(insert(modelo), linhas)
+
+# Popula o banco com dados sintéticos determinísticos usando inserções em lote (executemany)
+# Com várias filiais, leitores e livros são distribuídos em rodízio e cada empréstimo fica na filial do livro
+def semear_banco(db: Session, leitores: int = 50, autores: int = 100, generos: int = 20, livros: int = 1000, emprestimos: int = 2000, semente: int = 42, bibliotecas: int = 1) -> None:
+    from app.models.usuarios_models import Usuario, roleEnum
+    from app.models.autores_models import Autor
+    from app.models.generos_models import Genero
+    from app.models.livro_models import Livro
+    from app.models.livros_generos_models import LivrosGenerosModels
+    from app.models.emprestimo_models import Emprestimo, status_emprestimoEnum
+    from app.core.security import senha_hash
+
+    gerador = random.Random(semente)
+    # O hash Argon2 é caro de propósito; calcula uma vez e reaproveita para todos os usuários
+    hash_semente = senha_hash(SENHA_SEMENTE)
+    agora = datetime.now().replace(microsecond=0)
+
+    _inserir_lote(db, Usuario, [
+        {"usuario_id": 1, "nome": "Bibliotecário", "email": "bibliotecario@gestbook.com", "senha_hash": hash_semente, "role": roleEnum.BIBLIOTECARIO.value, "biblioteca_id": 1},
+        *({"usuario_id": i + 2, "nome": f"Leitor {i + 1}", "email": f"leitor{i + 1}@gestbook.com", "senha_hash": hash_semente, "role": roleEnum.LEITOR.value, "biblioteca_id": i % bibliotecas + 1} for i in range(leitores)),
+    ])
+    _inserir_lote(db, Autor, [
+        {"autor_id": i + 1, "nome": f"Autor {i + 1}", "sobrenome": f"Sobrenome {i % 37}", "nacionalidade": "Brasileira"}
+        for i in range(autores)
+    ])
+    _inserir_lote(db, Genero, [{"genero_id": i + 1, "nome": f"Gênero {i + 1}"} for i in range(generos)])
+    _inserir_lote(db, Livro, [
+        {
+            "livro_id": i + 1, "titulo": f"Livro {i + 1}", "isbn": isbn_semente(i + 1), "editora": "Editora Semente",
+            "ano_publicacao": gerador.randint(1950, agora.year), "numero_copias": gerador.randint(0, 5), "autor_id": gerador.randint(1, autores),
+            "biblioteca_id": i % bibliotecas + 1,
+        }
+        for i in range(livros)
+    ])
+    _inserir_lote(db, LivrosGenerosModels, [
+        {"livro_id": livro_id, "genero_id": genero_id}
+        for livro_id in range(1, livros + 1)
+        for genero_id in gerador.sample(range(1, generos + 1), k=min(2, generos))
+    ])
+    linhas_emprestimos = []
+    for i in range(emprestimos):
+        data_emprestimo = agora - timedelta(days=gerador.randint(1, 365))
+        devolvido = gerador.random() < 0.7
+        livro_id, leitor_id = gerador.randint(1, livros), gerador.randint(2, leitores + 1)
+        # Leva o leitor sorteado para a filial do livro (o leitor da mesma posição no rodízio daquela filial)
+        biblioteca_id = (livro_id - 1) % bibliotecas + 1
+        leitor_id -= ((leitor_id - 2) % bibliotecas) - (biblioteca_id - 1)
+        if leitor_id > leitores + 1:
+            leitor_id -= bibliotecas
+        linhas_emprestimos.append({
+            "emprestimo_id": i + 1, "livro_id": livro_id, "leitor_id": leitor_id, "bibliotecario_id": 1, "biblioteca_id": biblioteca_id,
+            "data_emprestimo": data_emprestimo, "data_devolucao_prevista": data_emprestimo + timedelta(days=14),
+            "data_devolucao_real": data_emprestimo + timedelta(days=gerador.randint(1, 20)) if devolvido else None,
+            "status_emprestimo": (status_emprestimoEnum.DEVOLVIDO if devolvido else status_emprestimoEnum.EMPRESTADO).value,
+        })
+    _inserir_lote(db, Emprestimo, linhas_emprestimos)
+    db.commit()
+
+# Fixture de testes e benchmarks: banco SQLite em memória, com esquema criado e opcionalmente semeado
+def criar_banco_de_teste(url: str = "sqlite://", semear: bool = True, **quantidades: int) -> sessionmaker:
+    usar_banco_embutido(url)
+    engine = criar_engine_sqlite(url)
+    criar_esquema(engine)
+    fabrica = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+    if semear:
+        with fabrica() as db:
+            semear_banco(db, **quantidades)
+    return fabrica
@@ -0,0 +1,145 @@
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from dotenv import load_dotenv
+from threading import Event, Thread
+from typing import Optional
+import hashlib
+import logging
+import os
+
+# Carregar variáveis de ambiente do arquivo .env
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Intervalo entre as atualizações das views de relatórios
+RELATORIOS_INTERVALO_MINUTOS = float(os.getenv("RELATORIOS_INTERVALO_MINUTOS", "15"))
+# Chave do advisory lock que garante um único worker atualizando as views por vez
+CHAVE_LOCK_RELATORIOS = 731_034
+# Tempo máximo para criar ou atualizar uma view; bem acima do statement_timeout padrão das conexões
+RELATORIOS_TIMEOUT_MS = int(os.getenv("RELATORIOS_TIMEOUT_MS", "600000"))
+SQL_TIMEOUT_RELATORIOS = "SELECT set_config('statement_timeout', :valor, true)"
+
+# Histórico completo de empréstimos: tabela ativa + arquivo
+HISTORICO_EMPRESTIMOS = """
+    SELECT biblioteca_id, livro_id, data_emprestimo, data_devolucao_real FROM emprestimo
+    UNION ALL
+    SELECT biblioteca_id, livro_id, data_emprestimo, data_devolucao_real FROM emprestimo_arquivo
+"""
+
+# Definição das views materializadas; cada uma tem um índice único, exigido pelo REFRESH CONCURRENTLY
+# Todas agregam por filial: um nó hospeda várias filiais e cada relatório é lido com o filtro da filial
+VIEWS_RELATORIOS = {
+    "mv_livros_mais_emprestados": (
+        f"""SELECT h.biblioteca_id, h.livro_id, l.titulo, COUNT(*) AS total_emprestimos
+        FROM ({HISTORICO_EMPRESTIMOS}) h JOIN livro l ON l.livro_id = h.livro_id
+        GROUP BY h.biblioteca_id, h.livro_id, l.titulo""",
+        "biblioteca_id, livro_id",
+    ),
+    "mv_emprestimos_por_mes": (
+        f"""SELECT h.biblioteca_id, CAST(date_trunc('month', h.data_emprestimo) AS DATE) AS mes, COUNT(*) AS total_emprestimos
+        FROM ({HISTORICO_EMPRESTIMOS}) h
+        GROUP BY 1, 2""",
+        "biblioteca_id, mes",
+    ),
+    "mv_generos_mais_emprestados": (
+        f"""SELECT h.biblioteca_id, g.genero_id, g.nome, COUNT(*) AS total_emprestimos
+        FROM ({HISTORICO_EMPRESTIMOS}) h
+        JOIN livros_generos lg ON lg.livro_id = h.livro_id
+        JOIN generos g ON g.genero_id = lg.genero_id
+        GROUP BY h.biblioteca_id, g.genero_id, g.nome""",
+        "biblioteca_id, genero_id",
+    ),
+    "mv_duracao_media_emprestimos": (
+        f"""SELECT h.biblioteca_id,
+            AVG(EXTRACT(EPOCH FROM (h.data_devolucao_real - h.data_emprestimo)) / 86400) AS media_dias,
+            COUNT(*) AS total_devolvidos
+        FROM ({HISTORICO_EMPRESTIMOS}) h
+        WHERE h.data_devolucao_real IS NOT NULL
+        GROUP BY h.biblioteca_id""",
+        "biblioteca_id",
+    ),
+}
+
+# Registra o momento da última atualização de cada view
+SQL_REGISTRAR_ATUALIZACAO = """
+    INSERT INTO relatorios_atualizacao (visao, atualizado_em) VALUES (:visao, LOCALTIMESTAMP)
+    ON CONFLICT (visao) DO UPDATE SET atualizado_em = EXCLUDED.atualizado_em
+"""
+
+# Hash da definição (consulta e chave do índice) gravado junto da view para saber quando ela mudou
+def hash_definicao(consulta: str, chave: str) -> str:
+    return hashlib.sha256(f"{consulta}\n{chave}".encode()).hexdigest()[:16]
+
+# Cria as views materializadas e a tabela de controle; uma view cuja definição mudou desde a criação
+# (ou criada antes do controle de versão) é recriada. O advisory lock da transação espera um REFRESH em andamento
+# e impede que dois workers recriem a mesma view ao mesmo tempo
+def criar_views_relatorios(engine: Engine) -> None:
+    with engine.begin() as conexao:
+        conexao.execute(text(SQL_TIMEOUT_RELATORIOS), {"valor": str(RELATORIOS_TIMEOUT_MS)})
+        conexao.execute(text("SELECT pg_advisory_xact_lock(:chave)"), {"chave": CHAVE_LOCK_RELATORIOS})
+        conexao.execute(text("CREATE TABLE IF NOT EXISTS relatorios_atualizacao (visao VARCHAR(100) PRIMARY KEY, atualizado_em TIMESTAMP NOT NULL)"))
+        conexao.execute(text("ALTER TABLE relatorios_atualizacao ADD COLUMN IF NOT EXISTS definicao VARCHAR(16)"))
+        definicoes = dict(conexao.execute(text("SELECT visao, definicao FROM relatorios_atualizacao")).all())
+        for visao, (consulta, chave) in VIEWS_RELATORIOS.items():
+            definicao = hash_definicao(consulta, chave)
+            if visao in definicoes and definicoes[visao] != definicao:
+                logger.warning("Definição da view %s mudou; recriando", visao)
+                conexao.execute(text(f"DROP MATERIALIZED VIEW IF EXISTS {visao}"))
+            conexao.execute(text(f"CREATE MATERIALIZED VIEW IF NOT EXISTS {visao} AS {consulta}"))
+            conexao.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS ux_{visao} ON {visao} ({chave})"))
+            conexao.execute(text(
+                "INSERT INTO relatorios_atualizacao (visao, atualizado_em, definicao) VALUES (:visao, LOCALTIMESTAMP, :definicao) "
+                "ON CONFLICT (visao) DO UPDATE SET definicao = EXCLUDED.definicao, "
+                "atualizado_em = CASE WHEN relatorios_atualizacao.definicao IS DISTINCT FROM EXCLUDED.definicao THEN EXCLUDED.atualizado_em ELSE relatorios_atualizacao.atualizado_em END"
+            ), {"visao": visao, "definicao": definicao})
+
+# Atualiza todas as views sem bloquear leituras; retorna False se outro worker já está atualizando
+def atualizar_views_relatorios(engine: Engine) -> bool:
+    if engine.dialect.name != "postgresql":
+        return False
+    with engine.connect() as conexao:
+        if not conexao.execute(text("SELECT pg_try_advisory_lock(:chave)"), {"chave": CHAVE_LOCK_RELATORIOS}).scalar():
+            conexao.rollback()
+            return False
+        try:
+            for visao in VIEWS_RELATORIOS:
+                # O limite vale até o commit de cada view (set_config local à transação)
+                conexao.execute(text(SQL_TIMEOUT_RELATORIOS), {"valor": str(RELATORIOS_TIMEOUT_MS)})
+                conexao.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {visao}"))
+                conexao.execute(text(SQL_REGISTRAR_ATUALIZACAO), {"visao": visao})
+                conexao.commit()
+        finally:
+            conexao.rollback()
+            conexao.execute(text("SELECT pg_advisory_unlock(:chave)"), {"chave": CHAVE_LOCK_RELATORIOS})
+            conexao.commit()
+    return True
+
+# Thread que atualiza as views periodicamente
+class AtualizadorRelatorios(Thread):
+    def __init__(self, engine: Engine, intervalo_minutos: float = RELATORIOS_INTERVALO_MINUTOS):
+        super().__init__(name="atualizador-relatorios", daemon=True)
+        self.engine = engine
+        self.intervalo = intervalo_minutos * 60
+        self.parar = Event()
+
+    def run(self) -> None:
+        while not self.parar.wait(self.intervalo):
+            try:
+                atualizar_views_relatorios(self.engine)
+            except Exception:
+                logger.exception("Falha ao atualizar as views de relatórios")
+
+# Cria as views e inicia o agendamento; relatórios dependem de views materializadas do Postgres
+def iniciar_atualizador_relatorios(engine: Engine) -> Optional[AtualizadorRelatorios]:
+    if engine.dialect.name != "postgresql":
+        return None
+    try:
+        criar_views_relatorios(engine)
+    except Exception:
+        # Sem as views só os relatórios ficam indisponíveis; o restante da API continua no ar
+        logger.exception("Falha ao criar as views de relatórios")
+        return None
+    atualizador = AtualizadorRelatorios(engine)
+    atualizador.start()
+    return atualizador
@@ -1,26 +1,188 @@
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy import create_engine, event, exc, text
+from sqlalchemy.engine import Connection, Engine
+from app.db.embutido import criar_engine_sqlite, criar_esquema, sqlite_em_memoria
+from app.db.bibliotecas import BIBLIOTECA_PADRAO, TODAS_BIBLIOTECAS, ler_mapa_nos
+from app.db.disjuntor import disjuntor_do_engine, erro_de_indisponibilidade
+from app.core.jwt import biblioteca_do_token
+from fastapi import Depends, HTTPException, Request, status
+from concurrent.futures import ThreadPoolExecutor, wait
 from dotenv import load_dotenv
+from typing import Callable, TypeVar
+import logging
+import math
 import os
 
 # Carregar variáveis de ambiente do arquivo .env
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Obter a URL do banco de dados a partir das variáveis de ambiente
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
 if SQLALCHEMY_DATABASE_URL is None:   # garantir que a variavel de ambiente esta definida
     raise ValueError("DATABASE_URL não está definida no .env")
+# O modo embutido só é usado quando pedido explicitamente (DATABASE_URL=sqlite:// ou sqlite:///arquivo.db)
+if SQLALCHEMY_DATABASE_URL.startswith("sqlite") and sqlite_em_memoria(SQLALCHEMY_DATABASE_URL):
+    logger.warning("DATABASE_URL aponta para SQLite em memória: uma única conexão compartilhada e dados perdidos ao reiniciar (apenas testes)")
+
+# Filiais hospedadas em outros nós de banco; as que não aparecem no mapa ficam no nó de DATABASE_URL
+BIBLIOTECAS_NOS = os.getenv("BIBLIOTECAS_NOS", "")
+# Tempo máximo de espera pelos nós nas consultas que percorrem a rede inteira
+CONSULTA_REDE_TIMEOUT_SEGUNDOS = float(os.getenv("CONSULTA_REDE_TIMEOUT_SEGUNDOS", "5"))
+# Cabeçalho que escolhe a filial nas requisições sem token (cadastro, rotas públicas)
+CABECALHO_BIBLIOTECA = "X-Biblioteca"
+# Tempo máximo de cada consulta no Postgres (statement_timeout da conexão); rotas podem pedir outro com limite_consultas
+CONSULTA_TIMEOUT_MS = int(os.getenv("CONSULTA_TIMEOUT_MS", "5000"))
+# Espera máxima por uma conexão livre do pool e pela conexão com o servidor
+POOL_TIMEOUT_SEGUNDOS = float(os.getenv("POOL_TIMEOUT_SEGUNDOS", "3"))
+CONEXAO_TIMEOUT_SEGUNDOS = int(os.getenv("CONEXAO_TIMEOUT_SEGUNDOS", "3"))
+# Chave em Session.info com o statement_timeout pedido pela rota
+LIMITE_CONSULTAS = "statement_timeout_ms"
+
+# Cria o engine do nó; no modo SQLite (arquivo ou memória) o esquema é criado a partir dos modelos
+# Cada engine tem o seu disjuntor: um nó lento não derruba as filiais dos outros nós
+def criar_engine(url: str) -> Engine:
+    if url.startswith("sqlite"):
+        engine = criar_engine_sqlite(url)
+        criar_esquema(engine)
+    elif url.startswith("postgresql"):
+        engine = create_engine(url, pool_timeout=POOL_TIMEOUT_SEGUNDOS, connect_args={
+            "connect_timeout": CONEXAO_TIMEOUT_SEGUNDOS,
+            "options": f"-c statement_timeout={CONSULTA_TIMEOUT_MS}",
+        })
+    else:
+        engine = create_engine(url, pool_timeout=POOL_TIMEOUT_SEGUNDOS)
+    disjuntor_do_engine(engine)
+    return engine
+
+# Resposta 503 com Retry-After para quando o nó está indisponível
+def banco_indisponivel(engine: Engine) -> HTTPException:
+    espera = max(disjuntor_do_engine(engine).espera(), 1)
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Banco de dados indisponível, tente novamente em instantes",
+        headers={"Retry-After": str(math.ceil(espera))},
+    )
+
+# Recusa na hora (503) as requisições para um nó com o disjuntor aberto, sem ocupar conexão nem thread esperando o pool
+def verificar_disjuntor(engine: Engine) -> None:
+    if disjuntor_do_engine(engine).liberar() > 0:
+        raise banco_indisponivel(engine)
+
+# statement_timeout válido só até o fim da transação (equivale a SET LOCAL)
+def _definir_statement_timeout(conexao: Connection, milissegundos: int) -> None:
+    conexao.execute(text("SELECT set_config('statement_timeout', :valor, true)"), {"valor": str(milissegundos)})
+
+# Aplica o limite da rota no início de cada transação da sessão; sem limite vale o padrão da conexão
+@event.listens_for(Session, "after_begin")
+def _aplicar_limite_consultas(db: Session, transacao, conexao: Connection) -> None:
+    milissegundos = db.info.get(LIMITE_CONSULTAS)
+    if milissegundos is not None and conexao.dialect.name == "postgresql":
+        _definir_statement_timeout(conexao, milissegundos)
+
+# Fábrica de sessões de um nó
+# Sem expirar no commit: os valores gerados pelo banco já voltam no INSERT/UPDATE ... RETURNING (eager_defaults),
+# então a resposta é montada sem um SELECT extra por escrita
+def criar_fabrica(engine: Engine) -> sessionmaker:
+    return sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+engine = criar_engine(SQLALCHEMY_DATABASE_URL)
+SessionLocal = criar_fabrica(engine)
 
-# Criar o engine do SQLAlchemy
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+T = TypeVar("T")
 
-# Criar uma classe de sessão local
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Mapa de filiais para nós de banco: cada filial vive inteira em um nó, e um nó hospeda várias filiais
+class MapaBibliotecas:
+    def __init__(self, fabrica_padrao: sessionmaker, url_padrao: str, faixas: list[tuple[int, int, str]]):
+        self.fabrica_padrao = fabrica_padrao
+        fabricas = {url_padrao: fabrica_padrao}
+        self.faixas: list[tuple[int, int, sessionmaker]] = []
+        for inicio, fim, url in faixas:
+            if url not in fabricas:
+                fabricas[url] = criar_fabrica(criar_engine(url))
+            self.faixas.append((inicio, fim, fabricas[url]))
+        self.fabricas = list(fabricas.values())
+        self._executor = ThreadPoolExecutor(max_workers=max(len(self.fabricas), 1), thread_name_prefix="consulta-rede")
 
-# Dependência para obter a sessão do banco de dados
-def get_db():
-    db = SessionLocal()
+    # Fábrica de sessões do nó que hospeda a filial
+    def fabrica(self, biblioteca_id: int) -> sessionmaker:
+        for inicio, fim, fabrica in self.faixas:
+            if inicio <= biblioteca_id <= fim:
+                return fabrica
+        return self.fabrica_padrao
+
+    # Sessão no nó da filial, com todas as consultas restritas a ela; 503 se o disjuntor do nó estiver aberto
+    def sessao(self, biblioteca_id: int) -> Session:
+        fabrica = self.fabrica(biblioteca_id)
+        verificar_disjuntor(fabrica.kw["bind"])
+        db = fabrica()
+        db.info["biblioteca_id"] = biblioteca_id
+        return db
+
+    # Engines distintos dos nós, para as tarefas de fundo que rodam uma vez por banco
+    def engines(self) -> list[Engine]:
+        return [fabrica.kw["bind"] for fabrica in self.fabricas]
+
+    # Executa a consulta em todos os nós em paralelo, sem filtro de filial; nós que falham, estouram o tempo ou estão
+    # com o disjuntor aberto ficam de fora. Sem nenhuma resposta (ou, com `exigir_todos`, faltando algum nó) responde 503
+    def consultar_todos(self, consulta: Callable[[Session], T], timeout: float = CONSULTA_REDE_TIMEOUT_SEGUNDOS, exigir_todos: bool = False) -> list[T]:
+        def executar(fabrica: sessionmaker) -> T:
+            with fabrica() as db:
+                db.info[TODAS_BIBLIOTECAS] = True
+                return consulta(db)
+
+        disponiveis = [fabrica for fabrica in self.fabricas if disjuntor_do_engine(fabrica.kw["bind"]).liberar() == 0]
+        futuros = [self._executor.submit(executar, fabrica) for fabrica in disponiveis]
+        concluidos, pendentes = wait(futuros, timeout=timeout)
+        if pendentes:
+            logger.warning("Consulta da rede sem resposta de %d nó(s) em %.1fs", len(pendentes), timeout)
+        resultados = []
+        for futuro in futuros:
+            if futuro not in concluidos:
+                continue
+            try:
+                resultados.append(futuro.result())
+            except Exception:
+                logger.exception("Falha em um nó durante consulta da rede")
+        if not resultados or (exigir_todos and len(resultados) < len(self.fabricas)):
+            indisponivel = next((fabrica for fabrica in self.fabricas if fabrica not in disponiveis), self.fabrica_padrao)
+            raise banco_indisponivel(indisponivel.kw["bind"])
+        return resultados
+
+mapa_bibliotecas = MapaBibliotecas(SessionLocal, SQLALCHEMY_DATABASE_URL, ler_mapa_nos(BIBLIOTECAS_NOS))
+
+# Filial da requisição: a do token (assinado no login); sem token válido, o cabeçalho X-Biblioteca ou a filial padrão
+def biblioteca_da_requisicao(request: Request) -> int:
+    autorizacao = request.headers.get("authorization", "")
+    if autorizacao.lower().startswith("bearer "):
+        biblioteca_id = biblioteca_do_token(autorizacao[7:].strip())
+        if biblioteca_id is not None:
+            return biblioteca_id
+    cabecalho = request.headers.get(CABECALHO_BIBLIOTECA, "")
+    return int(cabecalho) if cabecalho.isdigit() else BIBLIOTECA_PADRAO
+
+# Dependência para obter a sessão do banco de dados, no nó e na filial da requisição
+# Timeouts e falhas de conexão viram 503 com Retry-After em vez de erro 500
+def get_db(request: Request):
+    db = mapa_bibliotecas.sessao(biblioteca_da_requisicao(request))
     try:
         yield db
+    except exc.SQLAlchemyError as erro:
+        if not erro_de_indisponibilidade(erro):
+            raise
+        engine = db.get_bind()
+        # Pool esgotado não chega ao handle_error do engine, então é contado aqui
+        if isinstance(erro, exc.TimeoutError):
+            disjuntor_do_engine(engine).registrar_falha()  # type: ignore
+        raise banco_indisponivel(engine) from erro  # type: ignore
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# Dependência que dá às consultas da rota outro limite de tempo (SET LOCAL statement_timeout), maior ou menor que o padrão
+def limite_consultas(milissegundos: int):
+    def aplicar(db: Session = Depends(get_db)) -> None:
+        db.info[LIMITE_CONSULTAS] = milissegundos
+        if db.in_transaction() and db.get_bind().dialect.name == "postgresql":
+            _definir_statement_timeout(db.connection(), milissegundos)
+    return aplicar
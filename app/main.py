@@ -1,16 +1,50 @@
 from fastapi import FastAPI
+from contextlib import asynccontextmanager
 from app.routers.usuarios_routers import router as usuario_router
 from app.routers.autenticacao_routers import router as auth_router
 from app.routers.livro_routers import router as livro_router
 from app.routers.autores_routers import router as autor_router
 from app.routers.emprestimo_routers import router as emprestimo_router
 from app.routers.generos_routers import router as generos_router
+from app.routers.eventos_routers import router as eventos_router
+from app.routers.relatorios_routers import router as relatorios_router
+from app.routers.frontend_routers import router as frontend_router
+from app.routers.perfis_routers import router as perfis_router
+from app.routers.cache_routers import router as cache_router
+from app.core.eventos import iniciar_ouvinte
+from app.db.relatorios import iniciar_atualizador_relatorios
+from app.core.circulacao import iniciar_escritor_circulacao, encerrar_escritores_circulacao
+from app.core.recomendacoes import salvar_indices_recomendacoes
+from app.core.frontend import SERVIR_FRONTEND, obter_recursos
+from app.core.perfilador import MiddlewarePerfilador, PERFILADOR_HABILITADO
+from app.db.session import mapa_bibliotecas
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI()
+# Inicia e encerra as tarefas de fundo da aplicação
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Cada nó de banco tem o próprio canal de eventos e as próprias views de relatórios
+    tarefas = []
+    for engine in mapa_bibliotecas.engines():
+        tarefas += [iniciar_ouvinte(engine), iniciar_atualizador_relatorios(engine)]
+        iniciar_escritor_circulacao(engine)
+    # Hash e compressão dos arquivos do frontend no início, não na primeira requisição
+    if SERVIR_FRONTEND:
+        obter_recursos()
+    yield
+    for tarefa in tarefas:
+        if tarefa:
+            tarefa.parar.set()
+    # Grava o que ainda estiver na fila do log de circulação antes de sair
+    encerrar_escritores_circulacao()
+    # Persiste os índices de recomendações para não reconstruí-los a partir do histórico no próximo início
+    salvar_indices_recomendacoes()
 
+app = FastAPI(lifespan=lifespan)
+
+# Verificação de saúde atendida no event loop: não depende do banco nem disputa as threads presas esperando por ele
 @app.get("/")
-def root():
+async def root():
     return {"Aplicação": "Online"}
 
 
@@ -21,8 +55,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # O frontend lê o id do perfil e os tempos da requisição perfilada
+    expose_headers=["X-Perfil-Id", "Server-Timing"],
 )
 
+# Perfilador sob demanda (X-Perfilar ou ?perfilar=1, só bibliotecário); sem a flag a requisição passa direto
+if PERFILADOR_HABILITADO:
+    app.add_middleware(MiddlewarePerfilador)
+
 # rotas de usuários
 app.include_router(usuario_router)
 
@@ -39,4 +79,20 @@ app.include_router(autor_router)
 app.include_router(emprestimo_router)
 
 # Adiciona o roteador de gêneros
-app.include_router(generos_router)  
+app.include_router(generos_router)
+
+# rotas de eventos (SSE)
+app.include_router(eventos_router)
+
+# rotas de relatórios
+app.include_router(relatorios_router)
+
+# rotas de perfis de requisições
+app.include_router(perfis_router)
+
+# rotas do cache de entidades
+app.include_router(cache_router)
+
+# rotas do frontend (opcional): arquivos com hash no nome e pré-comprimidos, na mesma origem da API
+if SERVIR_FRONTEND:
+    app.include_router(frontend_router)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Date, CheckConstraint
+from sqlalchemy import Column, Integer, String, Date, DateTime, CheckConstraint, text, func
 from app.db.base import Base
 from sqlalchemy.sql import expression
 
@@ -11,6 +11,10 @@ class Autor(Base):
     sobrenome = Column(String(255), index=True)
     nacionalidade = Column(String(100), index=True)
     data_nascimento = Column(Date, index=True) 
+    atualizado_em = Column(DateTime, nullable=False, index=True, server_default=text("CURRENT_TIMESTAMP"), onupdate=func.current_timestamp())
+
+    # atualizado_em volta no próprio INSERT/UPDATE
+    __mapper_args__ = {"eager_defaults": True}
 
     # ---- CHECK Constraints ----
     # Garantir que a data de nascimento não seja futura
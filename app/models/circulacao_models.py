@@ -0,0 +1,27 @@
+from sqlalchemy import Column, BigInteger, Integer, String, DateTime, JSON, Index, text
+from app.db.base import Base
+from app.db.bibliotecas import PertenceBiblioteca
+
+# Definição do modelo EventoCirculacao: log somente de inserção com cada empréstimo, devolução, alteração e exclusão
+# Sem chaves estrangeiras: o histórico deve sobreviver à exclusão do empréstimo, do livro ou do usuário
+class EventoCirculacao(PertenceBiblioteca, Base):
+    __tablename__ = "eventos_circulacao"
+
+    evento_id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    tipo = Column(String(30), nullable=False)
+    emprestimo_id = Column(Integer, nullable=False)
+    livro_id = Column(Integer, nullable=False)
+    leitor_id = Column(Integer, nullable=False)
+    bibliotecario_id = Column(Integer, nullable=False)
+    # Usuário autenticado que fez a operação (o bibliotecario_id é o gravado no empréstimo); vazio fora das rotas
+    ator_id = Column(Integer, nullable=True)
+    # Momento da operação na requisição; gravado_em é o do lote que a levou ao banco
+    ocorrido_em = Column(DateTime, nullable=False)
+    gravado_em = Column(DateTime, nullable=False, server_default=text("CURRENT_TIMESTAMP"))
+    # Retrato do empréstimo (ou, nas alterações, os campos com valor anterior e novo)
+    dados = Column(JSON, nullable=True)
+
+    __table_args__ = (
+        Index("ix_eventos_circulacao_emprestimo", "emprestimo_id", "ocorrido_em"),
+        Index("ix_eventos_circulacao_ocorrido", "biblioteca_id", "ocorrido_em"),
+    )
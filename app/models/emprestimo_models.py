@@ -1,5 +1,7 @@
-from sqlalchemy import Column, Integer, String, DateTime, text, CheckConstraint, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, text, func, CheckConstraint, ForeignKey, Index, and_, case, false
+from sqlalchemy.ext.hybrid import hybrid_property
 from app.db.base import Base
+from app.db.bibliotecas import PertenceBiblioteca
 from enum import Enum
 from datetime import date
 
@@ -9,7 +11,7 @@ class status_emprestimoEnum(str, Enum):
     DEVOLVIDO = "Devolvido"
 
 # Definição do modelo Emprestimo
-class Emprestimo(Base):
+class Emprestimo(PertenceBiblioteca, Base):
     __tablename__ = "emprestimo"
 
     emprestimo_id = Column(Integer, primary_key=True, index=True)
@@ -20,9 +22,13 @@ class Emprestimo(Base):
     data_devolucao_prevista = Column(DateTime, nullable=False)
     data_devolucao_real = Column(DateTime, nullable=True)
     status_emprestimo = Column(String(15), nullable=False, default=status_emprestimoEnum.EMPRESTADO.value)
+    atualizado_em = Column(DateTime, nullable=False, index=True, server_default=text("CURRENT_TIMESTAMP"), onupdate=func.current_timestamp())
+
+    # data_emprestimo e atualizado_em voltam no próprio INSERT/UPDATE (RETURNING)
+    __mapper_args__ = {"eager_defaults": True}
     
     # Propriedade para verificar se o empréstimo está atrasado
-    @property
+    @hybrid_property
     def is_atrasado(self) -> bool:
         hoje = date.today()
         # Verifica se a data de devolução prevista existe
@@ -33,10 +39,52 @@ class Emprestimo(Base):
         # Verifica se o empréstimo está ativo
         is_ativo = self.status_emprestimo.lower() == status_emprestimoEnum.EMPRESTADO.value.lower()
         return is_ativo and (data_prevista < hoje)
+
+    # Mesma regra calculada no banco, para as consultas que selecionam apenas colunas
+    @is_atrasado.inplace.expression
+    @classmethod
+    def _is_atrasado_sql(cls):
+        return case(
+            (and_(cls.status_emprestimo == status_emprestimoEnum.EMPRESTADO.value, func.date(cls.data_devolucao_prevista) < func.current_date()), True),
+            else_=False,
+        )
         
     # ---- CHECK Constraints ----
     __table_args__ = (
         # Garantir que o status do empréstimo seja um dos valores permitidos
         CheckConstraint("status_emprestimo IN ('Emprestado', 'Devolvido', 'Atrasado')", name="check_status_emprestimo"),
-        CheckConstraint( "data_devolucao_prevista > data_emprestimo", name="chk_devolucao_datas"))
-    
+        CheckConstraint( "data_devolucao_prevista > data_emprestimo", name="chk_devolucao_datas"),
+        # Índices das listagens filtradas: cada filtro de igualdade vem antes da coluna de intervalo/ordenação
+        Index("ix_emprestimo_leitor_data", "leitor_id", "data_emprestimo"),
+        Index("ix_emprestimo_livro_data", "livro_id", "data_emprestimo"),
+        Index("ix_emprestimo_status_prevista", "biblioteca_id", "status_emprestimo", "data_devolucao_prevista"),
+        Index("ix_emprestimo_data", "biblioteca_id", "data_emprestimo"))
+
+# Definição do modelo de arquivo dos empréstimos devolvidos há mais de N meses
+# Sem chaves estrangeiras: o histórico arquivado não deve impedir a exclusão de livros ou usuários
+class EmprestimoArquivado(PertenceBiblioteca, Base):
+    __tablename__ = "emprestimo_arquivo"
+
+    emprestimo_id = Column(Integer, primary_key=True)
+    livro_id = Column(Integer, nullable=False)
+    leitor_id = Column(Integer, nullable=False)
+    bibliotecario_id = Column(Integer, nullable=False)
+    data_emprestimo = Column(DateTime, nullable=False)
+    data_devolucao_prevista = Column(DateTime, nullable=False)
+    data_devolucao_real = Column(DateTime, nullable=True)
+    status_emprestimo = Column(String(15), nullable=False)
+    arquivado_em = Column(DateTime, nullable=False, server_default=text("CURRENT_TIMESTAMP"))
+
+    # Empréstimos arquivados estão sempre devolvidos
+    @hybrid_property
+    def is_atrasado(self) -> bool:
+        return False
+
+    @is_atrasado.inplace.expression
+    @classmethod
+    def _is_atrasado_sql(cls):
+        return false()
+
+    __table_args__ = (
+        Index("ix_emprestimo_arquivo_leitor_data", "leitor_id", "data_emprestimo"),
+    )
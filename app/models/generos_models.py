@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, text, func
 from app.db.base import Base
 from sqlalchemy.orm import relationship
 
@@ -8,6 +8,10 @@ class Genero(Base):
 
     genero_id = Column(Integer, primary_key=True, index=True)
     nome = Column(String, unique=True, index=True, nullable=False)
+    atualizado_em = Column(DateTime, nullable=False, index=True, server_default=text("CURRENT_TIMESTAMP"), onupdate=func.current_timestamp())
+
+    # atualizado_em volta no próprio INSERT/UPDATE
+    __mapper_args__ = {"eager_defaults": True}
 
     #-- Relationship com Livro --
     livros = relationship("Livro", secondary="livros_generos", back_populates="generos")
\ No newline at end of file
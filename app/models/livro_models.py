@@ -1,17 +1,23 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, CheckConstraint
-from app.db.base import Base
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, CheckConstraint, UniqueConstraint, text, func
+from app.db.base import Base, ano_atual
+from app.db.bibliotecas import PertenceBiblioteca
 from sqlalchemy.orm import relationship
 
-class Livro(Base):
+# Cada filial tem o próprio exemplar do título no acervo, com o seu estoque (numero_copias)
+class Livro(PertenceBiblioteca, Base):
     __tablename__ = "livro"
 
     livro_id = Column(Integer, primary_key=True, index=True)
     titulo = Column(String(255), nullable=False)
-    isbn = Column(String(13), unique=True, nullable=False)
+    isbn = Column(String(13), nullable=False)
     editora = Column(String(100), nullable=True)
     ano_publicacao = Column(Integer, nullable=True)
     numero_copias = Column(Integer, nullable=False, default=1)
     autor_id = Column(Integer, ForeignKey("autores.autor_id", ondelete="RESTRICT"), nullable=False)
+    atualizado_em = Column(DateTime, nullable=False, index=True, server_default=text("CURRENT_TIMESTAMP"), onupdate=func.current_timestamp())
+
+    # atualizado_em volta no próprio INSERT/UPDATE, sem SELECT depois do commit
+    __mapper_args__ = {"eager_defaults": True}
 
     #-- Relationship com Genero --
     generos = relationship("Genero", secondary="livros_generos", back_populates="livros")
@@ -19,8 +25,10 @@ class Livro(Base):
     # ---- CHECK Constraints ----
     __table_args__ = (
         # Garantir que o ano de publicação não seja no futuro
-        CheckConstraint("ano_publicacao <= EXTRACT(YEAR FROM CURRENT_DATE)", name="check_ano_publicacao"),
+        CheckConstraint(ano_publicacao <= ano_atual(), name="check_ano_publicacao"),
         CheckConstraint("numero_copias >= 0", name="check_numero_copias"),
+        # O ISBN é único dentro da filial; o índice também atende o balcão e a busca por filial
+        UniqueConstraint("biblioteca_id", "isbn", name="uq_livro_biblioteca_isbn"),
     )
 
 
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, String, DateTime, Index, text
+from app.db.base import Base
+
+# Definição do modelo Remocao (tombstone): registra exclusões para a sincronização incremental
+class Remocao(Base):
+    __tablename__ = "remocoes"
+
+    remocao_id = Column(Integer, primary_key=True, index=True)
+    tabela = Column(String(50), nullable=False)
+    registro_id = Column(Integer, nullable=False)
+    removido_em = Column(DateTime, nullable=False, server_default=text("CURRENT_TIMESTAMP"))
+
+    __table_args__ = (
+        Index("ix_remocoes_tabela_removido_em", "tabela", "removido_em"),
+    )
@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, DateTime, text
+from sqlalchemy import Column, Integer, String, DateTime, Index, text, func
 from app.db.base import Base
+from app.db.bibliotecas import PertenceBiblioteca
 from enum import Enum
 
 # Definição do modelo para a coluna 'role' com valores possíveis
@@ -8,7 +9,7 @@ class roleEnum(str, Enum):
     BIBLIOTECARIO = "bibliotecario"
 
 # Definição do modelo Usuario
-class Usuario(Base):
+class Usuario(PertenceBiblioteca, Base):
     __tablename__ = "usuarios"
 
     usuario_id = Column(Integer, primary_key=True, index=True, nullable=False)
@@ -17,4 +18,13 @@ class Usuario(Base):
     senha_hash = Column(String(255), nullable=False)
     role = Column(String(20), nullable=False, default=roleEnum.LEITOR.value)
     data_cadastro = Column(DateTime(timezone=False), server_default=text("CURRENT_TIMESTAMP"))
+    atualizado_em = Column(DateTime, nullable=False, index=True, server_default=text("CURRENT_TIMESTAMP"), onupdate=func.current_timestamp())
+
+    # data_cadastro e atualizado_em voltam no próprio INSERT/UPDATE (RETURNING)
+    __mapper_args__ = {"eager_defaults": True}
+
+    # Listagens de leitores e bibliotecários da filial
+    __table_args__ = (
+        Index("ix_usuarios_biblioteca_role", "biblioteca_id", "role"),
+    )
 
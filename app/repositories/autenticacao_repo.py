@@ -11,5 +11,4 @@ def registra_usuario(db: Session, nome: str, email: str, senha_hash: str, role:
     )
     db.add(novo_usuario)
     db.commit()
-    db.refresh(novo_usuario)
     return novo_usuario
@@ -1,6 +1,9 @@
 from app.models.autores_models import Autor
 from app.models.livro_models import Livro
-from app.schemas.autores_schemas import AutorCreateSchema, AutorUpdateSchema
+from app.schemas.autores_schemas import AutorCreateSchema, AutorUpdateSchema, AutorResponseSchema
+from app.repositories.sincronizacao_repo import registrar_remocoes
+from app.core.eventos import publicar_evento
+from app.core.cache_entidades import cache_entidades, escopo_no
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
 from typing import Optional
@@ -14,8 +17,9 @@ def cadastrar_autor(db: Session, autor: AutorCreateSchema) -> Autor:
         data_nascimento=autor.data_nascimento
     )
     db.add(novo_autor)
+    db.flush()
+    publicar_evento(db, "autor_criado", autor_id=novo_autor.autor_id, nome=novo_autor.nome, sobrenome=novo_autor.sobrenome)
     db.commit()
-    db.refresh(novo_autor)
     return novo_autor
 
 # Função para listar todos os autores
@@ -34,24 +38,30 @@ def atualizar_autor(db: Session, autor_id: int, autor_atualizado: AutorUpdateSch
         autor_db.nacionalidade = autor_atualizado.nacionalidade  # type: ignore
     if autor_atualizado.data_nascimento is not None:
         autor_db.data_nascimento = autor_atualizado.data_nascimento  # type: ignore
+    publicar_evento(db, "autor_atualizado", autor_id=autor_id, nome=autor_db.nome, sobrenome=autor_db.sobrenome)
     db.commit()
-    db.refresh(autor_db)
+    cache_entidades.invalidar("autor", escopo_no(db.get_bind()), [autor_id])  # type: ignore
     return autor_db
 
-# Função para buscar um autor por ID
-def buscar_autor_por_id(db: Session, autor_id: int) -> Optional[Autor]:
-    return db.query(Autor).filter(Autor.autor_id == autor_id).first()
+# Função para buscar um autor por ID, lido pelo cache de entidades (autores são compartilhados pelas filiais do nó)
+def buscar_autor_por_id(db: Session, autor_id: int) -> Optional[AutorResponseSchema]:
+    return cache_entidades.ler(AutorResponseSchema, "autor", escopo_no(db.get_bind()), autor_id,  # type: ignore
+                               lambda: db.query(Autor).filter(Autor.autor_id == autor_id).first())
 
 # Função para deletar um autor
 def deletar_autor(db: Session, autor_id: int) -> None:
     autor_db = db.query(Autor).filter(Autor.autor_id == autor_id).first()
     if not autor_db:
         raise HTTPException(status_code=404, detail="Autor não encontrado")
-    livros_associados = db.query(Livro).filter(Livro.autor_id == autor_id).first()
+    # Autores são compartilhados pelas filiais do nó: o livro de qualquer uma delas impede a exclusão
+    livros_associados = db.query(Livro.livro_id).filter(Livro.autor_id == autor_id).execution_options(todas_bibliotecas=True).first()
     if livros_associados:
         raise HTTPException(status_code=400, detail=f"Não é possível deletar o autor {autor_db.nome} pois existem livros associados a ele")
     db.delete(autor_db)
+    registrar_remocoes(db, "autores", [autor_id])
+    publicar_evento(db, "autor_removido", autor_id=autor_id)
     db.commit()
+    cache_entidades.invalidar("autor", escopo_no(db.get_bind()), [autor_id])  # type: ignore
 
 
 
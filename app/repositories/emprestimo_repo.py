@@ -1,11 +1,37 @@
-from app.models.emprestimo_models import Emprestimo
+from app.models.emprestimo_models import Emprestimo, EmprestimoArquivado
 from app.models.livro_models import Livro
-from app.schemas.emprestimo_schemas import EmprestimoCreateSchema, EmprestimoUpdateSchema, StatusEmprestimoEnum
+from app.models.usuarios_models import Usuario
+from app.schemas.emprestimo_schemas import EmprestimoCreateSchema, EmprestimoUpdateSchema, EmprestimoResponseSchema, StatusEmprestimoEnum, EmprestimoPorIsbnSchema, DevolucaoPorIsbnSchema, FiltroEmprestimosSchema
+from app.core.isbn import variantes_isbn
+from app.repositories.sincronizacao_repo import registrar_remocoes
+from app.core.eventos import publicar_evento
+from app.core.circulacao import registrar_circulacao
+from app.core.cache_entidades import cache_entidades
+from app.db.bibliotecas import biblioteca_da_sessao
+from app.models.circulacao_models import EventoCirculacao
+from sqlalchemy import select, insert, update, delete, union_all, and_, not_, false
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+import calendar
+
+# Confere que leitor e bibliotecário são da filial da sessão: a consulta de usuários já vem filtrada por ela,
+# então um ID de outra filial (mesmo no mesmo nó) some do resultado e o empréstimo é recusado
+def _validar_usuarios_da_biblioteca(db: Session, leitor_id: Optional[int] = None, bibliotecario_id: Optional[int] = None) -> None:
+    ids = {usuario_id for usuario_id in (leitor_id, bibliotecario_id) if usuario_id is not None}
+    if not ids:
+        return
+    encontrados = set(db.execute(select(Usuario.usuario_id).where(Usuario.usuario_id.in_(ids))).scalars())
+    if leitor_id is not None and leitor_id not in encontrados:
+        raise HTTPException(status_code=400, detail="Leitor não cadastrado nesta biblioteca")
+    if bibliotecario_id is not None and bibliotecario_id not in encontrados:
+        raise HTTPException(status_code=400, detail="Bibliotecário não cadastrado nesta biblioteca")
 
 # Função para criar um novo empréstimo e atualizar o número de cópias do livro com funcoes de estoque em livros_repo
-def criar_emprestimo(db: Session, emprestimo: EmprestimoCreateSchema, ) -> Emprestimo:
+def criar_emprestimo(db: Session, emprestimo: EmprestimoCreateSchema, ator_id: Optional[int] = None) -> Emprestimo:
+    _validar_usuarios_da_biblioteca(db, emprestimo.leitor_id, emprestimo.bibliotecario_id)
     numero_copias = db.query(Livro.numero_copias).filter(Livro.livro_id == emprestimo.livro_id).first()
     if not numero_copias or numero_copias[0] <= 0:
         raise HTTPException(status_code=400, detail="Não há cópias disponíveis para empréstimo")
@@ -18,15 +44,24 @@ def criar_emprestimo(db: Session, emprestimo: EmprestimoCreateSchema, ) -> Empre
         data_devolucao_prevista=emprestimo.data_devolucao_prevista
     )
     db.add(novo_emprestimo)
+    db.flush()
+    dados = EmprestimoResponseSchema.model_validate(novo_emprestimo).model_dump(mode="json")
+    registrar_circulacao(db, "emprestimo_criado", novo_emprestimo, dados, ator_id)
+    publicar_evento(db, "emprestimo_criado", emprestimo=dados)
+    publicar_evento(db, "estoque_alterado", livro_id=emprestimo.livro_id, numero_copias=numero_copias_atualizado)
     db.commit()
-    db.refresh(novo_emprestimo)
+    cache_entidades.invalidar("livro", biblioteca_da_sessao(db), [emprestimo.livro_id])
     return novo_emprestimo
 
 # Função para atualizar os dados de um empréstimo existente
-def atualizar_emprestimo(db: Session, emprestimo_id: int, emprestimo_atualizado: EmprestimoUpdateSchema) -> Emprestimo:
+def atualizar_emprestimo(db: Session, emprestimo_id: int, emprestimo_atualizado: EmprestimoUpdateSchema, ator_id: Optional[int] = None) -> Emprestimo:
     emprestimo_db = db.query(Emprestimo).filter(Emprestimo.emprestimo_id == emprestimo_id).first()
     if not emprestimo_db:
         raise HTTPException(status_code=404, detail="Empréstimo não encontrado")
+    antes = EmprestimoResponseSchema.model_validate(emprestimo_db).model_dump(mode="json")
+    _validar_usuarios_da_biblioteca(db, emprestimo_atualizado.leitor_id, emprestimo_atualizado.bibliotecario_id)
+    if emprestimo_atualizado.livro_id is not None and not db.query(Livro.livro_id).filter(Livro.livro_id == emprestimo_atualizado.livro_id).first():
+        raise HTTPException(status_code=404, detail="Livro não encontrado")
 
     if emprestimo_atualizado.livro_id is not None:
         emprestimo_db.livro_id = emprestimo_atualizado.livro_id # type: ignore
@@ -41,29 +76,123 @@ def atualizar_emprestimo(db: Session, emprestimo_id: int, emprestimo_atualizado:
     if emprestimo_atualizado.status_emprestimo is not None:
         emprestimo_db.status_emprestimo = emprestimo_atualizado.status_emprestimo # type: ignore
 
+    # O log guarda só os campos alterados, com o valor anterior e o novo
+    depois = EmprestimoResponseSchema.model_validate(emprestimo_db).model_dump(mode="json")
+    alterados = {campo: [antes[campo], valor] for campo, valor in depois.items() if antes[campo] != valor}
+    if alterados:
+        registrar_circulacao(db, "emprestimo_atualizado", emprestimo_db, {"alterados": alterados}, ator_id)
     db.commit()
-    db.refresh(emprestimo_db)
     return emprestimo_db
 
-# Função para obter todos os empréstimos
-def obter_emprestimos(db: Session) -> list[Emprestimo]:
-    return db.query(Emprestimo).all()
+# Colunas da resposta de empréstimo, com is_atrasado calculado no banco; serve à tabela ativa e ao arquivo
+def colunas_emprestimo(modelo) -> tuple:
+    return (
+        modelo.emprestimo_id, modelo.livro_id, modelo.leitor_id, modelo.bibliotecario_id, modelo.data_emprestimo,
+        modelo.data_devolucao_prevista, modelo.data_devolucao_real, modelo.status_emprestimo, modelo.is_atrasado.label("is_atrasado"),
+    )
+
+_adaptador_emprestimos = TypeAdapter(list[EmprestimoResponseSchema])
+
+# Converte as linhas da consulta direto nos schemas de resposta: uma validação só, sem instâncias do ORM nem identity map
+def emprestimos_de_linhas(linhas) -> list[EmprestimoResponseSchema]:
+    return _adaptador_emprestimos.validate_python(linhas, from_attributes=True)
+
+# Início do dia seguinte: limite exclusivo para filtros "até a data, inclusive" sobre colunas DateTime
+def _fim_do_dia(dia: date) -> datetime:
+    return datetime.combine(dia + timedelta(days=1), time.min)
+
+# Atraso em forma comparável direto com as colunas (status, data prevista), aproveitando o índice composto
+def _condicao_atraso(modelo):
+    if modelo is EmprestimoArquivado:
+        return false()
+    return and_(
+        modelo.status_emprestimo == StatusEmprestimoEnum.EMPRESTADO.value,
+        modelo.data_devolucao_prevista < datetime.combine(date.today(), time.min),
+    )
+
+# Condições WHERE dos filtros informados, para a tabela ativa ou para o arquivo
+def _condicoes_filtro(modelo, filtros: FiltroEmprestimosSchema) -> list:
+    condicoes = []
+    if filtros.status is not None:
+        condicoes.append(modelo.status_emprestimo == filtros.status.value)
+    if filtros.atrasado is not None:
+        condicoes.append(_condicao_atraso(modelo) if filtros.atrasado else not_(_condicao_atraso(modelo)))
+    if filtros.livro_id is not None:
+        condicoes.append(modelo.livro_id == filtros.livro_id)
+    if filtros.data_inicio is not None:
+        condicoes.append(modelo.data_emprestimo >= datetime.combine(filtros.data_inicio, time.min))
+    if filtros.data_fim is not None:
+        condicoes.append(modelo.data_emprestimo < _fim_do_dia(filtros.data_fim))
+    if filtros.prevista_ate is not None:
+        condicoes.append(modelo.data_devolucao_prevista < _fim_do_dia(filtros.prevista_ate))
+    return condicoes
+
+# ORDER BY da chave pedida, com o ID como desempate para a paginação ser estável
+def _ordenacao(colunas, filtros: FiltroEmprestimosSchema) -> tuple:
+    chave = filtros.ordenar.value
+    decrescente = chave.startswith("-")
+    coluna, desempate = colunas[chave.lstrip("-")], colunas["emprestimo_id"]
+    return (coluna.desc(), desempate.desc()) if decrescente else (coluna.asc(), desempate.asc())
 
-# Funcao para obter emprestimos por leitor
-def obter_emprestimos_por_leitor(db: Session, leitor_id: int) -> list[Emprestimo]:
-    return db.query(Emprestimo).filter(Emprestimo.leitor_id == leitor_id).all()
+# Função para obter os empréstimos filtrados, ordenados e paginados no banco
+def obter_emprestimos(db: Session, filtros: Optional[FiltroEmprestimosSchema] = None, leitor_id: Optional[int] = None) -> list[EmprestimoResponseSchema]:
+    filtros = filtros or FiltroEmprestimosSchema()
+    condicoes = _condicoes_filtro(Emprestimo, filtros)
+    if leitor_id is not None:
+        condicoes.append(Emprestimo.leitor_id == leitor_id)
+    consulta = (
+        select(*colunas_emprestimo(Emprestimo))
+        .where(*condicoes)
+        .order_by(*_ordenacao(Emprestimo.__table__.c, filtros))
+        .limit(filtros.limite)
+        .offset(filtros.deslocamento)
+    )
+    return emprestimos_de_linhas(db.execute(consulta).all())
+
+# Funcao para obter emprestimos por leitor, opcionalmente incluindo o histórico arquivado
+def obter_emprestimos_por_leitor(db: Session, leitor_id: int, incluir_arquivados: bool = False, filtros: Optional[FiltroEmprestimosSchema] = None) -> list[EmprestimoResponseSchema]:
+    filtros = filtros or FiltroEmprestimosSchema()
+    if not incluir_arquivados:
+        return obter_emprestimos(db, filtros, leitor_id=leitor_id)
+    # Cada tabela entrega no máximo a página pedida, já ordenada pelo índice (leitor_id, data_emprestimo); o UNION só mescla as duas
+    historico = union_all(*(
+        select(
+            select(*colunas_emprestimo(modelo))
+            .where(modelo.leitor_id == leitor_id, *_condicoes_filtro(modelo, filtros))
+            .order_by(*_ordenacao(modelo.__table__.c, filtros))
+            .limit(filtros.limite + filtros.deslocamento)
+            .subquery()
+        )
+        for modelo in (Emprestimo, EmprestimoArquivado)
+    )).subquery()
+    consulta = (
+        select(historico)
+        .order_by(*_ordenacao(historico.c, filtros))
+        .limit(filtros.limite)
+        .offset(filtros.deslocamento)
+    )
+    return emprestimos_de_linhas(db.execute(consulta).all())
 
 # Função para deletar um empréstimo pelo ID
-def deletar_emprestimo(db: Session, emprestimo_id: int) -> None:
+def deletar_emprestimo(db: Session, emprestimo_id: int, ator_id: Optional[int] = None) -> None:
     emprestimo_db = db.query(Emprestimo).filter(Emprestimo.emprestimo_id == emprestimo_id).first()
     if emprestimo_db:
+        registrar_circulacao(db, "emprestimo_removido", emprestimo_db, EmprestimoResponseSchema.model_validate(emprestimo_db).model_dump(mode="json"), ator_id)
         db.delete(emprestimo_db)
+        registrar_remocoes(db, "emprestimo", [emprestimo_id])
+        db.commit()
+
+# Histórico de circulação do empréstimo na ordem em que as operações aconteceram; o evento_id só desempata, porque
+# segue a ordem de gravação (cada worker grava a sua fila, e a contrapressão grava na hora); eventos ainda na fila aparecem no próximo lote
+def obter_historico_emprestimo(db: Session, emprestimo_id: int) -> list[EventoCirculacao]:
+    return db.query(EventoCirculacao).filter(EventoCirculacao.emprestimo_id == emprestimo_id).order_by(EventoCirculacao.ocorrido_em, EventoCirculacao.evento_id).all()
 
 # Função para devolver o livro e atualizar o número de cópias
-def devolver_emprestimo(db: Session, emprestimo_id: int, data_devolucao_real, bibliotecario_id: int) -> Emprestimo:
+def devolver_emprestimo(db: Session, emprestimo_id: int, data_devolucao_real, bibliotecario_id: int, ator_id: Optional[int] = None) -> Emprestimo:
     emprestimo_db = db.query(Emprestimo).filter(Emprestimo.emprestimo_id == emprestimo_id).first()
     if not emprestimo_db:
         raise HTTPException(status_code=404, detail="Empréstimo não encontrado")
+    _validar_usuarios_da_biblioteca(db, bibliotecario_id=bibliotecario_id)
         
     # Lógica de atualização de cópias
     numero_copias = db.query(Livro.numero_copias).filter(Livro.livro_id == emprestimo_db.livro_id).first()
@@ -73,6 +202,122 @@ def devolver_emprestimo(db: Session, emprestimo_id: int, data_devolucao_real, bi
     emprestimo_db.data_devolucao_real = data_devolucao_real
     emprestimo_db.bibliotecario_id = bibliotecario_id # type: ignore
     emprestimo_db.status_emprestimo = StatusEmprestimoEnum.DEVOLVIDO # type: ignore
+    dados = EmprestimoResponseSchema.model_validate(emprestimo_db).model_dump(mode="json")
+    registrar_circulacao(db, "emprestimo_devolvido", emprestimo_db, dados, ator_id)
+    publicar_evento(db, "emprestimo_devolvido", emprestimo=dados)
+    publicar_evento(db, "estoque_alterado", livro_id=emprestimo_db.livro_id, numero_copias=numero_copias_atualizado)
     db.commit()
-    db.refresh(emprestimo_db)
-    return emprestimo_db
\ No newline at end of file
+    cache_entidades.invalidar("livro", biblioteca_da_sessao(db), [emprestimo_db.livro_id])  # type: ignore
+    return emprestimo_db
+
+#===================== Balcão por ISBN +====================#
+
+# Empresta pelo ISBN: baixa atômica do estoque e criação do empréstimo em uma única transação
+def criar_emprestimo_por_isbn(db: Session, emprestimo: EmprestimoPorIsbnSchema, ator_id: Optional[int] = None) -> Emprestimo:
+    _validar_usuarios_da_biblioteca(db, emprestimo.leitor_id, emprestimo.bibliotecario_id)
+    # A filial pode ter o mesmo título cadastrado como ISBN-10 e como ISBN-13: escolhe uma única linha com cópias
+    # (a de menor ID), travada até o commit, e decrementa só ela pela chave primária
+    livro_id = db.execute(
+        select(Livro.livro_id)
+        .where(Livro.isbn.in_(variantes_isbn(emprestimo.isbn)), Livro.numero_copias > 0)
+        .order_by(Livro.livro_id)
+        .limit(1)
+        .with_for_update()
+    ).scalar()
+    livro = None
+    if livro_id is not None:
+        livro = db.execute(
+            update(Livro)
+            .where(Livro.livro_id == livro_id)
+            .values(numero_copias=Livro.numero_copias - 1)
+            .returning(Livro.livro_id, Livro.numero_copias)
+            .execution_options(synchronize_session=False)
+        ).first()
+    if not livro:
+        livro_existe = db.query(Livro.livro_id).filter(Livro.isbn.in_(variantes_isbn(emprestimo.isbn))).first()
+        if not livro_existe:
+            raise HTTPException(status_code=404, detail="Livro não encontrado para o ISBN informado")
+        raise HTTPException(status_code=400, detail="Não há cópias disponíveis para empréstimo")
+    livro_id, numero_copias = livro
+    novo_emprestimo = Emprestimo(
+        livro_id=livro_id,
+        leitor_id=emprestimo.leitor_id,
+        bibliotecario_id=emprestimo.bibliotecario_id,
+        data_devolucao_prevista=emprestimo.data_devolucao_prevista
+    )
+    db.add(novo_emprestimo)
+    db.flush()
+    dados = EmprestimoResponseSchema.model_validate(novo_emprestimo).model_dump(mode="json")
+    registrar_circulacao(db, "emprestimo_criado", novo_emprestimo, dados, ator_id)
+    publicar_evento(db, "emprestimo_criado", emprestimo=dados)
+    publicar_evento(db, "estoque_alterado", livro_id=livro_id, numero_copias=numero_copias)
+    db.commit()
+    cache_entidades.invalidar("livro", biblioteca_da_sessao(db), [livro_id])
+    return novo_emprestimo
+
+# Devolve pelo ISBN o empréstimo ativo mais antigo do livro (opcionalmente do leitor informado) em uma única transação
+def devolver_emprestimo_por_isbn(db: Session, devolucao: DevolucaoPorIsbnSchema, ator_id: Optional[int] = None) -> Emprestimo:
+    _validar_usuarios_da_biblioteca(db, bibliotecario_id=devolucao.bibliotecario_devolucao_id)
+    query = db.query(Emprestimo).join(Livro, Livro.livro_id == Emprestimo.livro_id).filter(
+        Livro.isbn.in_(variantes_isbn(devolucao.isbn)),
+        Emprestimo.status_emprestimo == StatusEmprestimoEnum.EMPRESTADO.value,
+    )
+    if devolucao.leitor_id is not None:
+        query = query.filter(Emprestimo.leitor_id == devolucao.leitor_id)
+    emprestimo_db = query.order_by(Emprestimo.data_emprestimo).with_for_update(of=Emprestimo).first()
+    if not emprestimo_db:
+        raise HTTPException(status_code=404, detail="Nenhum empréstimo ativo para o ISBN informado")
+
+    numero_copias = db.execute(
+        update(Livro)
+        .where(Livro.livro_id == emprestimo_db.livro_id)
+        .values(numero_copias=Livro.numero_copias + 1)
+        .returning(Livro.numero_copias)
+        .execution_options(synchronize_session=False)
+    ).scalar_one()
+    emprestimo_db.data_devolucao_real = devolucao.data_devolucao_real # type: ignore
+    emprestimo_db.bibliotecario_id = devolucao.bibliotecario_devolucao_id # type: ignore
+    emprestimo_db.status_emprestimo = StatusEmprestimoEnum.DEVOLVIDO.value # type: ignore
+    db.flush()
+    dados = EmprestimoResponseSchema.model_validate(emprestimo_db).model_dump(mode="json")
+    registrar_circulacao(db, "emprestimo_devolvido", emprestimo_db, dados, ator_id)
+    publicar_evento(db, "emprestimo_devolvido", emprestimo=dados)
+    publicar_evento(db, "estoque_alterado", livro_id=emprestimo_db.livro_id, numero_copias=numero_copias)
+    db.commit()
+    cache_entidades.invalidar("livro", biblioteca_da_sessao(db), [emprestimo_db.livro_id])  # type: ignore
+    return emprestimo_db
+
+#===================== Arquivamento de empréstimos +====================#
+
+# Colunas copiadas da tabela emprestimo para emprestimo_arquivo
+COLUNAS_ARQUIVO = ["emprestimo_id", "biblioteca_id", "livro_id", "leitor_id", "bibliotecario_id", "data_emprestimo", "data_devolucao_prevista", "data_devolucao_real", "status_emprestimo"]
+
+# Calcula a data de corte subtraindo meses da data informada
+def subtrair_meses(data: datetime, meses: int) -> datetime:
+    ano, mes = divmod(data.year * 12 + data.month - 1 - meses, 12)
+    dia = min(data.day, calendar.monthrange(ano, mes + 1)[1])
+    return data.replace(year=ano, month=mes + 1, day=dia)
+
+# Move em lotes os empréstimos devolvidos há mais de N meses para a tabela de arquivo, com um commit por lote
+def arquivar_emprestimos(db: Session, meses: int, tamanho_lote: int = 1000) -> int:
+    if meses < 1 or tamanho_lote < 1:
+        raise HTTPException(status_code=400, detail="Meses e tamanho do lote devem ser positivos")
+    data_corte = subtrair_meses(datetime.now(), meses)
+    colunas = [getattr(Emprestimo, coluna) for coluna in COLUNAS_ARQUIVO]
+    total_arquivado = 0
+    while True:
+        ids = db.execute(
+            select(Emprestimo.emprestimo_id)
+            .where(Emprestimo.status_emprestimo == StatusEmprestimoEnum.DEVOLVIDO.value, Emprestimo.data_devolucao_real < data_corte)
+            .order_by(Emprestimo.emprestimo_id)
+            .limit(tamanho_lote)
+            .with_for_update(skip_locked=True)
+        ).scalars().all()
+        if not ids:
+            break
+        db.execute(insert(EmprestimoArquivado).from_select(COLUNAS_ARQUIVO, select(*colunas).where(Emprestimo.emprestimo_id.in_(ids))))
+        db.execute(delete(Emprestimo).where(Emprestimo.emprestimo_id.in_(ids)))
+        registrar_remocoes(db, "emprestimo", list(ids))
+        db.commit()
+        total_arquivado += len(ids)
+    return total_arquivado
@@ -1,8 +1,13 @@
 from app.models.generos_models import Genero
 from app.models.livro_models import Livro
 from app.schemas.generos_schemas import GeneroCreate, GeneroResponse
+from app.repositories.sincronizacao_repo import registrar_remocoes
+from app.core.eventos import publicar_evento
+from app.core.catalogo import catalogo_pronto
+from app.core.cache_entidades import cache_entidades, escopo_no
 from sqlalchemy.orm import Session
 from fastapi import HTTPException   
+from typing import Optional
 
 # Funções para manipulação de gêneros
 def criar_genero(db: Session, genero: GeneroCreate) -> Genero:
@@ -11,20 +16,28 @@ def criar_genero(db: Session, genero: GeneroCreate) -> Genero:
         raise HTTPException(status_code=400, detail="Gênero já cadastrado")
     novo_genero = Genero(nome=genero.nome)
     db.add(novo_genero)
+    db.flush()
+    publicar_evento(db, "genero_criado", genero_id=novo_genero.genero_id, nome=novo_genero.nome)
     db.commit()
-    db.refresh(novo_genero)
     return novo_genero
 
 # Função para listar todos os gêneros
 def listar_generos(db: Session) -> list[Genero]:
     return db.query(Genero).all()
 
-# Função para obter um gênero por ID
-def obter_genero_por_id(db: Session, genero_id: int) -> Genero:
-    return db.query(Genero).filter(Genero.genero_id == genero_id).first()
+# Função para obter um gênero por ID, lido pelo cache de entidades (gêneros são compartilhados pelas filiais do nó)
+def obter_genero_por_id(db: Session, genero_id: int) -> Optional[GeneroResponse]:
+    return cache_entidades.ler(GeneroResponse, "genero", escopo_no(db.get_bind()), genero_id,  # type: ignore
+                               lambda: db.query(Genero).filter(Genero.genero_id == genero_id).first())
 
 # Função para buscar livros por gênero
 def buscar_livros_por_genero(db: Session, genero_id: int) -> list[Livro]:
+    catalogo = catalogo_pronto(db)
+    if catalogo is not None:
+        livros = catalogo.livros_do_genero(genero_id)
+        if livros is None:
+            raise HTTPException(status_code=404, detail="Gênero não encontrado")
+        return livros  # type: ignore
     genero_id = db.query(Genero).filter(Genero.genero_id == genero_id).first()
     if not genero_id:
         raise HTTPException(status_code=404, detail="Gênero não encontrado")    
@@ -35,4 +48,7 @@ def deletar_genero(db: Session, genero_id: int) -> None:
     genero_db = db.query(Genero).filter(Genero.genero_id == genero_id).first()
     if genero_db:
         db.delete(genero_db)
-        db.commit()
\ No newline at end of file
+        registrar_remocoes(db, "generos", [genero_id])
+        publicar_evento(db, "genero_removido", genero_id=genero_id)
+        db.commit()
+        cache_entidades.invalidar("genero", escopo_no(db.get_bind()), [genero_id])  # type: ignore
\ No newline at end of file
@@ -1,29 +1,58 @@
 from app.models.livros_generos_models import LivrosGenerosModels
+from app.models.generos_models import Genero
+from app.models.livro_models import Livro
 from app.schemas.livros_generos_schemas import LivrosGenerosSchemas
-from sqlalchemy.orm import Session  
+from sqlalchemy import select, delete
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from fastapi import HTTPException
+
+# Monta um INSERT ... ON CONFLICT DO NOTHING no dialeto da conexão
+def _insert_ignorando_conflitos(db: Session, registros: list[dict]):
+    dialeto = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    return dialeto.insert(LivrosGenerosModels).values(registros).on_conflict_do_nothing()
+
+# Valida que todos os gêneros informados existem, com uma única consulta
+def _validar_generos(db: Session, generos_ids: set[int]) -> None:
+    if not generos_ids:
+        return
+    encontrados = set(db.execute(select(Genero.genero_id).where(Genero.genero_id.in_(generos_ids))).scalars())
+    faltando = sorted(generos_ids - encontrados)
+    if faltando:
+        raise HTTPException(status_code=400, detail=f"Gêneros não cadastrados: {faltando}")
+
+# Define o conjunto de gêneros do livro aplicando apenas a diferença (um INSERT e um DELETE), sem commit
+# Para um livro recém-criado não há associações antigas, então o DELETE é dispensado
+def definir_generos_livro(db: Session, livro_id: int, generos_ids: list[int], livro_novo: bool = False) -> list[int]:
+    desejados = set(generos_ids)
+    _validar_generos(db, desejados)
+    if not livro_novo:
+        db.execute(
+            delete(LivrosGenerosModels).where(
+                LivrosGenerosModels.livro_id == livro_id,
+                LivrosGenerosModels.genero_id.not_in(desejados),
+            )
+        )
+    if desejados:
+        db.execute(_insert_ignorando_conflitos(db, [{"livro_id": livro_id, "genero_id": genero_id} for genero_id in desejados]))
+    return sorted(desejados)
 
 # criar relação entre livro e gênero
 def create_livro_genero(db: Session, livro_generos: LivrosGenerosSchemas):
-    novos_resgistros = []
-    for genero_id in livro_generos.generos_ids:
-        novo_registro = LivrosGenerosModels(
-            livro_id=livro_generos.livro_id,
-            genero_id=genero_id
-        )
-        novos_resgistros.append(novo_registro)
-    db.add_all(novos_resgistros)
+    generos_ids = set(livro_generos.generos_ids)
+    _validar_generos(db, generos_ids)
+    if generos_ids:
+        db.execute(_insert_ignorando_conflitos(db, [{"livro_id": livro_generos.livro_id, "genero_id": genero_id} for genero_id in generos_ids]))
     db.commit()
-    for registro in novos_resgistros:
-        db.refresh(registro)
-    return novos_resgistros
+    return [LivrosGenerosModels(livro_id=livro_generos.livro_id, genero_id=genero_id) for genero_id in sorted(generos_ids)]
 
-# obter todas as relações entre livros e gêneros
+# obter todas as relações entre livros e gêneros; o join com o livro restringe à filial
 def get_livros_generos(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(LivrosGenerosModels).offset(skip).limit(limit).all()
+    return db.query(LivrosGenerosModels).join(Livro, Livro.livro_id == LivrosGenerosModels.livro_id).offset(skip).limit(limit).all()
 
 # obter relação específica entre livro e gênero
 def get_livro_genero(db: Session, livro_id: int, genero_id: int):
-    return db.query(LivrosGenerosModels).filter(
+    return db.query(LivrosGenerosModels).join(Livro, Livro.livro_id == LivrosGenerosModels.livro_id).filter(
         LivrosGenerosModels.livro_id == livro_id,
         LivrosGenerosModels.genero_id == genero_id
     ).first()
@@ -34,4 +63,4 @@ def delete_livro_genero(db: Session, livro_id: int, genero_id: int):
     if db_livro_genero:
         db.delete(db_livro_genero)
         db.commit()
-    return db_livro_genero
\ No newline at end of file
+    return db_livro_genero
@@ -1,19 +1,25 @@
-from sqlalchemy import or_
+from sqlalchemy import or_, select, delete, exists, func
 from app.models.livro_models import Livro
 from app.models.autores_models import Autor
 from app.models.livros_generos_models import LivrosGenerosModels
 from app.models.emprestimo_models import Emprestimo, status_emprestimoEnum
-from app.schemas.livro_schemas import LivroCreateSchema, LivroUpdateSchema
-from app.schemas.livros_generos_schemas import LivrosGenerosSchemas 
-from app.repositories.livros_generos_repo import create_livro_genero
-from app.repositories.emprestimo_repo import deletar_emprestimo
+from app.schemas.livro_schemas import LivroCreateSchema, LivroUpdateSchema, LivroResponseSchema
+from pydantic import TypeAdapter
+from app.repositories.livros_generos_repo import definir_generos_livro
+from app.repositories.sincronizacao_repo import registrar_remocoes
+from app.core.eventos import publicar_evento
+from app.core.recomendacoes import indice_recomendacoes
+from app.core.catalogo import catalogo_pronto
+from app.core.cache_entidades import cache_entidades
+from app.db.bibliotecas import biblioteca_da_sessao
+from app.db.session import mapa_bibliotecas
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
 from typing import Optional
 
 # Função para cadastrar um novo livro criando também os relacionamentos com gêneros
 def cadastrar_livro(db: Session, livro: LivroCreateSchema) -> Livro:
-    autor_cadastrado = db.query(Autor).filter(Autor.autor_id == livro.autor_id).first()
+    autor_cadastrado = db.query(Autor.autor_id).filter(Autor.autor_id == livro.autor_id).first()
     if not autor_cadastrado:
         raise HTTPException(status_code=400, detail="Autor não cadastrado")
     novo_livro = Livro(
@@ -25,25 +31,48 @@ def cadastrar_livro(db: Session, livro: LivroCreateSchema) -> Livro:
         autor_id=livro.autor_id,
     )
     db.add(novo_livro)
+    db.flush()
+    # Livro e gêneros são gravados na mesma transação com um único INSERT em lote
+    generos_ids = definir_generos_livro(db, novo_livro.livro_id, livro.lista_generos_ids, livro_novo=True)  # type: ignore
+    publicar_evento(db, "livro_criado", livro=LivroResponseSchema.model_validate(novo_livro).model_dump(mode="json"), generos_ids=generos_ids)
     db.commit()
-    db.refresh(novo_livro)
-    lista_generos_ids = livro.lista_generos_ids
-    create_livro_genero(db, LivrosGenerosSchemas(livro_id=novo_livro.livro_id, generos_ids=lista_generos_ids))  # type: ignore
     return novo_livro
 
+# Substitui o conjunto de gêneros de um livro aplicando apenas a diferença
+def atualizar_generos_livro(db: Session, livro_id: int, generos_ids: list[int]) -> list[int]:
+    livro_existe = db.query(Livro.livro_id).filter(Livro.livro_id == livro_id).first()
+    if not livro_existe:
+        raise HTTPException(status_code=404, detail="Livro não encontrado")
+    generos_definidos = definir_generos_livro(db, livro_id, generos_ids)
+    publicar_evento(db, "generos_livro_alterados", livro_id=livro_id, generos_ids=generos_definidos)
+    db.commit()
+    return generos_definidos
+
+# Colunas da resposta de livro, lidas sem hidratar instâncias do ORM
+COLUNAS_LIVRO = (Livro.livro_id, Livro.titulo, Livro.isbn, Livro.editora, Livro.ano_publicacao, Livro.numero_copias, Livro.autor_id)
+
+_adaptador_livros = TypeAdapter(list[LivroResponseSchema])
+
+# Converte as linhas da consulta direto nos schemas de resposta: uma validação só, sem identity map
+def livros_de_linhas(linhas) -> list[LivroResponseSchema]:
+    return _adaptador_livros.validate_python(linhas, from_attributes=True)
+
 # Função para listar livros com filtros opcionais de gênero e busca por título ou autor
-def listar_livros(db: Session, genero: Optional[int] = None, search: Optional[str] = None, skip: int = 0, limit: int = 50) -> list[Livro]:
-    query = db.query(Livro)
+def listar_livros(db: Session, genero: Optional[int] = None, search: Optional[str] = None, skip: int = 0, limit: int = 50) -> list[LivroResponseSchema]:
+    catalogo = catalogo_pronto(db)
+    if catalogo is not None:
+        return livros_de_linhas(catalogo.listar(genero, search, skip, limit))
+    query = select(*COLUNAS_LIVRO)
     if genero is not None:
-        query = query.join(LivrosGenerosModels).filter(
+        query = query.join(LivrosGenerosModels, LivrosGenerosModels.livro_id == Livro.livro_id).where(
             LivrosGenerosModels.genero_id == genero
         ).distinct()
     if search:
         search_pattern = f"%{search}%"
-        query = query.join(Autor) 
-        query = query.filter(
+        query = query.join(Autor, Autor.autor_id == Livro.autor_id)
+        query = query.where(
             or_(Livro.titulo.ilike(search_pattern),Autor.nome.ilike(search_pattern), Autor.sobrenome.ilike(search_pattern)))
-    return query.offset(skip).limit(limit).all()
+    return livros_de_linhas(db.execute(query.offset(skip).limit(limit)).all())
 
 # Função para atualizar um livro 
 def atualizar_livro(db: Session, livro_id: int, livro_atualizado: LivroUpdateSchema) -> Optional[Livro]:
@@ -64,8 +93,9 @@ def atualizar_livro(db: Session, livro_id: int, livro_atualizado: LivroUpdateSch
     if livro_atualizado.autor_id is not None:
         livro_db.autor_id = livro_atualizado.autor_id  # type: ignore
 
+    publicar_evento(db, "livro_atualizado", livro=LivroResponseSchema.model_validate(livro_db).model_dump(mode="json"))
     db.commit()
-    db.refresh(livro_db)
+    cache_entidades.invalidar("livro", biblioteca_da_sessao(db), [livro_id])
     return livro_db
 
 # Função para deletar um livro 
@@ -74,22 +104,54 @@ def deletar_livro(db: Session, livro_id: int) -> None:
     if not livro_db:
         raise HTTPException(status_code=404, detail="Livro não encontrado")
     db.delete(livro_db)
+    registrar_remocoes(db, "livro", [livro_id])
+    publicar_evento(db, "livro_removido", livro_id=livro_id)
     db.commit()
+    cache_entidades.invalidar("livro", biblioteca_da_sessao(db), [livro_id])
 
 # Funcao que deleta o livro e todos os emprestimos relacionados a ele se eles estiverem devolvidos substituindo a funcao de deletar livro
 def deletar_livro_e_emprestimos(db: Session, livro_id: int) -> None:
-    livro_db = db.query(Livro).filter(Livro.livro_id == livro_id).first()
-    if not livro_db:
+    resultado = deletar_livros_em_lote(db, [livro_id])
+    if resultado["nao_encontrados"]:
         raise HTTPException(status_code=404, detail="Livro não encontrado")
+    if resultado["bloqueados"]:
+        raise HTTPException(status_code=409, detail="Não é possível deletar o livro pois existem empréstimos ativos relacionados a ele")
 
-    emprestimos_livro = db.query(Emprestimo).filter(Emprestimo.livro_id == livro_id).all()
-    for emprestimo in emprestimos_livro:
-        if emprestimo.status_emprestimo != status_emprestimoEnum.DEVOLVIDO.value: # type: ignore
-            raise HTTPException(status_code=409, detail="Não é possível deletar o livro pois existem empréstimos ativos relacionados a ele")
-    for emprestimo in emprestimos_livro:
-        deletar_emprestimo(db, emprestimo.emprestimo_id) # type: ignore
-    db.delete(livro_db)
-    db.commit()
+# Quantidade de IDs por evento publicado, para respeitar o limite de payload do NOTIFY
+TAMANHO_LOTE_EVENTO = 500
+
+# Deleta em lote livros sem empréstimos ativos, junto com seus empréstimos devolvidos e gêneros, em uma transação
+def deletar_livros_em_lote(db: Session, livros_ids: list[int]) -> dict:
+    ids_solicitados = set(livros_ids)
+    # Uma única consulta retorna os livros existentes e se cada um tem empréstimo ativo, já bloqueando as linhas:
+    # um empréstimo novo (que trava o livro pela chave estrangeira) espera o fim desta transação
+    emprestimo_ativo = exists().where(
+        Emprestimo.livro_id == Livro.livro_id,
+        Emprestimo.status_emprestimo != status_emprestimoEnum.DEVOLVIDO.value,
+    )
+    situacao = db.execute(
+        select(Livro.livro_id, emprestimo_ativo).where(Livro.livro_id.in_(ids_solicitados)).with_for_update(of=Livro)
+    ).all()
+    bloqueados = sorted(livro_id for livro_id, ativo in situacao if ativo)
+    removiveis = sorted(livro_id for livro_id, ativo in situacao if not ativo)
+    nao_encontrados = sorted(ids_solicitados - {livro_id for livro_id, _ in situacao})
+
+    if removiveis:
+        emprestimos_removidos = db.execute(
+            delete(Emprestimo).where(
+                Emprestimo.livro_id.in_(removiveis),
+                Emprestimo.status_emprestimo == status_emprestimoEnum.DEVOLVIDO.value,
+            ).returning(Emprestimo.emprestimo_id)
+        ).scalars().all()
+        db.execute(delete(LivrosGenerosModels).where(LivrosGenerosModels.livro_id.in_(removiveis)))
+        db.execute(delete(Livro).where(Livro.livro_id.in_(removiveis)))
+        registrar_remocoes(db, "emprestimo", list(emprestimos_removidos))
+        registrar_remocoes(db, "livro", removiveis)
+        for inicio in range(0, len(removiveis), TAMANHO_LOTE_EVENTO):
+            publicar_evento(db, "livros_removidos", livros_ids=removiveis[inicio:inicio + TAMANHO_LOTE_EVENTO])
+        db.commit()
+        cache_entidades.invalidar("livro", biblioteca_da_sessao(db), removiveis)
+    return {"removidos": removiveis, "bloqueados": bloqueados, "nao_encontrados": nao_encontrados}
 
 # verifica e atualiza o estoque do livro ao criar um empréstimo
 def atualizar_estoque_livro(db: Session, livro_id: int) -> Livro:
@@ -101,23 +163,74 @@ def atualizar_estoque_livro(db: Session, livro_id: int) -> Livro:
         livro_db.numero_copias = copias_disponiveis - 1 # type: ignore
     else:
         raise HTTPException(status_code=400, detail="Estoque esgotado para este livro")
+    publicar_evento(db, "estoque_alterado", livro_id=livro_id, numero_copias=livro_db.numero_copias)
     db.commit()
-    db.refresh(livro_db)
+    cache_entidades.invalidar("livro", biblioteca_da_sessao(db), [livro_id])
     return livro_db
 
-# Busca livro pelo id
-def obter_livro_por_id(db: Session, livro_id: int) -> Livro:    
-    livro_db = db.query(Livro).filter(Livro.livro_id == livro_id).first()
-    if not livro_db:
+# Busca livro pelo id, lido pelo cache de entidades (a chave inclui a filial da sessão)
+def obter_livro_por_id(db: Session, livro_id: int) -> LivroResponseSchema:
+    livro = cache_entidades.ler(LivroResponseSchema, "livro", biblioteca_da_sessao(db), livro_id,
+                                lambda: db.execute(select(*COLUNAS_LIVRO).where(Livro.livro_id == livro_id)).first())
+    if not livro:
         raise HTTPException(status_code=404, detail="Livro não encontrado")
-    return livro_db
+    return livro
+
+# Recomendações "quem leu também pegou": top-K do índice em memória, completado com título e autor em uma consulta
+def listar_recomendacoes(db: Session, livro_id: int, limite: int = 10) -> list[dict]:
+    indice = indice_recomendacoes(biblioteca_da_sessao(db))
+    indice.carregar(db)
+    # Pede folga ao índice para compensar livros removidos depois da última consolidação
+    recomendados = indice.recomendar(livro_id, limite * 2)
+    if not recomendados:
+        return []
+    livros = {
+        livro_id: (titulo, autor_id)
+        for livro_id, titulo, autor_id in db.execute(
+            select(Livro.livro_id, Livro.titulo, Livro.autor_id).where(Livro.livro_id.in_([livro for livro, _ in recomendados]))
+        )
+    }
+    return [
+        {"livro_id": livro, "titulo": livros[livro][0], "autor_id": livros[livro][1], "pontuacao": pontuacao}
+        for livro, pontuacao in recomendados if livro in livros
+    ][:limite]
+
+#===================== Busca na rede de filiais +====================#
+
+# Busca em um nó: escolhe até `limite` ISBNs que casam com o termo e traz os exemplares deles em todas as filiais do nó
+def _buscar_no_no(db: Session, termo: str, limite: int) -> list:
+    padrao = f"%{termo}%"
+    casa_termo = or_(Livro.titulo.ilike(padrao), Autor.nome.ilike(padrao), Autor.sobrenome.ilike(padrao))
+    isbns = (
+        select(Livro.isbn).join(Autor, Autor.autor_id == Livro.autor_id).where(casa_termo)
+        .group_by(Livro.isbn).order_by(func.min(Livro.titulo), Livro.isbn).limit(limite)
+    )
+    return db.execute(
+        select(Livro.isbn, Livro.titulo, Autor.nome, Autor.sobrenome, Livro.biblioteca_id, Livro.livro_id, Livro.numero_copias)
+        .join(Autor, Autor.autor_id == Livro.autor_id)
+        .where(Livro.isbn.in_(isbns.scalar_subquery()))
+    ).all()
+
+# Busca por título ou autor em todas as filiais: os nós são consultados em paralelo e os exemplares agrupados por ISBN
+def buscar_livros_na_rede(termo: str, limite: int = 20) -> list[dict]:
+    titulos: dict[str, dict] = {}
+    for linhas in mapa_bibliotecas.consultar_todos(lambda db: _buscar_no_no(db, termo, limite)):
+        for isbn, titulo, nome, sobrenome, biblioteca_id, livro_id, numero_copias in linhas:
+            titulo_rede = titulos.setdefault(isbn, {"isbn": isbn, "titulo": titulo, "autor": f"{nome or ''} {sobrenome or ''}".strip(), "exemplares": []})
+            titulo_rede["exemplares"].append({"biblioteca_id": biblioteca_id, "livro_id": livro_id, "numero_copias": numero_copias})
+    resultado = sorted(titulos.values(), key=lambda titulo_rede: (titulo_rede["titulo"], titulo_rede["isbn"]))[:limite]
+    for titulo_rede in resultado:
+        titulo_rede["exemplares"].sort(key=lambda exemplar: exemplar["biblioteca_id"])
+    return resultado
 
 #===================== Funções de estoque +====================#
 
 # Retorna livros com estoque disponível
-def listar_livros_com_estoque(db: Session) -> list[Livro]:
-    livros_com_estoque = db.query(Livro).filter(Livro.numero_copias > 0).all()
-    return livros_com_estoque
+def listar_livros_com_estoque(db: Session) -> list[LivroResponseSchema]:
+    catalogo = catalogo_pronto(db)
+    if catalogo is not None:
+        return livros_de_linhas(catalogo.listar_com_estoque())
+    return livros_de_linhas(db.execute(select(*COLUNAS_LIVRO).where(Livro.numero_copias > 0)).all())
 
 # Verifica o estoque disponível de um livro ultilizado na função de atualizar_estoque_livro
 def verificar_estoque_livro(db: Session, livro_id: int) -> bool:
@@ -0,0 +1,56 @@
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.db.bibliotecas import biblioteca_da_sessao
+from fastapi import HTTPException
+
+# Lê a data da última atualização da view e há quantos segundos ela foi feita
+def _defasagem(db: Session, visao: str) -> dict:
+    linha = db.execute(
+        text("SELECT atualizado_em, EXTRACT(EPOCH FROM (LOCALTIMESTAMP - atualizado_em)) FROM relatorios_atualizacao WHERE visao = :visao"),
+        {"visao": visao},
+    ).first()
+    if not linha:
+        raise HTTPException(status_code=503, detail="Relatórios ainda não disponíveis")
+    return {"atualizado_em": linha[0], "defasagem_segundos": float(linha[1])}
+
+# Consulta uma view de relatório da filial da sessão e anexa a informação de defasagem
+def _consultar(db: Session, visao: str, consulta: str, parametros: dict) -> dict:
+    # As views materializadas só existem no Postgres; no modo SQLite os relatórios ficam indisponíveis
+    if db.get_bind().dialect.name != "postgresql":
+        raise HTTPException(status_code=503, detail="Relatórios exigem o banco PostgreSQL")
+    dados = [dict(linha) for linha in db.execute(text(consulta), {**parametros, "biblioteca_id": biblioteca_da_sessao(db)}).mappings()]
+    return {**_defasagem(db, visao), "dados": dados}
+
+# Função para obter os livros mais emprestados
+def livros_mais_emprestados(db: Session, limite: int = 20) -> dict:
+    return _consultar(
+        db, "mv_livros_mais_emprestados",
+        "SELECT livro_id, titulo, total_emprestimos FROM mv_livros_mais_emprestados WHERE biblioteca_id = :biblioteca_id ORDER BY total_emprestimos DESC, livro_id LIMIT :limite",
+        {"limite": limite},
+    )
+
+# Função para obter o total de empréstimos por mês
+def emprestimos_por_mes(db: Session, meses: int = 12) -> dict:
+    resultado = _consultar(
+        db, "mv_emprestimos_por_mes",
+        "SELECT mes, total_emprestimos FROM mv_emprestimos_por_mes WHERE biblioteca_id = :biblioteca_id ORDER BY mes DESC LIMIT :meses",
+        {"meses": meses},
+    )
+    resultado["dados"].reverse()
+    return resultado
+
+# Função para obter os gêneros mais emprestados
+def generos_mais_emprestados(db: Session, limite: int = 20) -> dict:
+    return _consultar(
+        db, "mv_generos_mais_emprestados",
+        "SELECT genero_id, nome, total_emprestimos FROM mv_generos_mais_emprestados WHERE biblioteca_id = :biblioteca_id ORDER BY total_emprestimos DESC, genero_id LIMIT :limite",
+        {"limite": limite},
+    )
+
+# Função para obter a duração média dos empréstimos devolvidos
+def duracao_media_emprestimos(db: Session) -> dict:
+    return _consultar(
+        db, "mv_duracao_media_emprestimos",
+        "SELECT media_dias, total_devolvidos FROM mv_duracao_media_emprestimos WHERE biblioteca_id = :biblioteca_id",
+        {},
+    )
@@ -0,0 +1,43 @@
+from app.models.remocoes_models import Remocao
+from sqlalchemy import select, insert, func, tuple_
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+
+# Margem de segurança da marca d'água: cobre transações que começaram antes da consulta e só confirmaram depois
+MARGEM_SINCRONIZACAO = timedelta(seconds=60)
+
+# Registra os tombstones das linhas removidas, dentro da transação de quem removeu
+def registrar_remocoes(db: Session, tabela: str, ids: list[int]) -> None:
+    if ids:
+        db.execute(insert(Remocao), [{"tabela": tabela, "registro_id": registro_id} for registro_id in ids])
+
+# Converte a marca do cliente para o relógio das colunas (sem fuso): o fuso da sessão no Postgres, UTC no SQLite
+# Marcas sem fuso já são as devolvidas pela própria API e passam direto
+def _no_relogio_do_banco(momento: datetime, agora_banco: datetime) -> datetime:
+    if momento.tzinfo is None:
+        return momento
+    return momento.astimezone(agora_banco.tzinfo or timezone.utc).replace(tzinfo=None)
+
+# Lista as linhas alteradas e removidas desde a marca d'água do cliente, paginando por (atualizado_em, id)
+def listar_alteracoes(db: Session, modelo: Any, tabela: str, desde: Optional[datetime] = None, apos_id: Optional[int] = None, limite: int = 1000) -> dict:
+    agora_banco = db.execute(select(func.current_timestamp())).scalar_one()
+    agora = agora_banco.replace(tzinfo=None)
+    chave = modelo.__mapper__.primary_key[0]
+    query = db.query(modelo)
+    removidos: list[int] = []
+    if desde is not None:
+        desde = _no_relogio_do_banco(desde, agora_banco)
+        if apos_id is not None:
+            query = query.filter(tuple_(modelo.atualizado_em, chave) > tuple_(desde, apos_id))
+        else:
+            query = query.filter(modelo.atualizado_em >= desde)
+        removidos = list(db.execute(
+            select(Remocao.registro_id).where(Remocao.tabela == tabela, Remocao.removido_em >= desde)
+        ).scalars().all())
+    alterados = query.order_by(modelo.atualizado_em, chave).limit(limite).all()
+
+    if len(alterados) == limite:
+        ultimo = alterados[-1]
+        return {"alterados": alterados, "removidos": removidos, "marca": ultimo.atualizado_em, "ultimo_id": getattr(ultimo, chave.key), "completo": False}
+    return {"alterados": alterados, "removidos": removidos, "marca": agora - MARGEM_SINCRONIZACAO, "ultimo_id": None, "completo": True}
@@ -1,6 +1,10 @@
 from app.models.usuarios_models import Usuario
-from app.schemas.usuarios_schemas import UsuarioUpdateSchema
+from app.schemas.usuarios_schemas import UsuarioUpdateSchema, UsuarioResponseSchema
 from app.core.security import senha_hash
+from app.repositories.sincronizacao_repo import registrar_remocoes
+from app.core.eventos import publicar_evento
+from app.core.cache_entidades import cache_entidades
+from app.db.bibliotecas import biblioteca_da_sessao
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
 from typing import Optional
@@ -22,13 +26,16 @@ def atualizar_usuario(db: Session, usuario_id: int, usuario_atualizado: UsuarioU
     if usuario_atualizado.role is not None:
         usuario_db.role = usuario_atualizado.role # type: ignore
 
+    # Só o ID no evento: ele avisa os outros workers para descartar o usuário do cache em memória
+    publicar_evento(db, "usuario_atualizado", usuario_id=usuario_id)
     db.commit()
-    db.refresh(usuario_db)
+    cache_entidades.invalidar("usuario", biblioteca_da_sessao(db), [usuario_id])
     return usuario_db
 
-# Função para obter um usuário por ID
-def obter_usuario_por_id(db: Session, usuario_id: int) -> Optional[Usuario]:
-    return db.query(Usuario).filter(Usuario.usuario_id == usuario_id).first()
+# Função para obter um usuário por ID, lido pelo cache de entidades (a chave inclui a filial da sessão)
+def obter_usuario_por_id(db: Session, usuario_id: int) -> Optional[UsuarioResponseSchema]:
+    return cache_entidades.ler(UsuarioResponseSchema, "usuario", biblioteca_da_sessao(db), usuario_id,
+                               lambda: db.query(Usuario).filter(Usuario.usuario_id == usuario_id).first())
 
 # Função para listar todos os usuários bibliotecários 
 def listar_usuarios_bibliotecarios(db: Session) -> list[Usuario]:
@@ -44,5 +51,8 @@ def deletar_usuario(db: Session, usuario_id: int) -> None:
     if not usuario_db:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
     db.delete(usuario_db)
+    registrar_remocoes(db, "usuarios", [usuario_id])
+    publicar_evento(db, "usuario_removido", usuario_id=usuario_id)
     db.commit()
+    cache_entidades.invalidar("usuario", biblioteca_da_sessao(db), [usuario_id])
 
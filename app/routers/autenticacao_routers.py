@@ -1,45 +1,55 @@
 from app.models.usuarios_models import Usuario
 from app.schemas.autenticacao_schemas import RegisterSchema, ResponseRegisterSchema, LoginSchema, LoginResponseFrontendSchema
 from app.repositories.autenticacao_repo import registra_usuario
-from sqlalchemy.orm import Session
-from app.db.session import get_db
+from app.db.session import mapa_bibliotecas
 from app.core.security import senha_hash, verifica_senha
 from app.core.jwt import cria_token_acesso as criar_token_acesso
-from fastapi import APIRouter, Depends, HTTPException, status
+from app.core.rate_limit import verifica_limite
+from fastapi import APIRouter, HTTPException, Request, status
+from typing import Optional
 
 router = APIRouter(prefix="/auth", tags=["Autenticação"])
 
-# Rota para registrar um novo usuário
+# Procura o usuário pelo e-mail: só no nó da filial informada ou, sem filial, em todos os nós em paralelo
+# Com `exigir_todos`, a busca falha (503) se algum nó não responder, em vez de concluir que o e-mail está livre
+def buscar_usuario_por_email(email: str, biblioteca_id: Optional[int] = None, exigir_todos: bool = False) -> Optional[Usuario]:
+    if biblioteca_id is not None:
+        with mapa_bibliotecas.sessao(biblioteca_id) as db:
+            return db.query(Usuario).filter(Usuario.email == email).first()
+    encontrados = [
+        usuario
+        for usuarios in mapa_bibliotecas.consultar_todos(lambda db: db.query(Usuario).filter(Usuario.email == email).all(), exigir_todos=exigir_todos)
+        for usuario in usuarios
+    ]
+    return min(encontrados, key=lambda usuario: usuario.biblioteca_id, default=None)
+
+# Rota para registrar um novo usuário na filial informada; o e-mail é único na rede
 @router.post("/register", response_model=ResponseRegisterSchema)
-def registra_novo_usuario(register_dados: RegisterSchema, db: Session = Depends(get_db)):
-    senha_criptografada = senha_hash(register_dados.senha)
-    usuario = db.query(Usuario).filter(Usuario.email == register_dados.email).first()
-    if usuario:
+def registra_novo_usuario(register_dados: RegisterSchema, request: Request):
+    verifica_limite(request, "register", register_dados.email)
+    if buscar_usuario_por_email(register_dados.email, exigir_todos=True):
         raise HTTPException(status_code=400, detail="E-mail já registrado")
-    novo_usuario = Usuario(
-        nome=register_dados.nome,
-        email=register_dados.email,
-        senha_hash=senha_criptografada,
-        role=register_dados.role.value
-    )
-    novo_usuario = registra_usuario(db, register_dados.nome, register_dados.email, senha_criptografada, register_dados.role.value)
-    return novo_usuario
+    # Hash calculado só depois de validar o e-mail para não gastar CPU com cadastros recusados
+    senha_criptografada = senha_hash(register_dados.senha)
+    with mapa_bibliotecas.sessao(register_dados.biblioteca_id) as db:
+        return registra_usuario(db, register_dados.nome, register_dados.email, senha_criptografada, register_dados.role.value)
 
-# rota login de usuário
+# rota login de usuário; o token leva a filial do usuário, que direciona as próximas requisições ao nó dela
 @router.post("/login", response_model=LoginResponseFrontendSchema)
-def login_usuario(login_dados: LoginSchema, db: Session = Depends(get_db)):
-    usuario = db.query(Usuario).filter(Usuario.email == login_dados.email).first()
+def login_usuario(login_dados: LoginSchema, request: Request):
+    verifica_limite(request, "login", login_dados.email)
+    usuario = buscar_usuario_por_email(login_dados.email, login_dados.biblioteca_id)
     if not usuario:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Credenciais inválidas")
     if not verifica_senha(login_dados.senha, usuario.senha_hash): # type: ignore
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Credenciais inválidas")
-    token = criar_token_acesso(dados={"sub": str(usuario.usuario_id)})
-    id = db.query(Usuario.usuario_id).filter(Usuario.email == login_dados.email).first()
+    token = criar_token_acesso(dados={"sub": str(usuario.usuario_id), "biblioteca_id": usuario.biblioteca_id})
     return LoginResponseFrontendSchema(
         token=token,
         tipo_token="bearer",
         role=str(usuario.role),
         nome=str(usuario.nome),
         email=str(usuario.email),
-        id=int(id[0]) # type: ignore
-    )  
\ No newline at end of file
+        id=int(usuario.usuario_id), # type: ignore
+        biblioteca_id=int(usuario.biblioteca_id), # type: ignore
+    )
@@ -1,10 +1,14 @@
 from app.schemas.autores_schemas import AutorCreateSchema, AutorUpdateSchema, AutorResponseSchema
+from app.schemas.sincronizacao_schemas import AlteracoesResponseSchema
+from app.models.autores_models import Autor
+from app.repositories.sincronizacao_repo import listar_alteracoes
 from app.repositories.autores_repo import cadastrar_autor, listar_autores,  buscar_autor_por_id, atualizar_autor, deletar_autor
 from sqlalchemy.orm import Session
 from app.db.session import get_db
 from app.core.security import verifica_role
-from fastapi import APIRouter, Depends
-from typing import Any
+from fastapi import APIRouter, Depends, Query
+from typing import Any, Optional
+from datetime import datetime
 
 router = APIRouter(prefix="/autores", tags=["Autores"])
 
@@ -18,6 +22,11 @@ def cadastrar_novo_autor(autor: AutorCreateSchema, db: Session = Depends(get_db)
 def listar_todos_autores(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     return listar_autores(db, skip=skip, limit=limit)
 
+# Rota de sincronização incremental: autores alterados ou removidos desde a marca informada
+@router.get("/alteracoes", response_model=AlteracoesResponseSchema[AutorResponseSchema])
+def obter_alteracoes_autores(desde: Optional[datetime] = Query(None, description="Marca d'água da última sincronização."), apos_id: Optional[int] = Query(None, description="Último ID recebido quando a página anterior veio cheia."), limite: int = Query(1000, ge=1, le=5000), db: Session = Depends(get_db)):
+    return listar_alteracoes(db, Autor, "autores", desde=desde, apos_id=apos_id, limite=limite)
+
 # Rota para buscar um autor pelo ID
 @router.get("/{autor_id}", response_model=list[AutorResponseSchema])
 def mostra_autor_pelo_id(autor_id: int, db: Session = Depends(get_db)):
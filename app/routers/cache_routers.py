@@ -0,0 +1,11 @@
+from app.core.cache_entidades import cache_entidades
+from app.core.security import verifica_role
+from fastapi import APIRouter, Depends
+from typing import Any
+
+router = APIRouter(prefix="/cache", tags=["Cache"])
+
+# Rota com a taxa de acerto por entidade e a ocupação do cache de leitura
+@router.get("/metricas")
+def obter_metricas_cache(usuario: Any = Depends(verifica_role(["bibliotecario"]))):
+    return cache_entidades.metricas()
@@ -1,48 +1,95 @@
-from app.schemas.emprestimo_schemas import EmprestimoCreateSchema, EmprestimoUpdateSchema, EmprestimoResponseSchema, DevolucaoSchema
-from app.repositories.emprestimo_repo import criar_emprestimo, atualizar_emprestimo, obter_emprestimos, deletar_emprestimo, devolver_emprestimo, obter_emprestimos_por_leitor
+from app.schemas.emprestimo_schemas import EmprestimoCreateSchema, EmprestimoUpdateSchema, EmprestimoResponseSchema, DevolucaoSchema, EmprestimoPorIsbnSchema, DevolucaoPorIsbnSchema, FiltroEmprestimosSchema, StatusEmprestimoEnum, OrdenacaoEmprestimoEnum, EventoCirculacaoResponseSchema
+from app.schemas.sincronizacao_schemas import AlteracoesResponseSchema
+from app.models.emprestimo_models import Emprestimo
+from app.repositories.sincronizacao_repo import listar_alteracoes
+from app.repositories.emprestimo_repo import criar_emprestimo, atualizar_emprestimo, obter_emprestimos, deletar_emprestimo, devolver_emprestimo, obter_emprestimos_por_leitor, arquivar_emprestimos, criar_emprestimo_por_isbn, devolver_emprestimo_por_isbn, obter_historico_emprestimo
+from app.core.circulacao import metricas_circulacao
 from sqlalchemy.orm import Session
-from app.db.session import get_db
+from app.db.session import get_db, limite_consultas
 from app.core.security import verifica_role
-from fastapi import APIRouter, Depends, HTTPException
-from typing import Any
+from fastapi import APIRouter, Depends, Query
+from typing import Any, Optional
+from datetime import date, datetime
 
 router = APIRouter(prefix="/emprestimos", tags=["Empréstimos"])
 
+# Filtros das listagens lidos da query string; a página tem tamanho limitado
+def filtros_emprestimos(
+    status: Optional[StatusEmprestimoEnum] = Query(None, description="Status do empréstimo."),
+    atrasado: Optional[bool] = Query(None, description="Apenas atrasados (true) ou apenas em dia (false)."),
+    livro_id: Optional[int] = Query(None, description="ID do livro emprestado."),
+    data_inicio: Optional[date] = Query(None, description="Empréstimos feitos a partir desta data."),
+    data_fim: Optional[date] = Query(None, description="Empréstimos feitos até esta data, inclusive."),
+    prevista_ate: Optional[date] = Query(None, description="Devolução prevista até esta data, inclusive."),
+    ordenar: OrdenacaoEmprestimoEnum = Query(OrdenacaoEmprestimoEnum.DATA_EMPRESTIMO_DESC, description="Chave de ordenação; '-' para decrescente."),
+    limite: int = Query(100, ge=1, le=1000),
+    deslocamento: int = Query(0, ge=0),
+) -> FiltroEmprestimosSchema:
+    return FiltroEmprestimosSchema(
+        status=status, atrasado=atrasado, livro_id=livro_id, data_inicio=data_inicio, data_fim=data_fim,
+        prevista_ate=prevista_ate, ordenar=ordenar, limite=limite, deslocamento=deslocamento,
+    )
+
 # Rota para cadastrar um novo empréstimo
 @router.post("/", response_model=EmprestimoResponseSchema)
 def cadastrar_novo_emprestimo(emprestimo: EmprestimoCreateSchema, db: Session = Depends(get_db), usuario: Any = Depends(verifica_role(["bibliotecario", "leitor"]))):
-    return criar_emprestimo(db, emprestimo)
+    return criar_emprestimo(db, emprestimo, usuario.usuario_id)
+
+# Rota do balcão: empréstimo a partir do ISBN lido pelo scanner
+# O balcão não pode ficar esperando: consultas acima de 2s são canceladas e a rota responde 503
+@router.post("/por-isbn", response_model=EmprestimoResponseSchema, dependencies=[Depends(limite_consultas(2_000))])
+def cadastrar_emprestimo_por_isbn(emprestimo: EmprestimoPorIsbnSchema, db: Session = Depends(get_db), usuario: Any = Depends(verifica_role(["bibliotecario"]))):
+    return criar_emprestimo_por_isbn(db, emprestimo, usuario.usuario_id)
+
+# Rota do balcão: devolução a partir do ISBN lido pelo scanner
+@router.post("/devolver-por-isbn", response_model=EmprestimoResponseSchema, dependencies=[Depends(limite_consultas(2_000))])
+def devolver_livro_por_isbn(devolucao: DevolucaoPorIsbnSchema, db: Session = Depends(get_db), usuario: Any = Depends(verifica_role(["bibliotecario"]))):
+    return devolver_emprestimo_por_isbn(db, devolucao, usuario.usuario_id)
 
 # Rota para atualizar os dados de um empréstimo existente
 @router.put("/{emprestimo_id}", response_model=EmprestimoResponseSchema)
 def atualizar_dados_emprestimo(emprestimo_id: int, emprestimo: EmprestimoUpdateSchema, db: Session = Depends(get_db), usuario: Any = Depends(verifica_role(["bibliotecario"]))):
-    return atualizar_emprestimo(db, emprestimo_id, emprestimo)
+    return atualizar_emprestimo(db, emprestimo_id, emprestimo, usuario.usuario_id)
 
-# Rota para obter todos os empréstimos
+# Rota para obter os empréstimos com filtros, ordenação e paginação aplicados no banco
 @router.get("/", response_model=list[EmprestimoResponseSchema])
-def obter_todos_emprestimos(db: Session = Depends(get_db), usuario: Any = Depends(verifica_role(["bibliotecario"]))):  
-    emprestimo = obter_emprestimos(db)
-    if not emprestimo:
-        raise HTTPException(status_code=404, detail="Empréstimo não encontrado")
-    return emprestimo
+def obter_todos_emprestimos(filtros: FiltroEmprestimosSchema = Depends(filtros_emprestimos), leitor_id: Optional[int] = Query(None, description="ID do leitor."), db: Session = Depends(get_db), usuario: Any = Depends(verifica_role(["bibliotecario"]))):
+    return obter_emprestimos(db, filtros, leitor_id=leitor_id)
+
+# Rota de sincronização incremental: empréstimos alterados ou removidos desde a marca informada
+@router.get("/alteracoes", response_model=AlteracoesResponseSchema[EmprestimoResponseSchema])
+def obter_alteracoes_emprestimos(desde: Optional[datetime] = Query(None, description="Marca d'água da última sincronização."), apos_id: Optional[int] = Query(None, description="Último ID recebido quando a página anterior veio cheia."), limite: int = Query(1000, ge=1, le=5000), db: Session = Depends(get_db), usuario: Any = Depends(verifica_role(["bibliotecario"]))):
+    return listar_alteracoes(db, Emprestimo, "emprestimo", desde=desde, apos_id=apos_id, limite=limite)
 
-# Rota para obter empréstimos por leitor 
+# Rota para obter empréstimos por leitor; sem resultados devolve lista vazia
 @router.get("/leitor/{leitor_id}", response_model=list[EmprestimoResponseSchema])
-def obter_emprestimos_leitor(leitor_id: int, db: Session = Depends(get_db), usuario: Any = Depends(verifica_role(["bibliotecario", "leitor"]))):
-    emprestimos = obter_emprestimos_por_leitor(db, leitor_id)
-    if not emprestimos:
-        raise HTTPException(status_code=404, detail="Empréstimo não encontrado para o leitor especificado")
-    return emprestimos
+def obter_emprestimos_leitor(leitor_id: int, filtros: FiltroEmprestimosSchema = Depends(filtros_emprestimos), incluir_arquivados: bool = Query(False, description="Inclui empréstimos arquivados no histórico."), db: Session = Depends(get_db), usuario: Any = Depends(verifica_role(["bibliotecario", "leitor"]))):
+    return obter_emprestimos_por_leitor(db, leitor_id, incluir_arquivados=incluir_arquivados, filtros=filtros)
+
+# Rota do log de circulação: quem emprestou, devolveu, alterou ou excluiu o empréstimo, e quando
+@router.get("/{emprestimo_id}/historico", response_model=list[EventoCirculacaoResponseSchema])
+def obter_historico_circulacao(emprestimo_id: int, db: Session = Depends(get_db), usuario: Any = Depends(verifica_role(["bibliotecario"]))):
+    return obter_historico_emprestimo(db, emprestimo_id)
+
+# Rota com as métricas do escritor do log de circulação (fila, lotes, atraso e contrapressão)
+@router.get("/circulacao/metricas")
+def obter_metricas_circulacao(usuario: Any = Depends(verifica_role(["bibliotecario"]))):
+    return metricas_circulacao()
+
+# Rota para arquivar empréstimos devolvidos há mais de N meses; move lotes grandes, por isso tem limite maior
+@router.post("/arquivar", dependencies=[Depends(limite_consultas(60_000))])
+def arquivar_emprestimos_antigos(meses: int = Query(12, ge=1, description="Idade mínima da devolução em meses."), tamanho_lote: int = Query(1000, ge=1, le=10000), db: Session = Depends(get_db), usuario: Any = Depends(verifica_role(["bibliotecario"]))):
+    return {"arquivados": arquivar_emprestimos(db, meses, tamanho_lote)}
 
 # Rota para deletar um empréstimo pelo ID
 @router.delete("/{emprestimo_id}", status_code=204)
 def deletar_dados_emprestimo(emprestimo_id: int, db: Session = Depends(get_db), usuario: Any = Depends(verifica_role(["bibliotecario"]))):
-    deletar_emprestimo(db, emprestimo_id)
+    deletar_emprestimo(db, emprestimo_id, usuario.usuario_id)
 
 # Rota para finalizar um empréstimo (devolver o livro)
 @router.post("/{emprestimo_id}/devolver", response_model=EmprestimoResponseSchema)
 def devolver_livro(emprestimo_id: int, devolucao: DevolucaoSchema, db: Session = Depends(get_db), usuario: Any = Depends(verifica_role(["bibliotecario", "leitor"]))):
-    return devolver_emprestimo(db, emprestimo_id, devolucao.data_devolucao_real, devolucao.bibliotecario_devolucao_id)
+    return devolver_emprestimo(db, emprestimo_id, devolucao.data_devolucao_real, devolucao.bibliotecario_devolucao_id, usuario.usuario_id)
 
 
 
@@ -0,0 +1,57 @@
+from app.core.eventos import difusor
+from app.core.security import obter_usuario_por_token
+from app.db.session import mapa_bibliotecas
+from app.db.bibliotecas import BIBLIOTECA_PADRAO
+from app.core.jwt import biblioteca_do_token
+from app.models.usuarios_models import roleEnum
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+import asyncio
+import json
+
+router = APIRouter(prefix="/eventos", tags=["Eventos"])
+
+# Intervalo entre comentários de keep-alive enviados ao cliente
+INTERVALO_PING_SEGUNDOS = 15
+
+# Cada cliente só recebe eventos da própria filial; leitores, só os dos próprios empréstimos e o catálogo
+def evento_visivel(evento: dict, usuario_id: int, role: str, biblioteca_id: int) -> bool:
+    if evento.get("biblioteca_id", BIBLIOTECA_PADRAO) != biblioteca_id:
+        return False
+    if str(evento.get("tipo", "")).startswith("usuario_"):
+        return role == roleEnum.BIBLIOTECARIO.value
+    emprestimo = evento.get("emprestimo")
+    if role == roleEnum.BIBLIOTECARIO.value or emprestimo is None:
+        return True
+    return emprestimo.get("leitor_id") == usuario_id
+
+# Rota SSE que transmite alterações de estoque, empréstimos e catálogo
+# O token vai na query string porque o EventSource do navegador não envia cabeçalhos
+@router.get("")
+async def transmitir_eventos(request: Request, token: str = Query(..., description="Token JWT do usuário.")):
+    # Sessão curta: a conexão não fica presa durante toda a transmissão
+    def autenticar() -> tuple[int, str, int]:
+        biblioteca_id = biblioteca_do_token(token) or BIBLIOTECA_PADRAO
+        with mapa_bibliotecas.sessao(biblioteca_id) as db:
+            usuario = obter_usuario_por_token(db, token)
+            return int(usuario.usuario_id), str(usuario.role), biblioteca_id  # type: ignore
+    usuario_id, role, biblioteca_id = await run_in_threadpool(autenticar)
+
+    async def gerar_eventos():
+        fila = difusor.assinar()
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    evento = await asyncio.wait_for(fila.get(), timeout=INTERVALO_PING_SEGUNDOS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if not evento_visivel(evento, usuario_id, role, biblioteca_id):
+                    continue
+                yield f"event: {evento['tipo']}\ndata: {json.dumps(evento, default=str)}\n\n"
+        finally:
+            difusor.cancelar(fila)
+
+    return StreamingResponse(gerar_eventos(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
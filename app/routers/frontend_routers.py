@@ -0,0 +1,25 @@
+from app.core.frontend import obter_recursos, escolher_codificacao, PREFIXO_FRONTEND, PAGINA_INICIAL
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import RedirectResponse, Response
+
+router = APIRouter(prefix=PREFIXO_FRONTEND, include_in_schema=False)
+
+# Rota inicial do frontend: redireciona para a tela de login
+@router.get("/")
+def frontend_inicio():
+    return RedirectResponse(f"{PREFIXO_FRONTEND}/{PAGINA_INICIAL}")
+
+# Rota dos arquivos do frontend: escolhe a variante pré-comprimida pelo Accept-Encoding e responde 304 se o ETag bater
+@router.get("/{caminho:path}")
+def arquivo_frontend(caminho: str, request: Request):
+    encontrado = obter_recursos().get(caminho)
+    if not encontrado:
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+    recurso, cache = encontrado
+    codificacao = escolher_codificacao(request.headers.get("accept-encoding"), recurso.variantes)
+    cabecalhos = {"Cache-Control": cache, "ETag": recurso.etag(codificacao), "Vary": "Accept-Encoding"}
+    if request.headers.get("if-none-match") == cabecalhos["ETag"]:
+        return Response(status_code=304, headers=cabecalhos)
+    if codificacao != "identity":
+        cabecalhos["Content-Encoding"] = codificacao
+    return Response(content=recurso.variantes[codificacao], media_type=recurso.tipo, headers=cabecalhos)
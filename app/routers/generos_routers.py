@@ -1,11 +1,15 @@
 from app.schemas.generos_schemas import GeneroCreate, GeneroResponse
 from app.schemas.livro_schemas import LivroResponseSimplificado
+from app.schemas.sincronizacao_schemas import AlteracoesResponseSchema
+from app.models.generos_models import Genero
+from app.repositories.sincronizacao_repo import listar_alteracoes
 from app.repositories.generos_repo import criar_genero, listar_generos,obter_genero_por_id, deletar_genero, buscar_livros_por_genero
 from sqlalchemy.orm import Session  
 from app.db.session import get_db
 from app.core.security import verifica_role
-from fastapi import APIRouter, Depends, HTTPException
-from typing import Any
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Any, Optional
+from datetime import datetime
 
 router = APIRouter(prefix="/generos", tags=["Gêneros"])
 
@@ -19,6 +23,11 @@ def criar_novo_genero(genero: GeneroCreate, db: Session = Depends(get_db), usuar
 def obter_generos(db: Session = Depends(get_db)):
     return listar_generos(db)
 
+# Rota de sincronização incremental: gêneros alterados ou removidos desde a marca informada
+@router.get("/alteracoes", response_model=AlteracoesResponseSchema[GeneroResponse])
+def obter_alteracoes_generos(desde: Optional[datetime] = Query(None, description="Marca d'água da última sincronização."), apos_id: Optional[int] = Query(None, description="Último ID recebido quando a página anterior veio cheia."), limite: int = Query(1000, ge=1, le=5000), db: Session = Depends(get_db)):
+    return listar_alteracoes(db, Genero, "generos", desde=desde, apos_id=apos_id, limite=limite)
+
 # Rota para obter um gênero pelo ID
 @router.get("/{genero_id}", response_model=GeneroResponse)
 def obter_genero(genero_id: int, db: Session = Depends(get_db)):
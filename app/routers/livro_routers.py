@@ -1,10 +1,17 @@
-from app.schemas.livro_schemas import LivroCreateSchema, LivroUpdateSchema, LivroResponseSchema
-from app.repositories.livros_repo import cadastrar_livro, listar_livros, atualizar_livro, listar_livros_com_estoque, obter_livro_por_id, deletar_livro, deletar_livro_e_emprestimos
+from app.schemas.livro_schemas import LivroCreateSchema, LivroUpdateSchema, LivroResponseSchema, LivrosLoteSchema, LivrosLoteResponseSchema, SugestaoSchema, RecomendacaoSchema, LivroRedeSchema
+from app.schemas.sincronizacao_schemas import AlteracoesResponseSchema
+from app.schemas.livros_generos_schemas import LivrosGenerosSchemas, GenerosLivroUpdateSchema
+from app.models.livro_models import Livro
+from app.repositories.sincronizacao_repo import listar_alteracoes
+from app.repositories.livros_repo import cadastrar_livro, listar_livros, atualizar_livro, listar_livros_com_estoque, obter_livro_por_id, deletar_livro, deletar_livro_e_emprestimos, atualizar_generos_livro, deletar_livros_em_lote, listar_recomendacoes, buscar_livros_na_rede
 from sqlalchemy.orm import Session
-from app.db.session import get_db
+from app.db.session import get_db, limite_consultas
 from app.core.security import verifica_role
+from app.core.sugestoes import sugestoes_da_biblioteca
+from app.db.bibliotecas import biblioteca_da_sessao
 from fastapi import APIRouter, Depends, Query
 from typing import Any, List, Optional
+from datetime import datetime
 
 router = APIRouter(prefix="/livros", tags=["Livros"])
 
@@ -18,11 +25,37 @@ def cadastrar_novo_livro(livro: LivroCreateSchema, db: Session = Depends(get_db)
 def obter_livros(genero: Optional[int] = Query(None, description="ID do Gênero para filtrar os livros."), search: Optional[str] = Query(None, description="Termo de busca (título ou autor)."), db: Session = Depends(get_db), usuario: Any = Depends(verifica_role(["bibliotecario", "leitor"]))):
     return listar_livros(db, genero=genero, search=search)
 
+# Rota de autocompletar: títulos e autores que começam com o termo, servidos do índice em memória (do banco enquanto ele carrega)
+@router.get("/sugestoes", response_model=List[SugestaoSchema])
+def sugerir_livros(q: str = Query(..., min_length=1, max_length=100, description="Início do título ou do nome do autor."), limite: int = Query(10, ge=1, le=50), db: Session = Depends(get_db), usuario: Any = Depends(verifica_role(["bibliotecario", "leitor"]))):
+    return sugestoes_da_biblioteca(db, biblioteca_da_sessao(db), q, limite)
+
+# Rota de busca na rede: consulta em paralelo os nós de todas as filiais e agrupa os exemplares por ISBN
+@router.get("/rede", response_model=List[LivroRedeSchema])
+def buscar_na_rede(search: str = Query(..., min_length=2, max_length=100, description="Termo de busca (título ou autor)."), limite: int = Query(20, ge=1, le=100), usuario: Any = Depends(verifica_role(["bibliotecario", "leitor"]))):
+    return buscar_livros_na_rede(search, limite)
+
+# Rota de sincronização incremental: livros alterados ou removidos desde a marca informada
+@router.get("/alteracoes", response_model=AlteracoesResponseSchema[LivroResponseSchema])
+def obter_alteracoes_livros(desde: Optional[datetime] = Query(None, description="Marca d'água da última sincronização."), apos_id: Optional[int] = Query(None, description="Último ID recebido quando a página anterior veio cheia."), limite: int = Query(1000, ge=1, le=5000), db: Session = Depends(get_db), usuario: Any = Depends(verifica_role(["bibliotecario", "leitor"]))):
+    return listar_alteracoes(db, Livro, "livro", desde=desde, apos_id=apos_id, limite=limite)
+
 # Rota para atualizar um livro pelo ID
 @router.put("/{livro_id}", response_model=LivroResponseSchema)
 def atualizar_dados_livro(livro_id: int, livro: LivroUpdateSchema, db: Session = Depends(get_db), usuario: Any = Depends(verifica_role(["bibliotecario"]))):
     return atualizar_livro(db, livro_id, livro)
 
+# Rota para substituir os gêneros de um livro pelo conjunto informado
+@router.put("/{livro_id}/generos", response_model=LivrosGenerosSchemas)
+def atualizar_generos_do_livro(livro_id: int, generos: GenerosLivroUpdateSchema, db: Session = Depends(get_db), usuario: Any = Depends(verifica_role(["bibliotecario"]))):
+    generos_ids = atualizar_generos_livro(db, livro_id, generos.generos_ids)
+    return LivrosGenerosSchemas(livro_id=livro_id, generos_ids=generos_ids)
+
+# Rota para deletar livros em lote com seus empréstimos devolvidos; informa os bloqueados por empréstimo ativo
+@router.delete("/lote", response_model=LivrosLoteResponseSchema, dependencies=[Depends(limite_consultas(30_000))])
+def deletar_livros_lote(lote: LivrosLoteSchema, db: Session = Depends(get_db), usuario: Any = Depends(verifica_role(["bibliotecario"]))):
+    return deletar_livros_em_lote(db, lote.livros_ids)
+
 # Rota para deletar um livro pelo ID 
 @router.delete("/{livro_id}", status_code=204)
 def deletar_dados_livro(livro_id: int, db: Session = Depends(get_db), usuario: Any = Depends(verifica_role(["bibliotecario"]))):
@@ -38,6 +71,11 @@ def deletar_livro_com_emprestimos(livro_id: int, db: Session = Depends(get_db),
 def listar_livros_estoque(db: Session = Depends(get_db), usuario: Any = Depends(verifica_role(["bibliotecario", "leitor"]))):
     return listar_livros_com_estoque(db)
 
+# Rota de recomendações: livros emprestados pelos mesmos leitores, servidos do índice de coocorrência
+@router.get("/{livro_id}/recomendacoes", response_model=List[RecomendacaoSchema])
+def recomendacoes_livro(livro_id: int, limite: int = Query(10, ge=1, le=50), db: Session = Depends(get_db), usuario: Any = Depends(verifica_role(["bibliotecario", "leitor"]))):
+    return listar_recomendacoes(db, livro_id, limite)
+
 # Rota para buscar livro pelo id
 @router.get("/{livro_id}", response_model=LivroResponseSchema)
 def livro_por_id(livro_id: int, db: Session = Depends(get_db), usuario: Any = Depends(verifica_role(["bibliotecario", "leitor"]))):    
@@ -0,0 +1,17 @@
+from app.core.perfilador import armazem_perfis
+from app.core.security import verifica_role
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse, Response
+from typing import Any
+
+router = APIRouter(prefix="/perfis", tags=["Perfis"])
+
+# Rota para baixar o perfil de uma requisição (id no cabeçalho X-Perfil-Id) em speedscope ou collapsed stacks
+@router.get("/{perfil_id}")
+def obter_perfil(perfil_id: str, formato: str = Query("speedscope", pattern="^(speedscope|collapsed)$"), usuario: Any = Depends(verifica_role(["bibliotecario"]))):
+    perfil = armazem_perfis.obter(perfil_id, formato) if armazem_perfis else None
+    if perfil is None:
+        raise HTTPException(status_code=404, detail="Perfil não encontrado")
+    if formato == "collapsed":
+        return PlainTextResponse(perfil)
+    return Response(perfil, media_type="application/json")
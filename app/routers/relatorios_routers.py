@@ -0,0 +1,35 @@
+from app.schemas.relatorios_schemas import LivrosMaisEmprestadosResponseSchema, EmprestimosPorMesResponseSchema, GenerosMaisEmprestadosResponseSchema, DuracaoMediaResponseSchema
+from app.repositories.relatorios_repo import livros_mais_emprestados, emprestimos_por_mes, generos_mais_emprestados, duracao_media_emprestimos
+from app.db.relatorios import atualizar_views_relatorios
+from sqlalchemy.orm import Session
+from app.db.session import get_db, mapa_bibliotecas
+from app.core.security import verifica_role
+from fastapi import APIRouter, Depends, Query
+from typing import Any
+
+router = APIRouter(prefix="/relatorios", tags=["Relatórios"])
+
+# Rota para listar os livros mais emprestados
+@router.get("/livros-mais-emprestados", response_model=LivrosMaisEmprestadosResponseSchema)
+def obter_livros_mais_emprestados(limite: int = Query(20, ge=1, le=500), db: Session = Depends(get_db), usuario: Any = Depends(verifica_role(["bibliotecario"]))):
+    return livros_mais_emprestados(db, limite)
+
+# Rota para listar o total de empréstimos por mês
+@router.get("/emprestimos-por-mes", response_model=EmprestimosPorMesResponseSchema)
+def obter_emprestimos_por_mes(meses: int = Query(12, ge=1, le=240), db: Session = Depends(get_db), usuario: Any = Depends(verifica_role(["bibliotecario"]))):
+    return emprestimos_por_mes(db, meses)
+
+# Rota para listar os gêneros mais emprestados
+@router.get("/generos-mais-emprestados", response_model=GenerosMaisEmprestadosResponseSchema)
+def obter_generos_mais_emprestados(limite: int = Query(20, ge=1, le=500), db: Session = Depends(get_db), usuario: Any = Depends(verifica_role(["bibliotecario"]))):
+    return generos_mais_emprestados(db, limite)
+
+# Rota para obter a duração média dos empréstimos
+@router.get("/duracao-media", response_model=DuracaoMediaResponseSchema)
+def obter_duracao_media(db: Session = Depends(get_db), usuario: Any = Depends(verifica_role(["bibliotecario"]))):
+    return duracao_media_emprestimos(db)
+
+# Rota para forçar a atualização das views de relatórios em todos os nós
+@router.post("/atualizar")
+def forcar_atualizacao_relatorios(usuario: Any = Depends(verifica_role(["bibliotecario"]))):
+    return {"atualizado": all([atualizar_views_relatorios(engine) for engine in mapa_bibliotecas.engines()])}
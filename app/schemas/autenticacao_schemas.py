@@ -1,11 +1,15 @@
 from pydantic import BaseModel, EmailStr, Field
 from app.models.usuarios_models import roleEnum
+from app.db.bibliotecas import BIBLIOTECA_PADRAO
+from typing import Optional
 
 # schema para login
 
 class LoginSchema(BaseModel):
     email: EmailStr = Field(..., max_length=100)
     senha: str = Field(..., min_length=6, max_length=255)
+    # Sem a filial, o e-mail é procurado em todos os nós
+    biblioteca_id: Optional[int] = Field(None, ge=1)
 
 # response model atualizado para o front_end 
 class LoginResponseFrontendSchema(BaseModel):
@@ -15,6 +19,7 @@ class LoginResponseFrontendSchema(BaseModel):
     nome: str
     email: EmailStr
     id: int
+    biblioteca_id: int
     
     class Config:
         from_attributes = True
@@ -25,12 +30,14 @@ class RegisterSchema(BaseModel):
     email: EmailStr = Field(..., max_length=100)
     senha: str = Field(..., min_length=6, max_length=255)
     role: roleEnum = roleEnum.LEITOR
+    biblioteca_id: int = Field(BIBLIOTECA_PADRAO, ge=1)
 
 class ResponseRegisterSchema(BaseModel):
     usuario_id: int
     nome: str
     email: EmailStr
     role: roleEnum
+    biblioteca_id: int
 
     class Config:
         from_attributes = True
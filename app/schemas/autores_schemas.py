@@ -11,7 +11,7 @@ class AutorBaseSchema(BaseModel):
     @classmethod
     def check_data_nao_futura(cls, valor_data: date) -> date:
         data_hoje = date.today()
-        if valor_data > data_hoje:
+        if valor_data is not None and valor_data > data_hoje:
             raise ValueError(
                 f"A data de nascimento não pode ser maior que a data atual ({data_hoje.isoformat()})."
             )
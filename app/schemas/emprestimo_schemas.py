@@ -1,13 +1,34 @@
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, Field, field_validator
 from typing import Optional
 from datetime import date, datetime
 from enum import Enum
+from app.core.isbn import normalizar_isbn
 
 # Enum para status do empréstimo
 class StatusEmprestimoEnum(str, Enum):
     EMPRESTADO = "Emprestado"
     DEVOLVIDO = "Devolvido"
 
+# Chaves de ordenação aceitas nas listagens; o prefixo "-" indica ordem decrescente
+class OrdenacaoEmprestimoEnum(str, Enum):
+    DATA_EMPRESTIMO = "data_emprestimo"
+    DATA_EMPRESTIMO_DESC = "-data_emprestimo"
+    DATA_DEVOLUCAO_PREVISTA = "data_devolucao_prevista"
+    DATA_DEVOLUCAO_PREVISTA_DESC = "-data_devolucao_prevista"
+
+# Garante que a data de devolução prevista seja futura
+def validar_data_futura(v):
+    if isinstance(v, str):
+        v = datetime.fromisoformat(v.replace('Z', '+00:00')) # Converte string ISO para datetime
+
+    hoje = datetime.combine(date.today(), datetime.min.time())
+
+    # Compara apenas as datas (ignorando a hora)
+    if v.date() <= hoje.date():
+        raise ValueError("A data de devolução prevista deve ser posterior à data de hoje.")
+
+    return v
+
 # Schema base para Empréstimo
 class EmprestimoBaseSchema(BaseModel):
     livro_id: int
@@ -21,16 +42,24 @@ class EmprestimoCreateSchema(EmprestimoBaseSchema):
     @field_validator('data_devolucao_prevista', mode='before')
     @classmethod
     def check_future_date(cls, v):
-        if isinstance(v, str):
-            v = datetime.fromisoformat(v.replace('Z', '+00:00')) # Converte string ISO para datetime
-            
-        hoje = datetime.combine(date.today(), datetime.min.time())
-        
-        # Compara apenas as datas (ignorando a hora)
-        if v.date() <= hoje.date():
-            raise ValueError("A data de devolução prevista deve ser posterior à data de hoje.")
-        
-        return v
+        return validar_data_futura(v)
+
+# Schema para empréstimo no balcão a partir do ISBN lido pelo scanner
+class EmprestimoPorIsbnSchema(BaseModel):
+    isbn: str
+    leitor_id: int
+    bibliotecario_id: int
+    data_devolucao_prevista: datetime
+
+    @field_validator('isbn')
+    @classmethod
+    def check_isbn(cls, v: str) -> str:
+        return normalizar_isbn(v)
+
+    @field_validator('data_devolucao_prevista', mode='before')
+    @classmethod
+    def check_future_date(cls, v):
+        return validar_data_futura(v)
 
 # Schema para atualização de Empréstimo
 class EmprestimoUpdateSchema(BaseModel):
@@ -46,6 +75,18 @@ class DevolucaoSchema(BaseModel):
     bibliotecario_devolucao_id: int
     data_devolucao_real: datetime
 
+# Schema para devolução no balcão a partir do ISBN; o leitor desambigua quando há várias cópias emprestadas
+class DevolucaoPorIsbnSchema(BaseModel):
+    isbn: str
+    bibliotecario_devolucao_id: int
+    data_devolucao_real: datetime
+    leitor_id: Optional[int] = None
+
+    @field_validator('isbn')
+    @classmethod
+    def check_isbn(cls, v: str) -> str:
+        return normalizar_isbn(v)
+
 # Schema de resposta para Empréstimo
 class EmprestimoResponseSchema(EmprestimoBaseSchema):
     emprestimo_id: int
@@ -61,4 +102,31 @@ class EmprestimoResponseSchema(EmprestimoBaseSchema):
     class Config:
         from_attributes = True
         use_enum_values = True
-  
\ No newline at end of file
+
+# Schema de resposta de um evento do log de circulação
+class EventoCirculacaoResponseSchema(BaseModel):
+    evento_id: int
+    tipo: str
+    emprestimo_id: int
+    livro_id: int
+    leitor_id: int
+    bibliotecario_id: int
+    ator_id: Optional[int] = None
+    ocorrido_em: datetime
+    gravado_em: datetime
+    dados: Optional[dict] = None
+
+    class Config:
+        from_attributes = True
+  
+# Filtros, ordenação e página das listagens de empréstimos
+class FiltroEmprestimosSchema(BaseModel):
+    status: Optional[StatusEmprestimoEnum] = None
+    atrasado: Optional[bool] = None
+    livro_id: Optional[int] = None
+    data_inicio: Optional[date] = None
+    data_fim: Optional[date] = None
+    prevista_ate: Optional[date] = None
+    ordenar: OrdenacaoEmprestimoEnum = OrdenacaoEmprestimoEnum.DATA_EMPRESTIMO_DESC
+    limite: int = Field(100, ge=1, le=1000)
+    deslocamento: int = Field(0, ge=0)
@@ -1,4 +1,5 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
+from app.core.isbn import normalizar_isbn
 from typing import Optional
 
 # Schema base para Livro
@@ -13,6 +14,13 @@ class LivroBaseSchema(BaseModel):
 # Schema para criação de Livro
 class LivroCreateSchema(LivroBaseSchema):
     lista_generos_ids: list[int] = Field(...)
+
+    # Grava o ISBN na forma lida pelo scanner (sem hífens nem espaços, dígito conferido); antes do max_length,
+    # para aceitar um ISBN-13 digitado com hífens
+    @field_validator('isbn', mode='before')
+    @classmethod
+    def check_isbn(cls, v):
+        return normalizar_isbn(v) if isinstance(v, str) else v
     
 # Schema para atualização de Livro
 class LivroUpdateSchema(BaseModel):
@@ -23,6 +31,11 @@ class LivroUpdateSchema(BaseModel):
     numero_copias: Optional[int] = Field(None, ge=0)
     autor_id: Optional[int] = None
 
+    @field_validator('isbn', mode='before')
+    @classmethod
+    def check_isbn(cls, v):
+        return normalizar_isbn(v) if isinstance(v, str) else v
+
 # Schema de resposta para Livro
 class LivroResponseSchema(LivroBaseSchema):
     livro_id: int
@@ -43,4 +56,38 @@ class LivroResponseSimplificado(BaseModel):
     class Config:
         from_attributes = True
 
+# Schema para remoção de livros em lote
+class LivrosLoteSchema(BaseModel):
+    livros_ids: list[int] = Field(..., min_length=1, max_length=5000)
+
+# Schema de resposta da remoção em lote
+class LivrosLoteResponseSchema(BaseModel):
+    removidos: list[int]
+    bloqueados: list[int]
+    nao_encontrados: list[int]
+
+# Schema de resposta para sugestões de autocompletar (título ou autor)
+class SugestaoSchema(BaseModel):
+    tipo: str
+    id: int
+    texto: str
 
+# Schema de resposta para recomendações: pontuação é o número de leitores que pegaram os dois livros
+class RecomendacaoSchema(BaseModel):
+    livro_id: int
+    titulo: str
+    autor_id: int
+    pontuacao: int
+
+# Exemplar de um título em uma filial, na busca pela rede
+class ExemplarBibliotecaSchema(BaseModel):
+    biblioteca_id: int
+    livro_id: int
+    numero_copias: int
+
+# Schema de resposta da busca na rede: um título (ISBN) com os exemplares de cada filial
+class LivroRedeSchema(BaseModel):
+    isbn: str
+    titulo: str
+    autor: str
+    exemplares: list[ExemplarBibliotecaSchema]
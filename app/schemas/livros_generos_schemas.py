@@ -6,4 +6,8 @@ class LivrosGenerosSchemas(BaseModel):
     generos_ids: list[int]
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# Schema para substituir o conjunto de gêneros de um livro
+class GenerosLivroUpdateSchema(BaseModel):
+    generos_ids: list[int]
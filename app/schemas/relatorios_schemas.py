@@ -0,0 +1,42 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import date, datetime
+
+# Schema base para respostas de relatórios, com a defasagem dos dados
+class RelatorioBaseSchema(BaseModel):
+    atualizado_em: datetime
+    defasagem_segundos: float
+
+# Schemas para os livros mais emprestados
+class LivroMaisEmprestadoSchema(BaseModel):
+    livro_id: int
+    titulo: str
+    total_emprestimos: int
+
+class LivrosMaisEmprestadosResponseSchema(RelatorioBaseSchema):
+    dados: list[LivroMaisEmprestadoSchema]
+
+# Schemas para os empréstimos por mês
+class EmprestimosMesSchema(BaseModel):
+    mes: date
+    total_emprestimos: int
+
+class EmprestimosPorMesResponseSchema(RelatorioBaseSchema):
+    dados: list[EmprestimosMesSchema]
+
+# Schemas para os gêneros mais emprestados
+class GeneroMaisEmprestadoSchema(BaseModel):
+    genero_id: int
+    nome: str
+    total_emprestimos: int
+
+class GenerosMaisEmprestadosResponseSchema(RelatorioBaseSchema):
+    dados: list[GeneroMaisEmprestadoSchema]
+
+# Schemas para a duração média dos empréstimos
+class DuracaoMediaSchema(BaseModel):
+    media_dias: Optional[float] = None
+    total_devolvidos: int
+
+class DuracaoMediaResponseSchema(RelatorioBaseSchema):
+    dados: list[DuracaoMediaSchema]
@@ -0,0 +1,15 @@
+from pydantic import BaseModel
+from typing import Generic, Optional, TypeVar
+from datetime import datetime
+
+T = TypeVar("T")
+
+# Schema de resposta da sincronização incremental (delta-sync)
+class AlteracoesResponseSchema(BaseModel, Generic[T]):
+    alterados: list[T]
+    removidos: list[int]
+    # Marca d'água a ser enviada como `desde` na próxima chamada
+    marca: datetime
+    # Preenchido quando a página veio cheia: enviar como `apos_id` junto com a marca
+    ultimo_id: Optional[int] = None
+    completo: bool
@@ -23,6 +23,7 @@ class UsuarioUpdateSchema(BaseModel):
 # Schema de resposta para Usuário
 class UsuarioResponseSchema(UsuarioBaseSchema):
     usuario_id: int
+    biblioteca_id: int
     data_cadastro: datetime
 
     class Config:
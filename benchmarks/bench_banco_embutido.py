@@ -0,0 +1,34 @@
+# Benchmark: tempo para subir o banco SQLite embutido semeado e latência de consultas de catálogo sobre ele.
+# Uso: python benchmarks/bench_banco_embutido.py [QUANTIDADE_LIVROS]
+from app.db.embutido import usar_banco_embutido
+# Modo embutido (SQLite) antes de importar a aplicação, que exige DATABASE_URL
+usar_banco_embutido()
+from app.db.embutido import criar_banco_de_teste
+from app.repositories.livros_repo import listar_livros, obter_livro_por_id
+from app.repositories.emprestimo_repo import obter_emprestimos_por_leitor
+import os
+import sys
+import time
+
+QUANTIDADE = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+CONSULTAS = 1000
+ARQUIVO = "bench_embutido.sqlite3"
+
+# Mede a latência média de uma função em milissegundos
+def medir(nome: str, funcao) -> None:
+    inicio = time.perf_counter()
+    for i in range(CONSULTAS):
+        funcao(i)
+    print(f"{nome:>22}: {(time.perf_counter() - inicio) * 1000 / CONSULTAS:.3f}ms")
+
+if __name__ == "__main__":
+    if os.path.exists(ARQUIVO):
+        os.remove(ARQUIVO)
+    for url in ("sqlite://", f"sqlite:///{ARQUIVO}"):
+        inicio = time.perf_counter()
+        fabrica = criar_banco_de_teste(url, livros=QUANTIDADE, emprestimos=QUANTIDADE * 2)
+        print(f"{url}: banco semeado em {(time.perf_counter() - inicio) * 1000:.0f}ms")
+        with fabrica() as db:
+            medir("livro por id", lambda i: obter_livro_por_id(db, i % QUANTIDADE + 1))
+            medir("listar livros (busca)", lambda i: listar_livros(db, search=f"Livro {i % 100}"))
+            medir("empréstimos do leitor", lambda i: obter_emprestimos_por_leitor(db, i % 50 + 2))
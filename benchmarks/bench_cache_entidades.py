@@ -0,0 +1,66 @@
+# Benchmark: consultas de detalhe por ID (livro, autor, gênero, usuário) sem cache, com o LRU em memória e com o SQLite compartilhado.
+# Os IDs seguem uma distribuição concentrada (poucos itens quentes, como nas telas do painel) e 1% das leituras vem depois de uma escrita.
+# Uso: python benchmarks/bench_cache_entidades.py [QUANTIDADE_LEITURAS]   (padrão: 20000)
+from app.db.embutido import usar_banco_embutido
+# Modo embutido (SQLite) antes de importar a aplicação, que exige DATABASE_URL
+usar_banco_embutido()
+from app.db.embutido import criar_banco_de_teste
+from app.core.cache_entidades import cache_entidades, escopo_no, BackendMemoria, BackendSQLite
+from app.repositories.livros_repo import obter_livro_por_id
+from app.repositories.autores_repo import buscar_autor_por_id
+from app.repositories.generos_repo import obter_genero_por_id
+from app.repositories.usarios_repo import obter_usuario_por_id
+from app.db.bibliotecas import biblioteca_da_sessao
+import os
+import random
+import sys
+import tempfile
+import time
+
+LEITURAS = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+LIVROS, AUTORES, GENEROS, LEITORES = 20_000, 2_000, 40, 500
+
+CONSULTAS = [
+    ("livro", obter_livro_por_id, LIVROS),
+    ("autor", buscar_autor_por_id, AUTORES),
+    ("genero", obter_genero_por_id, GENEROS),
+    ("usuario", obter_usuario_por_id, LEITORES),
+]
+
+# Latência média e p99 das leituras em microssegundos; 1% delas invalida a entrada antes, como faria uma escrita
+def medir(fabrica, backend) -> tuple[float, float]:
+    # Reinicia o cache global (o mesmo objeto usado pelos repositórios) com o backend medido
+    cache = cache_entidades
+    cache.__init__(backend)
+    gerador = random.Random(7)
+    tempos = []
+    with fabrica() as db:
+        for _ in range(LEITURAS):
+            entidade, consulta, quantidade = gerador.choice(CONSULTAS)
+            entidade_id = min(int(gerador.paretovariate(1.2)), quantidade)
+            if gerador.random() < 0.01:
+                escopo = biblioteca_da_sessao(db) if entidade in ("livro", "usuario") else escopo_no(db.get_bind())
+                cache.invalidar(entidade, escopo, [entidade_id])
+            inicio = time.perf_counter()
+            consulta(db, entidade_id)
+            tempos.append((time.perf_counter() - inicio) * 1_000_000)
+    tempos.sort()
+    return sum(tempos) / len(tempos), tempos[int(len(tempos) * 0.99)]
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as pasta:
+        fabrica = criar_banco_de_teste(url=f"sqlite:///{os.path.join(pasta, 'bench.db')}", livros=LIVROS, autores=AUTORES, generos=GENEROS, leitores=LEITORES, emprestimos=1)
+        backends = {
+            "sem cache": None,
+            "memória": BackendMemoria(),
+            "sqlite": BackendSQLite(os.path.join(pasta, "cache.sqlite3")),
+        }
+        print(f"{LEITURAS} leituras por ID (banco SQLite em arquivo)")
+        print(f"{'cache':>10} {'média':>10} {'p99':>10} {'acerto':>8} {'itens':>7} {'memória':>10}")
+        for nome, backend in backends.items():
+            media, p99 = medir(fabrica, backend)
+            metricas = cache_entidades.metricas()
+            acertos = sum(entidade["acertos"] for entidade in metricas.get("entidades", {}).values())
+            faltas = sum(entidade["faltas"] for entidade in metricas.get("entidades", {}).values())
+            taxa = acertos / (acertos + faltas) if acertos + faltas else 0.0
+            print(f"{nome:>10} {media:>8.1f}µs {p99:>8.1f}µs {taxa:>7.1%} {metricas.get('itens', 0):>7} {metricas.get('memoria_bytes', 0) / 1024:>8.0f}KiB")
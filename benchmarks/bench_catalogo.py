@@ -0,0 +1,74 @@
+# Benchmark: listagem, busca, estoque e livros por gênero pelo banco (joins) versus o catálogo colunar em memória.
+# Mede a latência da função do repositório (consulta + validação no schema de resposta) e o custo de uma escrita incremental.
+# Uso: python benchmarks/bench_catalogo.py [QUANTIDADE_TITULOS ...]   (padrão: 100000 1000000)
+from app.db.embutido import usar_banco_embutido
+# Modo embutido (SQLite) antes de importar a aplicação, que exige DATABASE_URL
+usar_banco_embutido()
+from app.db.embutido import criar_banco_de_teste, isbn_semente
+from app.core import catalogo
+from app.repositories.livros_repo import listar_livros, listar_livros_com_estoque
+from app.repositories.generos_repo import buscar_livros_por_genero
+import sys
+import time
+
+QUANTIDADES = [int(argumento) for argumento in sys.argv[1:]] or [100_000, 1_000_000]
+REPETICOES = 5
+
+# Mediana da latência em milissegundos
+def medir(fabrica, consulta, repeticoes: int = REPETICOES) -> float:
+    tempos = []
+    for _ in range(repeticoes):
+        with fabrica() as db:
+            inicio = time.perf_counter()
+            consulta(db)
+            tempos.append((time.perf_counter() - inicio) * 1000)
+    return sorted(tempos)[len(tempos) // 2]
+
+CENARIOS = {
+    "gênero, 1ª página": lambda db: listar_livros(db, genero=7),
+    "busca por título": lambda db: listar_livros(db, search="livro 4242"),
+    "busca por autor + gênero": lambda db: listar_livros(db, genero=3, search="sobrenome 12"),
+    "busca sem resultado": lambda db: listar_livros(db, search="inexistente"),
+    "página profunda": lambda db: listar_livros(db, skip=50_000, limit=50),
+    "livros por gênero (todos)": lambda db: buscar_livros_por_genero(db, 7),
+    "com estoque (todos)": listar_livros_com_estoque,
+}
+
+if __name__ == "__main__":
+    for quantidade in QUANTIDADES:
+        inicio = time.perf_counter()
+        fabrica = criar_banco_de_teste(livros=quantidade, autores=max(quantidade // 10, 1), generos=40, emprestimos=1)
+        print(f"\n{quantidade} títulos (banco semeado em {time.perf_counter() - inicio:.1f}s)")
+
+        catalogo.CATALOGO_EM_MEMORIA = True
+        catalogo.catalogos.clear()
+        inicio = time.perf_counter()
+        with fabrica() as db:
+            indice = catalogo.catalogo_pronto(db)
+        livros = indice.livros  # type: ignore
+        memoria = sum(coluna.nbytes for coluna in (livros.ids, livros.ativos, *livros.numericas.values()))
+        memoria += sum(len(coluna.texto) + coluna.inicios.nbytes for coluna in livros.textos.values())
+        print(f"carga do catálogo: {time.perf_counter() - inicio:.2f}s, ~{memoria / 2**20:.0f} MiB em colunas")
+
+        print(f"{'cenário':>28} {'banco':>10} {'memória':>10}")
+        for nome, consulta in CENARIOS.items():
+            catalogo.CATALOGO_EM_MEMORIA = False
+            banco = medir(fabrica, consulta)
+            catalogo.CATALOGO_EM_MEMORIA = True
+            memoria = medir(fabrica, consulta)
+            print(f"{nome:>28} {banco:>8.2f}ms {memoria:>8.2f}ms  ({banco / memoria:.0f}x)")
+
+        # Escritas chegam como eventos: estoque muda só um inteiro, título entra na área de alterados até a compactação
+        inicio = time.perf_counter()
+        for livro_id in range(1, 1001):
+            indice.aplicar_evento({"tipo": "estoque_alterado", "livro_id": livro_id, "numero_copias": 3})  # type: ignore
+        print(f"{'evento de estoque':>28} {(time.perf_counter() - inicio) * 1000:>19.3f}µs")
+        inicio = time.perf_counter()
+        for livro_id in range(1, 1001):
+            indice.aplicar_evento({"tipo": "livro_atualizado", "livro": {  # type: ignore
+                "livro_id": livro_id, "titulo": f"Título revisto {livro_id}", "isbn": isbn_semente(livro_id), "editora": None,
+                "ano_publicacao": 2000, "numero_copias": 1, "autor_id": 1,
+            }})
+        print(f"{'evento de título':>28} {(time.perf_counter() - inicio) * 1000:>19.3f}µs")
+        catalogo.CATALOGO_EM_MEMORIA = True
+        print(f"{'busca com 1000 alterados':>28} {medir(fabrica, CENARIOS['busca por título']):>19.2f}ms")
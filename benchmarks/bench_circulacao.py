@@ -0,0 +1,62 @@
+# Benchmark: custo do log de circulação no caminho do balcão (evento na transação versus fila com escritor em lote)
+# e vazão do escritor por tamanho de lote, em SQLite em arquivo (WAL).
+# Uso: python benchmarks/bench_circulacao.py [QUANTIDADE_OPERACOES]   (padrão: 2000)
+from app.db.embutido import usar_banco_embutido
+# Modo embutido (SQLite) antes de importar a aplicação, que exige DATABASE_URL
+usar_banco_embutido()
+from app.db.embutido import criar_banco_de_teste
+from app.core import circulacao
+from app.repositories.emprestimo_repo import criar_emprestimo, devolver_emprestimo
+from app.schemas.emprestimo_schemas import EmprestimoCreateSchema
+from datetime import datetime, timedelta
+from sqlalchemy import text
+import os
+import sys
+import tempfile
+import time
+
+OPERACOES = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+# Empresta e devolve OPERACOES vezes; retorna a latência mediana e p99 por operação em milissegundos
+def medir_balcao(fabrica) -> tuple[float, float]:
+    prevista = datetime.now() + timedelta(days=14)
+    tempos = []
+    for i in range(OPERACOES):
+        with fabrica() as db:
+            inicio = time.perf_counter()
+            emprestimo = criar_emprestimo(db, EmprestimoCreateSchema(livro_id=i % 500 + 1, leitor_id=2, bibliotecario_id=1, data_devolucao_prevista=prevista))
+            devolver_emprestimo(db, emprestimo.emprestimo_id, datetime.now() + timedelta(days=1), 1)  # type: ignore
+            tempos.append((time.perf_counter() - inicio) * 1000 / 2)
+    tempos.sort()
+    return tempos[len(tempos) // 2], tempos[int(len(tempos) * 0.99)]
+
+# Vazão do escritor gravando `total` eventos já enfileirados em lotes de `lote`
+def medir_escritor(fabrica, total: int, lote: int) -> float:
+    escritor = circulacao.EscritorCirculacao(fabrica.kw["bind"], capacidade=total, lote=lote, intervalo_ms=0)
+    linha = {"tipo": "emprestimo_criado", "biblioteca_id": 1, "emprestimo_id": 1, "livro_id": 1, "leitor_id": 2, "bibliotecario_id": 1, "ator_id": 1, "ocorrido_em": datetime.now(), "dados": None}
+    for _ in range(total):
+        escritor.fila.put_nowait(dict(linha))
+    inicio = time.perf_counter()
+    escritor.start()
+    escritor.parar.set()
+    escritor.join()
+    return total / (time.perf_counter() - inicio)
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as pasta:
+        fabrica = criar_banco_de_teste(url=f"sqlite:///{os.path.join(pasta, 'bench.db')}", livros=500, emprestimos=1)
+        with fabrica() as db:
+            db.execute(text("UPDATE livro SET numero_copias = 1000000"))
+            db.commit()
+
+        print(f"{OPERACOES} empréstimos + devoluções")
+        print(f"{'durabilidade':>14} {'mediana':>10} {'p99':>10}")
+        for modo in ("transacional", "fila"):
+            circulacao.CIRCULACAO_DURABILIDADE = modo
+            mediana, p99 = medir_balcao(fabrica)
+            print(f"{modo:>14} {mediana:>8.3f}ms {p99:>8.3f}ms")
+        circulacao.encerrar_escritores_circulacao()
+
+        print(f"\n{'lote':>6} {'eventos/s':>12}")
+        for lote in (1, 50, 500):
+            print(f"{lote:>6} {medir_escritor(fabrica, 20_000, lote):>12.0f}")
@@ -0,0 +1,62 @@
+# Benchmark: comandos SQL e latência por escrita, comparando o padrão antigo (commit + refresh com
+# expire_on_commit) com o atual (valores do banco via RETURNING e sessão que não expira no commit).
+# Uso: python benchmarks/bench_escritas.py [REPETICOES]
+from app.db.embutido import usar_banco_embutido
+# Modo embutido (SQLite) antes de importar a aplicação, que exige DATABASE_URL
+usar_banco_embutido()
+from app.db.embutido import criar_banco_de_teste
+from app.repositories.autores_repo import cadastrar_autor
+from app.repositories.livros_repo import cadastrar_livro, atualizar_livro
+from app.repositories.emprestimo_repo import criar_emprestimo, devolver_emprestimo
+from app.schemas.autores_schemas import AutorCreateSchema, AutorResponseSchema
+from app.schemas.livro_schemas import LivroCreateSchema, LivroUpdateSchema, LivroResponseSchema
+from app.schemas.emprestimo_schemas import EmprestimoCreateSchema, EmprestimoResponseSchema
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+from datetime import datetime, timedelta
+import sys
+import time
+
+REPETICOES = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+comandos = [0]
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _contar(conexao, cursor, sql, parametros, contexto, executemany):
+    comandos[0] += 1
+
+# Executa a escrita e monta a resposta como a rota faria; no modo antigo, faz o refresh depois do commit
+def escrever(db, funcao, schema, antigo: bool) -> None:
+    resultado = funcao(db)
+    if antigo:
+        db.refresh(resultado)
+    schema.model_validate(resultado)
+
+# Mede comandos e tempo médio por escrita
+def medir(nome: str, fabrica: sessionmaker, funcao, schema, antigo: bool) -> None:
+    comandos[0] = 0
+    inicio = time.perf_counter()
+    for i in range(REPETICOES):
+        with fabrica() as db:
+            escrever(db, lambda db: funcao(db, i), schema, antigo)
+    duracao = (time.perf_counter() - inicio) * 1000 / REPETICOES
+    print(f"{nome:>19} {'antigo' if antigo else 'atual':>7}: {comandos[0] / REPETICOES:.1f} comandos, {duracao:.3f}ms por escrita")
+
+if __name__ == "__main__":
+    prevista = datetime.now() + timedelta(days=7)
+    nascimento = datetime(1970, 1, 1).date()
+    for antigo in (True, False):
+        # Mesmo banco semeado, com a sessão configurada como no padrão antigo ou no atual
+        fabrica = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=antigo, bind=criar_banco_de_teste().kw["bind"])
+        with fabrica() as db:
+            estoque = cadastrar_livro(db, LivroCreateSchema(titulo="Estoque", isbn="9783000000000", numero_copias=REPETICOES, autor_id=1, lista_generos_ids=[1])).livro_id
+        # Os empréstimos criados na etapa anterior começam depois dos 2000 semeados
+        escritas = [
+            ("cadastrar_autor", lambda db, i: cadastrar_autor(db, AutorCreateSchema(nome=f"Autor {i}", sobrenome="Bench", nacionalidade="Brasileira", data_nascimento=nascimento)), AutorResponseSchema),
+            ("cadastrar_livro", lambda db, i: cadastrar_livro(db, LivroCreateSchema(titulo=f"Bench {i}", isbn=f"{9781000000000 + i}", numero_copias=1, autor_id=1, ano_publicacao=2000, lista_generos_ids=[1, 2])), LivroResponseSchema),
+            ("atualizar_livro", lambda db, i: atualizar_livro(db, 1, LivroUpdateSchema(titulo=f"Título {i}")), LivroResponseSchema),
+            ("criar_emprestimo", lambda db, i: criar_emprestimo(db, EmprestimoCreateSchema(livro_id=estoque, leitor_id=2, bibliotecario_id=1, data_devolucao_prevista=prevista)), EmprestimoResponseSchema),
+            ("devolver_emprestimo", lambda db, i: devolver_emprestimo(db, 2001 + i, datetime.now(), 1), EmprestimoResponseSchema),
+        ]
+        for nome, funcao, schema in escritas:
+            medir(nome, fabrica, funcao, schema, antigo)
@@ -0,0 +1,43 @@
+# Benchmark: empréstimo e devolução por ISBN ponta a ponta, no ritmo de um scanner de balcão.
+# Uso: com a API rodando e um livro cadastrado com cópias disponíveis,
+#   BENCH_TOKEN=<token bibliotecário> python benchmarks/bench_isbn_balcao.py ISBN LEITOR_ID BIBLIOTECARIO_ID [LEITURAS_POR_SEGUNDO]
+from datetime import date, timedelta
+from urllib import request
+import json
+import os
+import statistics
+import sys
+import time
+
+URL_BASE = os.getenv("BENCH_URL", "http://127.0.0.1:8000")
+TOKEN = os.environ["BENCH_TOKEN"]
+CICLOS = 200
+
+# Envia um POST JSON e retorna a latência em milissegundos
+def postar(caminho: str, corpo: dict) -> float:
+    req = request.Request(
+        URL_BASE + caminho,
+        data=json.dumps(corpo).encode(),
+        headers={"Content-Type": "application/json", "Authorization": f"Bearer {TOKEN}"},
+    )
+    inicio = time.perf_counter()
+    with request.urlopen(req, timeout=30) as resp:
+        resp.read()
+    return (time.perf_counter() - inicio) * 1000
+
+def resumo(nome: str, latencias: list[float]) -> None:
+    latencias.sort()
+    print(f"{nome:>10}: mediana={statistics.median(latencias):.1f}ms p99={latencias[int(len(latencias) * 0.99) - 1]:.1f}ms")
+
+if __name__ == "__main__":
+    isbn, leitor_id, bibliotecario_id = sys.argv[1], int(sys.argv[2]), int(sys.argv[3])
+    intervalo = 1 / float(sys.argv[4]) if len(sys.argv) > 4 else 0.5
+    devolucao_prevista = (date.today() + timedelta(days=14)).isoformat()
+    emprestimos, devolucoes = [], []
+    for _ in range(CICLOS):
+        emprestimos.append(postar("/emprestimos/por-isbn", {"isbn": isbn, "leitor_id": leitor_id, "bibliotecario_id": bibliotecario_id, "data_devolucao_prevista": devolucao_prevista}))
+        time.sleep(intervalo)
+        devolucoes.append(postar("/emprestimos/devolver-por-isbn", {"isbn": isbn, "leitor_id": leitor_id, "bibliotecario_devolucao_id": bibliotecario_id, "data_devolucao_real": date.today().isoformat()}))
+        time.sleep(intervalo)
+    resumo("empréstimo", emprestimos)
+    resumo("devolução", devolucoes)
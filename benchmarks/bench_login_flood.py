@@ -0,0 +1,64 @@
+# Benchmark: latência do catálogo durante uma enxurrada de logins inválidos.
+# Uso: com a API rodando (uvicorn app.main:app), execute
+#   python benchmarks/bench_login_flood.py [URL_BASE]
+# Defina BENCH_TOKEN para medir /livros/ em vez de /generos/ (rota pública).
+from concurrent.futures import ThreadPoolExecutor
+from urllib import request, error
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+URL_BASE = sys.argv[1] if len(sys.argv) > 1 else "http://127.0.0.1:8000"
+TOKEN = os.getenv("BENCH_TOKEN")
+ROTA_CATALOGO = "/livros/" if TOKEN else "/generos/"
+THREADS_ATAQUE = 32
+AMOSTRAS = 200
+
+# Executa uma requisição e retorna o status HTTP
+def requisitar(caminho: str, corpo: dict | None = None) -> int:
+    cabecalhos = {"Content-Type": "application/json"}
+    if TOKEN:
+        cabecalhos["Authorization"] = f"Bearer {TOKEN}"
+    dados = json.dumps(corpo).encode() if corpo is not None else None
+    req = request.Request(URL_BASE + caminho, data=dados, headers=cabecalhos)
+    try:
+        with request.urlopen(req, timeout=30) as resp:
+            resp.read()
+            return resp.status
+    except error.HTTPError as exc:
+        return exc.code
+
+# Mede a latência do catálogo em milissegundos
+def medir_catalogo() -> list[float]:
+    latencias = []
+    for _ in range(AMOSTRAS):
+        inicio = time.perf_counter()
+        requisitar(ROTA_CATALOGO)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    return latencias
+
+# Dispara logins com senha errada até o evento de parada
+def atacar(parar: threading.Event, contagem: dict) -> None:
+    while not parar.is_set():
+        codigo = requisitar("/auth/login", {"email": "alvo@exemplo.com", "senha": "senha-errada"})
+        contagem[codigo] = contagem.get(codigo, 0) + 1
+
+def resumo(nome: str, latencias: list[float]) -> None:
+    latencias.sort()
+    p99 = latencias[int(len(latencias) * 0.99) - 1]
+    print(f"{nome:>16}: mediana={statistics.median(latencias):.1f}ms p99={p99:.1f}ms")
+
+if __name__ == "__main__":
+    resumo("sem ataque", medir_catalogo())
+    parar = threading.Event()
+    contagem: dict = {}
+    with ThreadPoolExecutor(THREADS_ATAQUE) as executor:
+        for _ in range(THREADS_ATAQUE):
+            executor.submit(atacar, parar, contagem)
+        time.sleep(1)
+        resumo("durante ataque", medir_catalogo())
+        parar.set()
+    print(f"respostas do login: {contagem}")
@@ -0,0 +1,45 @@
+# Benchmark: construção e consulta do índice de recomendações por coocorrência de empréstimos.
+# Uso: python benchmarks/bench_recomendacoes.py [QUANTIDADE_EMPRESTIMOS]
+from app.core.recomendacoes import IndiceRecomendacoes
+import numpy as np
+import os
+import sys
+import tempfile
+import time
+
+QUANTIDADE = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+LEITORES = 100_000
+LIVROS = 50_000
+CONSULTAS = 10_000
+
+if __name__ == "__main__":
+    gerador = np.random.default_rng(42)
+    leitores = gerador.integers(1, LEITORES, QUANTIDADE)
+    # Distribuição enviesada: poucos livros concentram a maior parte dos empréstimos
+    livros = np.minimum(gerador.zipf(1.3, QUANTIDADE), LIVROS)
+
+    caminho = os.path.join(tempfile.mkdtemp(), "recomendacoes.npz")
+    indice = IndiceRecomendacoes(caminho)
+    inicio = time.perf_counter()
+    indice.construir(leitores, livros)
+    indice.carregado = True
+    print(f"construção: {time.perf_counter() - inicio:.2f}s para {QUANTIDADE} empréstimos ({indice.coocorrencia.nnz} pares)")
+
+    consultados = gerador.integers(1, 1000, CONSULTAS)
+    for nome in ("consulta fria", "consulta em cache"):
+        latencias = []
+        for livro_id in consultados.tolist():
+            inicio = time.perf_counter()
+            indice.recomendar(livro_id, 10)
+            latencias.append((time.perf_counter() - inicio) * 1_000_000)
+        latencias.sort()
+        print(f"{nome}: p50={latencias[len(latencias) // 2]:.1f}µs p99={latencias[int(len(latencias) * 0.99)]:.1f}µs")
+
+    inicio = time.perf_counter()
+    for emprestimo_id in range(1, 1001):
+        indice.aplicar_evento({"tipo": "emprestimo_criado", "emprestimo": {"emprestimo_id": emprestimo_id, "leitor_id": int(gerador.integers(1, LEITORES)), "livro_id": int(gerador.integers(1, LIVROS))}})
+    print(f"atualização incremental: {(time.perf_counter() - inicio) * 1000:.1f}µs por empréstimo")
+
+    inicio = time.perf_counter()
+    indice.salvar()
+    print(f"persistência: {time.perf_counter() - inicio:.2f}s, {os.path.getsize(caminho) / 1_048_576:.1f} MiB")
@@ -0,0 +1,42 @@
+# Benchmark: latência do índice de sugestões em memória com 1 milhão de títulos.
+# Uso: python benchmarks/bench_sugestoes.py [QUANTIDADE_TITULOS]
+from app.db.embutido import usar_banco_embutido
+# Modo embutido (SQLite) antes de importar a aplicação, que exige DATABASE_URL
+usar_banco_embutido()
+from app.core.sugestoes import IndiceSugestoes, TIPO_TITULO
+import random
+import string
+import sys
+import time
+
+QUANTIDADE = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+CONSULTAS = 10_000
+
+# Gera um título sintético com 2 a 5 palavras
+def titulo_aleatorio(gerador: random.Random) -> str:
+    return " ".join("".join(gerador.choices(string.ascii_lowercase, k=gerador.randint(3, 9))) for _ in range(gerador.randint(2, 5)))
+
+if __name__ == "__main__":
+    gerador = random.Random(42)
+    titulos = [titulo_aleatorio(gerador) for _ in range(QUANTIDADE)]
+
+    indice = IndiceSugestoes()
+    inicio = time.perf_counter()
+    for livro_id, titulo in enumerate(titulos, start=1):
+        IndiceSugestoes._indexar(indice.chaves, indice.textos, indice.chaves_por_item, TIPO_TITULO, livro_id, titulo, [titulo])
+    indice.chaves.sort()
+    indice.carregado = True
+    print(f"construção: {time.perf_counter() - inicio:.2f}s para {QUANTIDADE} títulos")
+
+    latencias = []
+    for _ in range(CONSULTAS):
+        prefixo = gerador.choice(titulos)[: gerador.randint(1, 6)]
+        inicio = time.perf_counter()
+        indice.sugerir(prefixo, 10)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    latencias.sort()
+    print(f"consulta: p50={latencias[len(latencias) // 2]:.3f}ms p99={latencias[int(len(latencias) * 0.99)]:.3f}ms")
+
+    inicio = time.perf_counter()
+    indice.aplicar_evento({"tipo": "livro_atualizado", "livro": {"livro_id": 1, "titulo": "novo titulo"}})
+    print(f"atualização incremental: {(time.perf_counter() - inicio) * 1000:.3f}ms")
@@ -16,7 +16,8 @@ function getTomorrowDate() {
 // ====================================================================
 // ⚙️ CONFIGURAÇÃO DA API E ESTADO GLOBAL
 // ====================================================================
-const API_URL = "http://127.0.0.1:8000";
+// Servida pela própria API, a página traz a meta `gestbook-api` vazia: chamadas na mesma origem, sem preflight
+const API_URL = document.querySelector('meta[name="gestbook-api"]')?.getAttribute('content') ?? "http://127.0.0.1:8000";
 
 /**
  * ID do bibliotecário logado. Preenchido na inicialização.
@@ -34,10 +35,14 @@ const TODAY = new Date().toISOString().split('T')[0];
 const TOMORROW = getTomorrowDate();
 
 /**
- * Cache para armazenar os empréstimos ativos (ou todos) e aplicar filtros locais rápidos.
- * Contém a propriedade `__url` para rastrear o endpoint de onde veio.
+ * Quantidade máxima de empréstimos por consulta; filtros, ordenação e página são aplicados pela API.
  */
-let activeLoansCache = [];
+const LOANS_PAGE_SIZE = 100;
+
+/**
+ * Limite da API para a contagem de atrasados no resumo; acima disso o card exibe "N+".
+ */
+const OVERDUE_COUNT_LIMIT = 1000;
 
 // ====================================================================
 // 🛠️ FUNÇÕES UTILITÁRIAS (Mensagens, Confirmação e Validação)
@@ -195,7 +200,6 @@ function activateSection(sectionId) {
             break;
         case 'emprestimos-section':
             loadLoanCreationData(); // Carrega Leitores/Livros para criação/filtros
-            activeLoansCache = []; // Força recarregar os empréstimos (sem filtro inicial)
             loadActiveLoansAdmin({});
             break;
         case 'gerenciar-livros-section':
@@ -674,7 +678,6 @@ async function createLoan(event) {
             // Recarrega dados afetados
             loadSummaryData();
             loadLoanCreationData();
-            activeLoansCache = []; // Limpa cache para forçar a atualização da lista
             loadActiveLoansAdmin({});
         } else {
             // Tratamento específico para o erro de data de devolução inválida
@@ -703,46 +706,23 @@ async function loadActiveLoansAdmin(filters = {}) {
     loansList.innerHTML = '<p class="loading-message">Carregando empréstimos...</p>';
 
     const token = localStorage.getItem('token');
-
-    const leitorIdFiltro = filters.leitor_id;
-    let url = `${API_URL}/emprestimos/`; // Busca todos por padrão
-    if (leitorIdFiltro) {
-        url = `${API_URL}/emprestimos/leitor/${leitorIdFiltro}`; // Busca por leitor específico
-    }
-
-    // Verifica se o cache está vazio OU se a URL de busca mudou (ex: mudou o filtro de leitor)
-    const shouldReloadFromApi = activeLoansCache.length === 0 || activeLoansCache.__url !== url;
+    const url = `${API_URL}/emprestimos/?${buildLoanParams(filters)}`;
 
     try {
-        if (shouldReloadFromApi) {
-            const response = await fetch(url, {
-                method: 'GET',
-                headers: { 'Authorization': `Bearer ${token}`, 'Content-Type': 'application/json' }
-            });
+        const response = await fetch(url, {
+            method: 'GET',
+            headers: { 'Authorization': `Bearer ${token}`, 'Content-Type': 'application/json' }
+        });
 
-            const emprestimos = await response.json();
+        const emprestimos = await response.json();
 
-            if (!response.ok) {
-                // Trata o caso 404 de "Empréstimo não encontrado"
-                if (response.status === 404 && emprestimos.detail && emprestimos.detail.includes("Empréstimo não encontrado")) {
-                     loansList.innerHTML = '<p class="empty-message">Nenhum empréstimo encontrado para os critérios de busca.</p>';
-                     activeLoansCache = [];
-                     return;
-                }
-                 loansList.innerHTML = `<p class="error-message">Erro ao carregar empréstimos: ${emprestimos.detail || 'Falha na API'}</p>`;
-                 activeLoansCache = [];
-                 return;
-            }
-
-            // Atualiza o cache com a nova lista e a URL de onde ela veio
-            activeLoansCache = emprestimos;
-            activeLoansCache.__url = url;
+        if (!response.ok) {
+            loansList.innerHTML = `<p class="error-message">Erro ao carregar empréstimos: ${emprestimos.detail || 'Falha na API'}</p>`;
+            return;
         }
 
-        // Aplica filtros locais (data e status) ao cache
-        const filteredLoans = applyLoanFilters(activeLoansCache, filters);
-        // Renderiza o resultado
-        renderLoans(filteredLoans, loansList);
+        // Renderiza a página já filtrada e ordenada pela API (lista vazia quando nada corresponde)
+        renderLoans(emprestimos, loansList);
 
     } catch (error) {
         console.error('Erro de conexão ao buscar empréstimos:', error);
@@ -751,57 +731,33 @@ async function loadActiveLoansAdmin(filters = {}) {
 }
 
 /**
- * Aplica filtros locais (Data e Status) à lista de empréstimos em cache.
- * @param {Array<Object>} loans - Lista de empréstimos.
- * @param {Object} filters - Objeto contendo { data_devolucao, status }.
- * @returns {Array<Object>} Lista de empréstimos filtrada.
+ * Converte os filtros do painel (Leitor, Data e Status) em parâmetros de consulta da API.
+ * @param {Object} filters - Objeto contendo { leitor_id, data_devolucao, status }.
+ * @returns {URLSearchParams} Parâmetros para GET /emprestimos/.
  */
-function applyLoanFilters(loans, filters) {
-    let filtered = loans;
+function buildLoanParams(filters) {
+    const params = new URLSearchParams({ limite: String(LOANS_PAGE_SIZE) });
 
-    // Filtro de Data de Devolução Prevista
-    const dataPrevista = filters.data_devolucao ? new Date(filters.data_devolucao) : null;
-    if (dataPrevista) dataPrevista.setHours(23, 59, 59, 999);
+    if (filters.leitor_id) params.set('leitor_id', filters.leitor_id);
 
-    const statusFiltro = filters.status;
-
-    if (dataPrevista) {
-        filtered = filtered.filter(loan => {
-            const loanDate = new Date(loan.data_devolucao_prevista);
-            // Filtra empréstimos cuja previsão de devolução seja MENOR ou IGUAL à data selecionada
-            return loanDate <= dataPrevista;
-        });
+    // Previsão de devolução MENOR ou IGUAL à data selecionada, da mais próxima para a mais distante
+    if (filters.data_devolucao) {
+        params.set('prevista_ate', filters.data_devolucao);
+        params.set('ordenar', 'data_devolucao_prevista');
     }
 
-    // Filtro por Status
-    if (statusFiltro) {
-
-        filtered = filtered.filter(loan => {
-            const isOverdue = loan.is_atrasado;
-            const apiStatus = (loan.status_emprestimo || '').toLowerCase();
-
-            const isAtivo = apiStatus === 'emprestado';
-            // Finalizado é sinônimo de devolvido na lógica de exibição
-            const isDevolvido = apiStatus === 'devolvido' || apiStatus === 'finalizado';
-
-            if (statusFiltro === "Atrasado") {
-                // Ativo E atrasado
-                return isOverdue;
-
-            } else if (statusFiltro === "Devolvido") {
-                return isDevolvido;
-
-            } else if (statusFiltro === "Emprestado") {
-                // Ativo E não atrasado (em dia)
-                return isAtivo && !isOverdue;
-            }
-
-            // Se o status for "Todos os Status" ou desconhecido, retorna true
-            return true;
-        });
+    if (filters.status === "Atrasado") {
+        // Ativo E atrasado
+        params.set('atrasado', 'true');
+    } else if (filters.status === "Devolvido") {
+        params.set('status', 'Devolvido');
+    } else if (filters.status === "Emprestado") {
+        // Ativo E não atrasado (em dia)
+        params.set('status', 'Emprestado');
+        params.set('atrasado', 'false');
     }
 
-    return filtered;
+    return params;
 }
 
 /**
@@ -947,7 +903,6 @@ async function handleFinishLoan(loanId) {
             // Atualiza o painel
             loadSummaryData();
             loadLoanCreationData();
-            activeLoansCache = []; // Limpa cache
             loadActiveLoansAdmin({}); // Recarrega a lista
         } else {
             const errorMsg = extractApiErrorMessage(result);
@@ -1018,6 +973,7 @@ async function loadBooks(gridElement) {
             const nomeAutor = await fetchAuthorDetails(livro.autor_id);
             const card = document.createElement('div');
             card.classList.add('book-card');
+            card.dataset.livroId = livro.livro_id;
             card.innerHTML = `
                 <div class="book-card-header">
                     <h3>${livro.titulo}</h3>
@@ -1027,7 +983,7 @@ async function loadBooks(gridElement) {
                     <p><strong>Autor:</strong> ${nomeAutor}</p>
                     <p><strong>Editora:</strong> ${livro.editora || 'N/A'}</p>
                     <p><strong>ISBN:</strong> <span class="isbn">${livro.isbn}</span></p>
-                    <p><strong>Cópias:</strong> ${livro.numero_copias}</p>
+                    <p><strong>Cópias:</strong> <span class="copias">${livro.numero_copias}</span></p>
                 </div>
             `;
             gridElement.appendChild(card);
@@ -1117,23 +1073,13 @@ async function loadSummaryData() {
 
     // 3. Empréstimos Atrasados
     try {
-        const response = await fetch(`${API_URL}/emprestimos/`, { headers: { 'Authorization': `Bearer ${token}` } });
-        const allLoans = await response.json();
-
-        if (response.ok && Array.isArray(allLoans)) {
-            // Filtra apenas os empréstimos ativos (não devolvidos)
-            const activeLoans = allLoans.filter(loan => (loan.status_emprestimo || '').toLowerCase() === 'emprestado');
-
-            // Conta quantos estão atrasados (data_devolucao_prevista é menor que hoje)
-            const overdueCount = activeLoans.filter(loan => {
-                const dataDevolucao = new Date(loan.data_devolucao_prevista);
-                const hoje = new Date();
-                // Normaliza as datas para comparação apenas no dia
-                hoje.setHours(0,0,0,0);
-                dataDevolucao.setHours(0,0,0,0);
-                return dataDevolucao < hoje;
-            }).length;
-            document.getElementById('overdue-loans').textContent = overdueCount;
+        // A API filtra os atrasados no banco; só a contagem limitada atravessa a rede
+        const response = await fetch(`${API_URL}/emprestimos/?atrasado=true&limite=${OVERDUE_COUNT_LIMIT}`, { headers: { 'Authorization': `Bearer ${token}` } });
+        const overdueLoans = await response.json();
+
+        if (response.ok && Array.isArray(overdueLoans)) {
+            const overdueCount = overdueLoans.length;
+            document.getElementById('overdue-loans').textContent = overdueCount >= OVERDUE_COUNT_LIMIT ? `${overdueCount}+` : overdueCount;
         } else {
              document.getElementById('overdue-loans').textContent = '0';
         }
@@ -1143,6 +1089,51 @@ async function loadSummaryData() {
 }
 
 
+// ====================================================================
+// 📡 EVENTOS EM TEMPO REAL (SSE)
+// ====================================================================
+
+/**
+ * Lê os filtros atuais do formulário de empréstimos.
+ * @returns {Object} Objeto contendo { leitor_id, data_devolucao, status }.
+ */
+function currentLoanFilters() {
+    return {
+        leitor_id: document.getElementById('filter-leitor-id').value,
+        data_devolucao: document.getElementById('filter-data-devolucao').value,
+        status: document.getElementById('filter-status').value
+    };
+}
+
+/**
+ * Conecta ao stream `/eventos` da API e aplica as alterações recebidas
+ * (empréstimos e estoque): recarrega só a página de empréstimos exibida e atualiza o estoque no card.
+ */
+function connectEventStream() {
+    const token = localStorage.getItem('token');
+    if (!token || typeof EventSource === 'undefined') return;
+
+    const source = new EventSource(`${API_URL}/eventos?token=${encodeURIComponent(token)}`);
+
+    // Recarrega a página de empréstimos exibida; filtros e ordem continuam sendo aplicados pela API
+    const patchLoan = () => {
+        if (document.getElementById('emprestimos-section')?.classList.contains('active')) {
+            loadActiveLoansAdmin(currentLoanFilters());
+        }
+    };
+
+    source.addEventListener('emprestimo_criado', patchLoan);
+    source.addEventListener('emprestimo_devolvido', patchLoan);
+
+    // Atualiza o número de cópias exibido no card do catálogo
+    source.addEventListener('estoque_alterado', (event) => {
+        const { livro_id, numero_copias } = JSON.parse(event.data);
+        const copias = document.querySelector(`.book-card[data-livro-id="${livro_id}"] .copias`);
+        if (copias) copias.textContent = numero_copias;
+    });
+}
+
+
 // ====================================================================
 // 🚀 LÓGICA DE INICIALIZAÇÃO DA PÁGINA (DOMContentLoaded)
 // ====================================================================
@@ -1204,14 +1195,8 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // 5. CONFIGURAR FILTROS DE EMPRÉSTIMO
     document.getElementById('apply-loan-filters')?.addEventListener('click', () => {
-        // Coleta os filtros do formulário
-        const filters = {
-            leitor_id: document.getElementById('filter-leitor-id').value,
-            data_devolucao: document.getElementById('filter-data-devolucao').value,
-            status: document.getElementById('filter-status').value
-        };
-        // Aplica os filtros e recarrega a lista
-        loadActiveLoansAdmin(filters);
+        // Aplica os filtros do formulário e recarrega a lista
+        loadActiveLoansAdmin(currentLoanFilters());
     });
 
 
@@ -1219,4 +1204,7 @@ document.addEventListener('DOMContentLoaded', () => {
     // Inicializa a Home e carrega os dados de resumo
     loadSummaryData();
     activateSection('dashboard-home');
+
+    // 7. RECEBER ALTERAÇÕES EM TEMPO REAL
+    connectEventStream();
 });
\ No newline at end of file
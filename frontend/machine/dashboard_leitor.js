@@ -5,8 +5,10 @@
 
 /**
  * URL base da API (Root URL).
+ * Quando a página é servida pela própria API, a meta `gestbook-api` vem vazia
+ * e as chamadas ficam na mesma origem, sem preflight de CORS.
  */
-const API_URL = "http://127.0.0.1:8000";
+const API_URL = document.querySelector('meta[name="gestbook-api"]')?.getAttribute('content') ?? "http://127.0.0.1:8000";
 
 /**
  * Armazena o ID do gênero atualmente selecionado para filtrar o catálogo de livros.
@@ -21,74 +23,56 @@ let GENERO_ATIVO_ID = "";
 let LEITOR_ID = null;
 
 /**
- * Cache local dos empréstimos do leitor, carregado da API uma única vez
- * para permitir filtros locais rápidos (data e status) sem requisições repetidas.
+ * Quantidade máxima de empréstimos exibidos por consulta; a API ordena e pagina no servidor.
  */
-let leitorLoansCache = [];
+const LEITOR_LOANS_PAGE_SIZE = 50;
 
 // ====================================================================
 // 🔎 FUNÇÕES DE FILTRO DE EMPRÉSTIMOS
-// Lógica para filtrar a lista de empréstimos do leitor no lado do cliente.
+// Traduz os filtros da tela para os parâmetros de consulta da API.
 // ====================================================================
 
 /**
- * Aplica filtros locais (Status e Data) à lista de empréstimos em cache.
- * A filtragem é feita a partir dos dados já carregados para o leitor.
+ * Monta os parâmetros de consulta da listagem de empréstimos do leitor.
+ * O filtro é aplicado no banco: apenas a página resultante é transferida.
  *
- * @param {Array<Object>} loans - Lista completa de empréstimos do leitor.
  * @param {Object} filters - Objeto contendo { startDate, endDate, status }.
- * @returns {Array<Object>} Lista de empréstimos filtrada.
+ * @returns {URLSearchParams} Parâmetros para /emprestimos/leitor/{id}.
  */
-function applyLeitorLoanFilters(loans, filters) {
-    let filtered = loans;
-
-    // Converte e normaliza as datas de filtro
-    const startDate = filters.startDate ? new Date(filters.startDate) : null;
-    const endDate = filters.endDate ? new Date(filters.endDate) : null;
-
-    // Ajusta a hora para cobrir o dia inteiro para os filtros de data
-    if (startDate) startDate.setHours(0, 0, 0, 0);
-    if (endDate) endDate.setHours(23, 59, 59, 999);
-
-    const statusFiltro = filters.status;
-
-    // 1. Filtro por Data
-    if (startDate || endDate) {
-        filtered = filtered.filter(loan => {
-            const loanDate = new Date(loan.data_emprestimo);
-            loanDate.setHours(0, 0, 0, 0); // Normaliza a data do empréstimo para comparação
-
-            const matchesStart = startDate ? loanDate >= startDate : true;
-            const matchesEnd = endDate ? loanDate <= endDate : true;
+function buildLeitorLoanParams(filters) {
+    const params = new URLSearchParams({
+        incluir_arquivados: 'true',
+        ordenar: '-data_emprestimo',
+        limite: String(LEITOR_LOANS_PAGE_SIZE)
+    });
 
-            return matchesStart && matchesEnd;
-        });
+    if (filters.startDate) params.set('data_inicio', filters.startDate);
+    if (filters.endDate) params.set('data_fim', filters.endDate);
+
+    if (filters.status === "Atrasado") {
+        // Empréstimo está ativo E está atrasado
+        params.set('atrasado', 'true');
+    } else if (filters.status === "Devolvido") {
+        params.set('status', 'Devolvido');
+    } else if (filters.status === "Emprestado") {
+        // Emprestado (Ativos e Em Dia) = Emprestado E não Atrasado
+        params.set('status', 'Emprestado');
+        params.set('atrasado', 'false');
     }
 
-    // 2. Filtro por Status
-    if (statusFiltro && statusFiltro !== "") {
-        filtered = filtered.filter(loan => {
-            // is_atrasado vem diretamente da API, indicando se a data de devolução prevista expirou.
-            const isOverdue = loan.is_atrasado;
-            const apiStatus = (loan.status_emprestimo || '').toLowerCase();
-            const isEmprestado = apiStatus === 'emprestado';
-            const isDevolvido = apiStatus === 'devolvido';
-
-            if (statusFiltro === "Atrasado") {
-                // Empréstimo está ativo E está atrasado
-                return isOverdue;
-            } else if (statusFiltro === "Devolvido") {
-                return isDevolvido;
-            } else if (statusFiltro === "Emprestado") {
-                // Emprestado (Ativos e Em Dia) = Emprestado E não Atrasado
-                return isEmprestado && !isOverdue;
-            }
-            // Se "Todos os Status" ou status desconhecido, retorna verdadeiro
-            return true;
-        });
-    }
+    return params;
+}
 
-    return filtered;
+/**
+ * Lê os filtros atualmente preenchidos na seção de empréstimos.
+ * @returns {Object} Objeto contendo { startDate, endDate, status }.
+ */
+function currentLeitorLoanFilters() {
+    return {
+        startDate: document.getElementById('filter-start-date')?.value,
+        endDate: document.getElementById('filter-end-date')?.value,
+        status: document.getElementById('filter-leitor-status')?.value
+    };
 }
 
 // ====================================================================
@@ -264,6 +248,7 @@ async function renderBooksInCards(gridElement, livros) {
         
         const card = document.createElement('div');
         card.classList.add('book-card');
+        card.dataset.livroId = livro.livro_id;
         card.innerHTML = `
             <div class="book-card-header">
                 <h3>${livro.titulo}</h3>
@@ -274,7 +259,10 @@ async function renderBooksInCards(gridElement, livros) {
                 <p><strong>Gênero:</strong> ${generoNome}</p>
                 <p><strong>ISBN:</strong> <span class="isbn">${livro.isbn}</span></p>
             </div>
+            <div class="book-card-recommendations"></div>
         `;
+        // Ao clicar no card, mostra os livros que outros leitores também pegaram
+        card.addEventListener('click', () => loadRecommendations(card));
         gridElement.appendChild(card);
     });
 
@@ -282,8 +270,45 @@ async function renderBooksInCards(gridElement, livros) {
 }
 
 /**
- * Carrega todos os empréstimos do leitor (se o cache estiver vazio) e aplica filtros.
- * Se o cache estiver preenchido, apenas aplica os filtros localmente.
+ * Carrega as recomendações "quem leu também pegou" de um livro dentro do seu card.
+ * A consulta é feita uma única vez por card.
+ * @param {HTMLElement} card - O card do livro (com data-livro-id).
+ */
+async function loadRecommendations(card) {
+    const container = card.querySelector('.book-card-recommendations');
+    if (!container || card.dataset.recomendacoesCarregadas) return;
+    card.dataset.recomendacoesCarregadas = '1';
+
+    const token = localStorage.getItem('token');
+    container.innerHTML = '<p class="loading-message">Carregando recomendações...</p>';
+
+    try {
+        const response = await fetch(`${API_URL}/livros/${card.dataset.livroId}/recomendacoes?limite=5`, {
+            method: 'GET',
+            headers: { 'Authorization': `Bearer ${token}`, 'Content-Type': 'application/json' }
+        });
+        const recomendacoes = await response.json();
+
+        if (!response.ok) {
+            container.innerHTML = `<p class="error-message">Erro ao carregar recomendações: ${recomendacoes.detail || 'Falha na API'}</p>`;
+            return;
+        }
+        if (recomendacoes.length === 0) {
+            container.innerHTML = '<p class="empty-message">Ainda não há recomendações para este livro.</p>';
+            return;
+        }
+
+        const itens = recomendacoes.map(r => `<li>${r.titulo}</li>`).join('');
+        container.innerHTML = `<p><strong>Quem leu também pegou:</strong></p><ul>${itens}</ul>`;
+    } catch (error) {
+        console.error('Erro de conexão ao buscar recomendações:', error);
+        container.innerHTML = '<p class="error-message">Falha de conexão com a API.</p>';
+        delete card.dataset.recomendacoesCarregadas;
+    }
+}
+
+/**
+ * Busca na API a página de empréstimos do leitor que corresponde aos filtros.
  * @param {Object} [filters={}] - Objeto contendo { startDate, endDate, status }.
  */
 async function loadActiveLoans(filters = {}) {
@@ -297,46 +322,29 @@ async function loadActiveLoans(filters = {}) {
         return;
     }
 
-    const url = `${API_URL}/emprestimos/leitor/${LEITOR_ID}`;
+    const url = `${API_URL}/emprestimos/leitor/${LEITOR_ID}?${buildLeitorLoanParams(filters)}`;
     const token = localStorage.getItem('token');
 
-    // Se o cache estiver vazio, recarrega TUDO da API para garantir dados atualizados
-    if (leitorLoansCache.length === 0) {
-        try {
-            const response = await fetch(url, {
-                method: 'GET',
-                headers: { 'Authorization': `Bearer ${token}`, 'Content-Type': 'application/json' }
-            });
-
-            if (response.status === 404) {
-                loansList.innerHTML = '<p class="empty-message">Nenhum empréstimo encontrado.</p>';
-                leitorLoansCache = [];
-                return;
-            }
-
-            const emprestimos = await response.json();
-
-            if (!response.ok) {
-                loansList.innerHTML = `<p class="error-message">Erro ao carregar empréstimos: ${emprestimos.detail || 'Falha na API'}</p>`;
-                leitorLoansCache = [];
-                return;
-            }
+    try {
+        const response = await fetch(url, {
+            method: 'GET',
+            headers: { 'Authorization': `Bearer ${token}`, 'Content-Type': 'application/json' }
+        });
 
-            // Armazena todos os empréstimos do leitor no cache
-            leitorLoansCache = emprestimos;
+        const emprestimos = await response.json();
 
-        } catch (error) {
-            console.error('Erro de conexão ao buscar empréstimos:', error);
-            loansList.innerHTML = '<p class="error-message">Falha de conexão com a API.</p>';
+        if (!response.ok) {
+            loansList.innerHTML = `<p class="error-message">Erro ao carregar empréstimos: ${emprestimos.detail || 'Falha na API'}</p>`;
             return;
         }
-    }
 
-    // Aplica filtros ao cache e renderiza o resultado
-    const filteredLoans = applyLeitorLoanFilters(leitorLoansCache, filters);
+        // Renderiza a página filtrada devolvida pela API (lista vazia quando nada corresponde)
+        await renderLeitorLoans(emprestimos, loansList);
 
-    // Renderiza a lista de empréstimos filtrada
-    await renderLeitorLoans(filteredLoans, loansList);
+    } catch (error) {
+        console.error('Erro de conexão ao buscar empréstimos:', error);
+        loansList.innerHTML = '<p class="error-message">Falha de conexão com a API.</p>';
+    }
 }
 
 /**
@@ -527,13 +535,75 @@ function activateSection(sectionId) {
 
     // 3. Carregamento de Dados Específicos (apenas para a seção de Empréstimos)
     if (sectionId === 'emprestimos-section' && LEITOR_ID) {
-        // Limpa o cache para forçar a busca na API em caso de reentrada na seção
-        leitorLoansCache = [];
         // Chama com o filtro padrão (Emprestado, ou seja, ativos e em dia ou atrasados)
         loadActiveLoans({ status: 'Emprestado' });
     }
 }
 
+// ====================================================================
+// 💡 SUGESTÕES DE BUSCA (AUTOCOMPLETAR)
+// ====================================================================
+
+/**
+ * Busca sugestões de títulos e autores no endpoint leve `/livros/sugestoes`
+ * e preenche o `<datalist>` do campo de busca.
+ * @param {string} query - Texto digitado pelo leitor.
+ */
+async function loadSearchSuggestions(query) {
+    const datalist = document.getElementById('search-suggestions');
+    if (!datalist) return;
+    if (query.length < 2) {
+        datalist.innerHTML = '';
+        return;
+    }
+
+    const token = localStorage.getItem('token');
+    try {
+        const response = await fetch(`${API_URL}/livros/sugestoes?q=${encodeURIComponent(query)}&limite=8`, {
+            headers: { 'Authorization': `Bearer ${token}` }
+        });
+        if (!response.ok) return;
+        const sugestoes = await response.json();
+        datalist.innerHTML = '';
+        sugestoes.forEach(sugestao => {
+            const option = document.createElement('option');
+            option.value = sugestao.texto;
+            datalist.appendChild(option);
+        });
+    } catch (error) {
+        console.error('Erro ao buscar sugestões:', error);
+    }
+}
+
+// ====================================================================
+// 📡 EVENTOS EM TEMPO REAL (SSE)
+// Mantém o cache de empréstimos do leitor atualizado sem novas buscas.
+// ====================================================================
+
+/**
+ * Conecta ao stream `/eventos` da API. O servidor envia ao leitor apenas
+ * os eventos dos seus próprios empréstimos, que são aplicados ao cache local.
+ */
+function connectEventStream() {
+    const token = localStorage.getItem('token');
+    if (!token || typeof EventSource === 'undefined') return;
+
+    const source = new EventSource(`${API_URL}/eventos?token=${encodeURIComponent(token)}`);
+
+    const patchLoan = (event) => {
+        const { emprestimo } = JSON.parse(event.data);
+        if (emprestimo.leitor_id !== LEITOR_ID) return;
+
+        // Recarrega a página atual: ordem e filtros continuam sendo decididos pela API
+        if (document.getElementById('emprestimos-section')?.classList.contains('active')) {
+            loadActiveLoans(currentLeitorLoanFilters());
+        }
+    };
+
+    source.addEventListener('emprestimo_criado', patchLoan);
+    source.addEventListener('emprestimo_devolvido', patchLoan);
+}
+
 // ====================================================================
 // 🚀 LÓGICA DE INICIALIZAÇÃO DA PÁGINA (DOMContentLoaded)
 // O código principal que configura a dashboard quando a página é carregada.
@@ -602,25 +672,22 @@ document.addEventListener('DOMContentLoaded', () => {
                 searchButton.click();
             }
         });
+
+        // Sugestões enquanto digita, com debounce para não disparar uma requisição por tecla
+        let suggestionTimer = null;
+        searchInput.addEventListener('input', () => {
+            clearTimeout(suggestionTimer);
+            suggestionTimer = setTimeout(() => loadSearchSuggestions(searchInput.value.trim()), 150);
+        });
     }
 
     // 5. Lógica do Filtro de Empréstimos (Aplicação dos filtros)
     const applyFilterButton = document.getElementById('apply-loan-filter');
-    const filterStartDate = document.getElementById('filter-start-date');
-    const filterEndDate = document.getElementById('filter-end-date');
-    const filterStatus = document.getElementById('filter-leitor-status');
 
     if (applyFilterButton) {
         applyFilterButton.addEventListener('click', () => {
-            // Reúne os valores dos campos de filtro
-            const filters = {
-                startDate: filterStartDate.value,
-                endDate: filterEndDate.value,
-                status: filterStatus.value
-            };
-
-            // Recarrega do cache e aplica os filtros
-            loadActiveLoans(filters);
+            // Reúne os valores dos campos de filtro e consulta a API com eles
+            loadActiveLoans(currentLeitorLoanFilters());
         });
     }
 
@@ -628,4 +695,7 @@ document.addEventListener('DOMContentLoaded', () => {
     loadGenres();
     // Ativa a seção de Catálogo como a tela inicial
     activateSection('catalogo-section');
+
+    // 7. RECEBER ALTERAÇÕES EM TEMPO REAL
+    connectEventStream();
 });
\ No newline at end of file
@@ -7,8 +7,9 @@
 /**
  * URL base da API de autenticação.
  * Todos os endpoints de login e registro serão construídos a partir desta URL.
+ * Quando a página é servida pela própria API, a meta `gestbook-api` vem vazia (mesma origem).
  */
-const API_URL = "http://127.0.0.1:8000/auth";
+const API_URL = (document.querySelector('meta[name="gestbook-api"]')?.getAttribute('content') ?? "http://127.0.0.1:8000") + "/auth";
 
 // --- Funções Auxiliares ---
 